@@ -0,0 +1,375 @@
+"""
+A10 LLM Discovery Agent
+AI Design Solutions | AI Visibility Engine
+Purpose: Ask AI assistants (ChatGPT, Claude, Gemini) the questions a local
+customer would ask, and measure whether each client shows up in the answers.
+
+Queries are generated per (industry, location) group, so every client in the
+same industry and town shares one query set. Each distinct (assistant, query)
+is asked at most once per day — answers are cached in data/llm_probes.db and
+concurrent callers share in-flight requests — and every client in the group
+is scored against the shared answers. Cost grows with distinct queries, not
+clients × queries. AIVE_PROBE_PROVIDERS=stub runs the pipeline offline.
+"""
+
+import contextvars
+import hashlib
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from apps.common.settings import setting
+from apps.common.local_store import connect, transaction
+from apps.common.deadlines import current_budget
+from apps.common.llm_gateway import StubProvider, get_router
+from apps.common.db_utils import (
+    ClientRecord,
+    iter_clients,
+    log_llm_visibility_results,
+    log_visibility_metrics_bulk,
+)
+
+PROBE_WORKERS = int(setting("AIVE_PROBE_WORKERS", "4"))
+PROBE_RPM = float(setting("AIVE_PROBE_RPM", "30"))        # requests per minute, per assistant
+PROBE_PROVIDERS = setting("AIVE_PROBE_PROVIDERS", "")     # default: every provider the LLM router has
+
+ASSISTANT_NAMES = {"openai": "ChatGPT", "anthropic": "Claude", "gemini": "Gemini", "stub": "Stub"}
+
+QUERY_TEMPLATES = [
+    "What are the best {industry} businesses{in_location}?",
+    "Can you recommend a good {industry} provider{in_location}?",
+    "Who are the top-rated {industry} companies{in_location}?",
+    "I need {industry} help{in_location}. Who should I contact?",
+    "Which {industry} businesses{in_location} have the best reviews?",
+]
+SYSTEM_PROMPT = (
+    "Answer the way you would for any user asking for a recommendation. "
+    "Name specific businesses and their websites where you can."
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    day TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    query_key TEXT NOT NULL,
+    query TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    latency_s REAL,
+    created REAL NOT NULL,
+    PRIMARY KEY (day, provider, query_key)
+);
+CREATE TABLE IF NOT EXISTS scores (
+    day TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    queries INTEGER NOT NULL,
+    mentions INTEGER NOT NULL,
+    mention_rate REAL NOT NULL,
+    prominence REAL NOT NULL,
+    PRIMARY KEY (day, client_id, provider)
+);
+"""
+
+
+def _db():
+    return connect("llm_probes", SCHEMA)
+
+
+# --------------------------------------------------------------------
+# 🧾 Query sets (one per industry + location group)
+# --------------------------------------------------------------------
+def _normalize(text) -> str:
+    return " ".join(str(text or "").lower().split())
+
+
+def group_key(client: ClientRecord):
+    return _normalize(client.industry) or "local services", _normalize(client.location)
+
+
+def build_queries(industry: str, location: str = "") -> list:
+    in_location = f" in {location.title()}" if location else ""
+    return [template.format(industry=industry, in_location=in_location) for template in QUERY_TEMPLATES]
+
+
+def query_key(query: str) -> str:
+    return hashlib.sha1(_normalize(query).encode("utf-8")).hexdigest()[:16]
+
+
+# --------------------------------------------------------------------
+# 🤖 Asking the assistants (rate limited, cached per day, single-flight)
+# --------------------------------------------------------------------
+class ProbeDeferred(Exception):
+    """The assistant's next rate-limit slot lies past the caller's time budget."""
+
+
+class _RateLimiter:
+    """Spaces calls to one assistant at least 60/rpm seconds apart across all probe threads."""
+
+    def __init__(self, per_min: float):
+        self.interval = 60.0 / per_min if per_min > 0 else 0.0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Sleep until this caller's slot; ProbeDeferred (slot not taken) when it lies past the budget."""
+        budget = current_budget()
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_at)
+            if budget is not None and slot - now >= budget.remaining():
+                raise ProbeDeferred(f"next slot in {slot - now:.0f}s, {budget.name} budget has {budget.remaining():.0f}s left")
+            self.next_at = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_limiters = defaultdict(lambda: _RateLimiter(PROBE_RPM))
+_pool = ThreadPoolExecutor(max_workers=max(1, PROBE_WORKERS), thread_name_prefix="llm-probe")
+_inflight = {}                     # (day, provider, query_key) -> Future
+_inflight_lock = threading.Lock()
+_stub_candidates = {}              # query_key -> business names the offline stub may mention
+
+
+def _stub_answer(messages) -> str:
+    """Deterministic offline answer: a recommendation list built from the group's own clients."""
+    query = messages[-1]["content"]
+    key = query_key(query)
+    names = [
+        name for name in _stub_candidates.get(key, [])
+        if int(hashlib.sha1(f"{key}|{name}".encode("utf-8")).hexdigest(), 16) % 3
+    ]
+    names += [f"Example Competitor {n}" for n in (1, 2)]
+    lines = [f"Here are some options for: {query}"]
+    lines += [f"{i}. {name}" for i, name in enumerate(names, 1)]
+    return "\n".join(lines)
+
+
+_stub = StubProvider(latency_s=0, responder=_stub_answer)
+
+
+def probe_providers() -> list:
+    """Assistants to probe: AIVE_PROBE_PROVIDERS, or every provider configured on the LLM router."""
+    if PROBE_PROVIDERS:
+        return [p.strip() for p in PROBE_PROVIDERS.split(",") if p.strip()]
+    try:
+        return list(get_router().order)
+    except ValueError:
+        return []
+
+
+def _ask(day: str, provider: str, key: str, query: str) -> str:
+    _limiters[provider].wait()
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": query}]
+    started = time.monotonic()
+    if provider == "stub":
+        text = _stub.complete(messages, False, None)
+    else:
+        text = get_router().complete_on(provider, messages, json_mode=False).text
+    _db().execute(
+        "INSERT OR REPLACE INTO answers (day, provider, query_key, query, answer, latency_s, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (day, provider, key, query, text, round(time.monotonic() - started, 3), time.time()),
+    )
+    return text
+
+
+def _answers(day: str, providers: list, queries: dict):
+    """
+    {(provider, query_key): answer} for every distinct query, asking only what
+    isn't cached for `day` yet. Returns (answers, counts).
+    """
+    answers = {}
+    cached = _db().execute("SELECT provider, query_key, answer FROM answers WHERE day = ?", (day,)).fetchall()
+    for row in cached:
+        if row["provider"] in providers and row["query_key"] in queries:
+            answers[(row["provider"], row["query_key"])] = row["answer"]
+    counts = {"distinct_queries": len(queries) * len(providers), "cached": len(answers), "asked": 0, "failed": 0,
+              "deferred": 0}
+
+    futures = {}
+    for provider in providers:
+        for key, query in queries.items():
+            if (provider, key) in answers:
+                continue
+            flight = (day, provider, key)
+            with _inflight_lock:
+                future = _inflight.get(flight)
+                if future is None:
+                    future = _pool.submit(contextvars.copy_context().run, _ask, day, provider, key, query)
+                    _inflight[flight] = future
+                    future.add_done_callback(lambda _, flight=flight: _inflight.pop(flight, None))
+                    counts["asked"] += 1
+            futures[(provider, key)] = future
+
+    for pair, future in futures.items():
+        try:
+            answers[pair] = future.result()
+        except ProbeDeferred as e:
+            # Not cached, so a later run asks it again
+            counts["deferred"] += 1
+            print(f"⏳ Probe deferred on {pair[0]}: {e}")
+        except Exception as e:
+            counts["failed"] += 1
+            print(f"⚠️ Probe failed on {pair[0]}: {e}")
+    return answers, counts
+
+
+# --------------------------------------------------------------------
+# 🎯 Mention scoring
+# --------------------------------------------------------------------
+def _needles(client: ClientRecord) -> list:
+    needles = []
+    name = _normalize(client.client_name)
+    if name and name != "unknown":
+        needles.append(name)
+    domain = _normalize(client.domain)
+    domain = re.sub(r"^https?://", "", domain).split("/")[0]
+    domain = domain[4:] if domain.startswith("www.") else domain
+    if domain and domain != "n/a":
+        needles.append(domain)
+    return [n for n in needles if len(n) >= 3]
+
+
+def score_answer(answer: str, needles: list):
+    """(mentioned, prominence): prominence is 1.0 when named first in the answer, towards 0 when last."""
+    text = _normalize(answer)
+    positions = []
+    for needle in needles:
+        match = re.search(r"(?<!\w)" + re.escape(needle) + r"(?!\w)", text)
+        if match:
+            positions.append(match.start())
+    if not positions:
+        return False, 0.0
+    return True, round(1.0 - min(positions) / max(1, len(text)), 3)
+
+
+# --------------------------------------------------------------------
+# 🔭 Probe runs
+# --------------------------------------------------------------------
+def probe_clients(clients, day: str = None) -> dict:
+    """
+    Probe the assistants for every client's (industry, location) query set and
+    score each client against the shared answers. Returns per-client scores
+    plus call counts.
+    """
+    clients = [c if isinstance(c, ClientRecord) else ClientRecord.from_row(c) for c in clients]
+    day = day or datetime.utcnow().strftime("%Y-%m-%d")
+    providers = probe_providers()
+    if not providers or not clients:
+        return {"day": day, "providers": providers, "clients": {}, "calls": {}}
+
+    groups = defaultdict(list)
+    for client in clients:
+        groups[group_key(client)].append(client)
+    queries, group_queries = {}, {}
+    for (industry, location), members in groups.items():
+        group_queries[(industry, location)] = []
+        for query in build_queries(industry, location):
+            key = query_key(query)
+            queries[key] = query
+            group_queries[(industry, location)].append(key)
+            _stub_candidates[key] = [c.client_name for c in members]
+
+    print(f"🔭 Probing {len(providers)} assistants × {len(queries)} queries for {len(clients)} clients ({len(groups)} groups)...")
+    answers, counts = _answers(day, providers, queries)
+
+    # Clients already scored today are reported but not logged again
+    logged = {(r["client_id"], r["provider"]) for r in _db().execute("SELECT client_id, provider FROM scores WHERE day = ?", (day,))}
+    timestamp = datetime.utcnow().isoformat()
+    results, metrics, scores, score_rows = [], [], {}, []
+    for group, members in groups.items():
+        for client in members:
+            needles = _needles(client)
+            per_provider, fresh = {}, False
+            for provider in providers:
+                new_scores = (str(client.client_id), provider) not in logged
+                mentions, prominence, asked = 0, 0.0, 0
+                for key in group_queries[group]:
+                    answer = answers.get((provider, key))
+                    if answer is None:
+                        continue
+                    mentioned, weight = score_answer(answer, needles)
+                    asked += 1
+                    mentions += mentioned
+                    prominence += weight
+                    if not new_scores:
+                        continue
+                    results.append({
+                        "timestamp": timestamp,
+                        "day": day,
+                        "client_id": client.client_id,
+                        "provider": provider,
+                        "assistant": ASSISTANT_NAMES.get(provider, provider),
+                        "query": queries[key],
+                        "mentioned": mentioned,
+                        "prominence": weight,
+                    })
+                if asked:
+                    fresh = fresh or new_scores
+                    per_provider[provider] = {
+                        "queries": asked,
+                        "mentions": mentions,
+                        "mention_rate": round(mentions / asked, 3),
+                        "prominence": round(prominence / asked, 3),
+                    }
+                    score_rows.append((day, str(client.client_id), provider, asked, mentions,
+                                       per_provider[provider]["mention_rate"], per_provider[provider]["prominence"]))
+            total_asked = sum(p["queries"] for p in per_provider.values())
+            total_mentions = sum(p["mentions"] for p in per_provider.values())
+            scores[str(client.client_id)] = {
+                "mentions": total_mentions,
+                "mention_rate": round(total_mentions / total_asked, 3) if total_asked else None,
+                "by_assistant": {ASSISTANT_NAMES.get(p, p): v for p, v in per_provider.items()},
+            }
+            if total_asked and fresh:
+                for metric_type, value in (("llm_mentions", total_mentions), ("llm_mention_rate", scores[str(client.client_id)]["mention_rate"])):
+                    metrics.append({
+                        "agent_id": "A10",
+                        "client_id": client.client_id,
+                        "domain": client.domain,
+                        "metric_type": metric_type,
+                        "metric_value": value,
+                        "source": "A10 LLM probe",
+                        "notes": f"{total_asked} answers from {', '.join(ASSISTANT_NAMES.get(p, p) for p in per_provider)} ({day})",
+                    })
+
+    conn = _db()
+    with transaction(conn):
+        conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?)", score_rows)
+    if results:
+        log_llm_visibility_results(results)
+    if metrics:
+        log_visibility_metrics_bulk(metrics)
+    print(f"✅ LLM probe: {counts['asked']} asked, {counts['cached']} cached, {counts['failed']} failed, {counts['deferred']} deferred")
+    return {"day": day, "providers": providers, "clients": scores, "calls": counts}
+
+
+def probe_fleet(day: str = None) -> dict:
+    """Probe every active client; the query set is shared per industry + location."""
+    return probe_clients(list(iter_clients()), day)
+
+
+def latest_mentions(client_id, default=None):
+    """Total mentions across assistants from the client's most recent probe day."""
+    row = _db().execute(
+        """SELECT SUM(mentions) AS mentions FROM scores
+           WHERE client_id = ? AND day = (SELECT MAX(day) FROM scores WHERE client_id = ?)""",
+        (str(client_id), str(client_id)),
+    ).fetchone()
+    return default if row is None or row["mentions"] is None else row["mentions"]
+
+
+def run_a10_llm_discovery(client_id=None, business_name=None, domain=None, industry=None, ctx=None, **kwargs):
+    print("⚙️ Running A10 LLM Discovery Agent...")
+    client = ctx.client if ctx is not None else ClientRecord(client_id, business_name or "Unknown", domain or "N/A", industry or "Local Services")
+    result = probe_clients([client])
+    if not result["providers"]:
+        return {"status": "skipped", "agent": "A10", "reason": "no LLM providers configured"}
+    return {"status": "success", "agent": "A10", "data": result["clients"].get(str(client.client_id)), "calls": result["calls"]}
+
+
+if __name__ == "__main__":
+    summary = probe_fleet()
+    print(f"\n🎯 A10 probe complete: {summary['calls']}")
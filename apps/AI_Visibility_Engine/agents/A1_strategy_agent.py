@@ -50,7 +50,7 @@ def define_tiers(client_id: str):
     return tiers
 # apps/AI_Visibility_Engine/agents/A1_strategy_agent.py
 
-def run_a1_strategy(client_id: str, business_name: str, domain: str, industry: str):
+def run_a1_strategy(client_id: str, business_name: str, domain: str, industry: str, ctx=None):
     print(f"🚀 [A1] Running Strategy Agent for {business_name} ({domain}) in {industry}")
     # TODO: Replace with actual strategic analysis logic
     strategy_plan = {
@@ -58,4 +58,7 @@ def run_a1_strategy(client_id: str, business_name: str, domain: str, industry: s
         "recommended_tools": ["DataForSEO", "Similarweb", "Google Analytics"],
         "summary": "Generated baseline AI visibility strategy."
     }
+    if ctx is not None:
+        # Latest known score from the shared context (loaded once per client per run)
+        strategy_plan["baseline_visibility_score"] = ctx.latest_metric("visibility_score")
     return {"status": "success", "agent": "A1", "data": strategy_plan}
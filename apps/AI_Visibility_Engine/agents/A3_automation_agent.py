@@ -5,7 +5,7 @@ Purpose:
 Automates workflows, Zapier/n8n integrations, and AI process triggers.
 """
 
-def run_a3_automation(client_id: str, business_name: str, domain: str, industry: str):
+def run_a3_automation(client_id: str, business_name: str, domain: str, industry: str, ctx=None):
     print(f"🤖 [A3] Running Automation Agent for {business_name} ({domain})")
     
     # --- TODO: Add your real automation logic here later ---
@@ -1,20 +1,36 @@
 import os
+import json
+import hashlib
+import tempfile
 import requests
-from dotenv import load_dotenv
-from pathlib import Path
-from datetime import datetime
-from common.db_utils import log_visibility_metrics, log_research_insight, log_governance_event
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from apps.common.settings import setting
+from apps.common.db_utils import (
+    log_visibility_metrics,
+    log_research_insight,
+    log_governance_events_bulk,
+    fetch_rows_between,
+    iter_clients,
+    get_client,
+)
+from apps.common import cassette
+from apps.common.resilience import CircuitOpenError, guarded
+from apps.common.deadlines import HTTP_TIMEOUT_S, call_timeout
+from apps.common.local_store import data_dir
 
 
 def track_metrics(client_id: str):
     """Collect baseline analytics data (placeholder)."""
     print(f"📈 Tracking visibility metrics for {client_id}...")
+    from apps.AI_Visibility_Engine.agents.A10_llm_discovery_agent import latest_mentions
 
     metrics = {
         "domain_authority": 47,
         "backlinks": 134,
         "monthly_visits": 7200,
-        "llm_mentions": 3,
+        "llm_mentions": latest_mentions(client_id, default=0),   # from the latest A10 probe
         "visibility_score": 78.4
     }
 
@@ -22,19 +38,20 @@ def track_metrics(client_id: str):
     print("✅ Metrics logged to Supabase successfully.")
     return metrics
 
-# --- Load .env file robustly no matter where the script is run ---
-base_dir = Path(__file__).resolve().parents[3]  # go up to project root
-dotenv_path = base_dir / ".env"
-load_dotenv(dotenv_path=dotenv_path)
-
-print(f"✅ Loaded environment from: {dotenv_path}")
-print(f"🌐 MCP_BASE_URL = {os.getenv('MCP_BASE_URL')}")
+def _post_mcp(path: str, body: dict):
+    """POST to the MCP server; 5xx responses count as dependency failures."""
+    headers = {"Authorization": f"Bearer {setting('MCP_TOKEN')}"}
+    r = requests.post(
+        f"{setting('MCP_BASE_URL')}{path}", json=body, headers=headers, timeout=call_timeout(HTTP_TIMEOUT_S)
+    )
+    if r.status_code >= 500:
+        r.raise_for_status()
+    return r
 
 
 def run_analysis(target_url):
-    headers = {"Authorization": f"Bearer {os.getenv('MCP_TOKEN')}"}
-    body = {"url": target_url}
-    r = requests.post(f"{os.getenv('MCP_BASE_URL')}/tools/analyzeSEO", json=body, headers=headers)
+    path, body = "/tools/analyzeSEO", {"url": target_url}
+    r = cassette.http_post(path, body, lambda: guarded("mcp", _post_mcp, path, body))
     data = r.json()
 
     if r.status_code == 200:
@@ -47,17 +64,19 @@ def run_analysis(target_url):
 
 # Example test
 if __name__ == "__main__":
+    print(f"🌐 MCP_BASE_URL = {setting('MCP_BASE_URL')}")
     run_analysis("https://lotushealthandwellness.net")
 
 def track_metrics(client_id: str):
     """Collect baseline analytics data (placeholder)."""
     print(f"📈 Tracking visibility metrics for {client_id}...")
+    from apps.AI_Visibility_Engine.agents.A10_llm_discovery_agent import latest_mentions
 
     metrics = {
         "domain_authority": 47,
         "backlinks": 134,
         "monthly_visits": 7200,
-        "llm_mentions": 3,
+        "llm_mentions": latest_mentions(client_id, default=0),   # from the latest A10 probe
         "visibility_score": 78.4
     }
 
@@ -86,29 +105,258 @@ def calculate_visibility(client_id: str, old_score: float, new_score: float):
 
 
 def generate_report(client_id: str):
-    """Generate a visibility digest summary."""
+    """Generate (or reuse) last week's visibility digest for one client."""
     print(f"🗞️ Generating weekly digest for {client_id}...")
-    report = {
+    result = build_weekly_digests(client_ids=[client_id])
+    digest = result["digests"].get(str(client_id))
+    if digest is None:
+        print(f"⚠️ No active client {client_id}; digest skipped.")
+        return None
+    print("🧾 Report logged successfully.")
+    return {
         "client_id": client_id,
-        "summary": "Visibility improved 6% due to backlink acquisition and page speed optimization.",
-        "date": datetime.utcnow().isoformat()
+        "week": result["week"],
+        "summary": digest["summary"],
+        "markdown": digest["markdown"],
+        "date": digest["rendered_at"],
     }
 
-    log_governance_event(
-        agent_id="A4",
-        client_id=client_id,
-        event_type="weekly_digest",
-        description="Generated analytics report for weekly visibility performance.",
-        category="Analytics",
-        action_required=False,
-        approval_status="approved",
-        reviewer="System",
-        notes="Report auto-synced to Supabase."
+
+# --------------------------------------------------------------------
+# 🗞️ WEEKLY DIGESTS (whole fleet, a fixed number of queries)
+# --------------------------------------------------------------------
+DIGEST_WORKERS = int(setting("AIVE_DIGEST_WORKERS", "8"))
+OPEN_ACTION_LOOKBACK_WEEKS = int(setting("AIVE_DIGEST_ACTION_LOOKBACK_WEEKS", "8"))
+CLOSED_STATUSES = {"approved", "rejected", "resolved", "dismissed"}
+
+
+def week_bounds(week: str = None):
+    """("2026-W41", monday, next monday) for an ISO week label; default is the last completed week."""
+    if week:
+        year, number = week.upper().split("-W")
+        start = datetime.fromisocalendar(int(year), int(number), 1)
+    else:
+        today = datetime.utcnow().date()
+        start = datetime.combine(today - timedelta(days=today.weekday() + 7), datetime.min.time())
+    iso = start.isocalendar()
+    return f"{iso[0]}-W{iso[1]:02d}", start, start + timedelta(days=7)
+
+
+def _collect_week(start: datetime, end: datetime, client_ids=None):
+    """
+    The week's data for every client in three paged queries: metrics for this
+    and the previous week, new content, and open governance actions.
+    """
+    grouped = defaultdict(lambda: {"metrics": [], "content": [], "actions": []})
+    metrics = fetch_rows_between(
+        "visibility_metrics", (start - timedelta(days=7)).isoformat(), end.isoformat(),
+        "client_id,metric_type,metric_value,timestamp", client_ids,
     )
+    content = fetch_rows_between(
+        "content_outputs", start.isoformat(), end.isoformat(),
+        "client_id,content_type,keywords,status,timestamp", client_ids,
+    )
+    actions = fetch_rows_between(
+        "governance_events", (start - timedelta(weeks=OPEN_ACTION_LOOKBACK_WEEKS)).isoformat(), end.isoformat(),
+        "client_id,event_type,description,approval_status,timestamp", client_ids, action_required=True,
+    )
+    for key, rows in (("metrics", metrics), ("content", content), ("actions", actions)):
+        for row in rows:
+            grouped[str(row.get("client_id"))][key].append(row)
+    return grouped
 
-    print("🧾 Report logged successfully.")
-    return report
 
-def run_a4_analytics(**kwargs):
+def _metric_deltas(rows, week_start: str):
+    """Latest value per metric this week vs the latest value the week before."""
+    latest = {}
+    for row in rows:
+        try:
+            value = float(row["metric_value"])
+        except (TypeError, ValueError):
+            continue
+        stamp = str(row.get("timestamp"))
+        key = (row.get("metric_type"), "current" if stamp >= week_start else "previous")
+        if key not in latest or stamp > latest[key][0]:
+            latest[key] = (stamp, value)
+    deltas = {}
+    for metric_type in sorted({m for m, _ in latest}, key=str):
+        current, previous = latest.get((metric_type, "current")), latest.get((metric_type, "previous"))
+        deltas[metric_type] = {
+            "value": current[1] if current else None,
+            "previous": previous[1] if previous else None,
+            "delta": round(current[1] - previous[1], 4) if current and previous else None,
+        }
+    return deltas
+
+
+def _digest_inputs(client, week: str, week_start: str, data: dict) -> dict:
+    content_types = defaultdict(int)
+    for row in data["content"]:
+        content_types[row.get("content_type") or "other"] += 1
+    actions = [
+        {"event_type": a.get("event_type"), "description": a.get("description"), "since": a.get("timestamp")}
+        for a in sorted(data["actions"], key=lambda a: str(a.get("timestamp")))
+        if str(a.get("approval_status") or "").lower() not in CLOSED_STATUSES
+    ]
+    return {
+        "client_id": str(client.client_id),
+        "client_name": client.client_name,
+        "domain": client.domain,
+        "week": week,
+        "metrics": _metric_deltas(data["metrics"], week_start),
+        "new_content": dict(sorted(content_types.items())),
+        "open_actions": actions,
+    }
+
+
+def _fmt(value) -> str:
+    return "—" if value is None else f"{value:g}"
+
+
+def render_digest(inputs: dict) -> str:
+    """Markdown weekly digest for one client."""
+    lines = [f"# Weekly visibility digest — {inputs['client_name']} ({inputs['week']})", "", f"Domain: {inputs['domain']}", ""]
+    lines.append("## Metrics")
+    if inputs["metrics"]:
+        lines += ["| Metric | This week | Last week | Change |", "|---|---|---|---|"]
+        for metric_type, m in inputs["metrics"].items():
+            change = "—" if m["delta"] is None else f"{m['delta']:+g}"
+            lines.append(f"| {metric_type} | {_fmt(m['value'])} | {_fmt(m['previous'])} | {change} |")
+    else:
+        lines.append("No metrics recorded.")
+    lines += ["", "## New content"]
+    if inputs["new_content"]:
+        lines += [f"- {content_type}: {count}" for content_type, count in inputs["new_content"].items()]
+    else:
+        lines.append("No new content.")
+    lines += ["", "## Open governance actions"]
+    if inputs["open_actions"]:
+        lines += [f"- {a['event_type']}: {a['description']} (since {a['since']})" for a in inputs["open_actions"]]
+    else:
+        lines.append("None.")
+    return "\n".join(lines) + "\n"
+
+
+def _summary_line(inputs: dict) -> str:
+    moved = [m for m in inputs["metrics"].values() if m["delta"]]
+    improved = sum(1 for m in moved if m["delta"] > 0)
+    return (
+        f"{improved} metrics up, {len(moved) - improved} down; "
+        f"{sum(inputs['new_content'].values())} new content items; "
+        f"{len(inputs['open_actions'])} open governance actions."
+    )
+
+
+def _write_atomic(path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _build_digest(inputs: dict, save: bool = True):
+    """
+    Render one digest unless the cached one for (client, week) was built from the same data.
+    With save=False a fresh render is returned without being cached.
+    """
+    fingerprint = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in inputs["client_id"])
+    meta_path = data_dir() / "reports" / "digests" / inputs["week"] / f"{safe_id}.json"
+    if meta_path.exists():
+        cached = json.loads(meta_path.read_text(encoding="utf-8"))
+        if cached.get("fingerprint") == fingerprint:
+            return cached, False
+
+    markdown = render_digest(inputs)
+    digest = {
+        "client_id": inputs["client_id"],
+        "week": inputs["week"],
+        "fingerprint": fingerprint,
+        "summary": _summary_line(inputs),
+        "rendered_at": datetime.utcnow().isoformat(),
+        "markdown": markdown,
+    }
+    if save:
+        _write_atomic(meta_path.with_suffix(".md"), markdown)
+        _write_atomic(meta_path, json.dumps(digest, indent=2))
+    return digest, True
+
+
+def build_weekly_digests(week: str = None, client_ids=None, workers: int = DIGEST_WORKERS,
+                         record: bool = True) -> dict:
+    """
+    Weekly digests for all active clients (or client_ids). Data is fetched with
+    set-based queries, digests render in parallel and are cached per
+    (client, week) under data/reports/digests; one bulk governance insert
+    records the digests that were (re)rendered. record=False is for read-only
+    callers: stale digests are rendered in memory, and neither the cache nor
+    the governance log is touched.
+    """
+    label, start, end = week_bounds(week)
+    wanted = None if client_ids is None else list(dict.fromkeys(str(c) for c in client_ids))
+    if wanted is None:
+        clients = list(iter_clients())
+    else:
+        # Requested clients are looked up directly instead of paging through every client
+        clients = [c for c in map(get_client, wanted) if c is not None]
+    print(f"🗞️ Building {label} digests for {len(clients)} clients...")
+
+    if not clients:
+        return {"week": label, "clients": 0, "rendered": 0, "cached": 0, "digests": {}}
+
+    data = _collect_week(start, end, None if wanted is None else [c.client_id for c in clients])
+    inputs = [_digest_inputs(c, label, start.isoformat(), data[str(c.client_id)]) for c in clients]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda i: _build_digest(i, save=record), inputs))
+
+    rendered = [digest for digest, fresh in results if fresh]
+    if record:
+        log_governance_events_bulk([
+            {
+                "agent_id": "A4",
+                "client_id": digest["client_id"],
+                "event_type": "weekly_digest",
+                "description": f"Weekly visibility digest {label}: {digest['summary']}",
+                "category": "Analytics",
+                "action_required": False,
+                "approval_status": "approved",
+                "reviewer": "System",
+                "notes": f"data/reports/digests/{label}/ (fingerprint {digest['fingerprint'][:12]})",
+            }
+            for digest in rendered
+        ])
+    print(f"🧾 Digests {label}: {len(rendered)} rendered, {len(results) - len(rendered)} unchanged (cached)")
+    return {
+        "week": label,
+        "clients": len(results),
+        "rendered": len(rendered),
+        "cached": len(results) - len(rendered),
+        "digests": {digest["client_id"]: digest for digest, _ in results},
+    }
+
+def run_a4_analytics(client_id=None, business_name=None, domain=None, industry=None, ctx=None, **kwargs):
     print("⚙️ Running A4 Analytics Agent...")
-    return {"status": "success", "agent": "A4"}
\ No newline at end of file
+    mcp_available = setting("MCP_BASE_URL") or cassette.replaying()
+    if ctx is None or not mcp_available or ctx.domain in (None, "", "N/A"):
+        return {"status": "success", "agent": "A4"}
+
+    # analyzeSEO is memoized on the client context — later agents read it from ctx.results["A4"]
+    url = ctx.domain if ctx.domain.startswith("http") else f"https://{ctx.domain}"
+    analysis = ctx.memo("mcp.analyzeSEO", lambda: _safe_analysis(url)) or {}
+    data = analysis.get("data", analysis)
+    return {"status": "success", "agent": "A4", "data": data, "traffic_share": data.get("traffic_share", 0)}
+
+
+def _safe_analysis(url: str):
+    """
+    analyzeSEO for the orchestrator: a failed call degrades A4 instead of failing the client.
+    An open MCP circuit is re-raised so A8 records the client as dependency_unavailable.
+    """
+    try:
+        return run_analysis(url)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        print(f"⚠️ MCP analyzeSEO unavailable for {url}: {e}")
+        return None
\ No newline at end of file
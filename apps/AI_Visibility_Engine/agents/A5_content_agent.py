@@ -50,11 +50,15 @@ def generate_visuals(client_id: str):
         notes="Generated by A5_Content_Agent."
     )
 
-def run_a5_content(client_id: str, business_name: str, domain: str, industry: str):
+def run_a5_content(client_id: str, business_name: str, domain: str, industry: str, ctx=None):
     print(f"📝 [A5] Running Content Agent for {business_name} ({domain})")
     # TODO: Add content optimization pipeline
     content_summary = {
         "content_gap": ["FAQ schema missing", "Outdated blog posts"],
         "recommendations": ["Add FAQ schema", "Refresh About page"]
     }
+    if ctx is not None:
+        # Reuse A4's SEO analysis instead of calling the MCP server again
+        seo = (ctx.results.get("A4") or {}).get("data") or {}
+        content_summary["recommendations"] += seo.get("recommendations", [])
     return {"status": "success", "agent": "A5", "data": content_summary}
@@ -5,48 +5,245 @@ Generates marketing and educational content for client visibility enhancement.
 """
 
 import os
-from openai import OpenAI
+import re
+import json
+import time
+import threading
 from datetime import datetime
-from apps.common.db_utils import log_content_output, log_recommendation, log_governance_event
+from apps.common.settings import setting
+from apps.common.json_stream import IncrementalJSONObject, loads_lenient
+from apps.common.db_utils import log_content_output, log_recommendation, log_governance_event, log_research_insight
+from apps.common.llm_gateway import get_router
+from apps.common.deadlines import check_budget
+from apps.common.local_store import data_dir
 
 
-MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-A6_PROMPT = """
+# Industry-level sections: the same for every business in an industry, generated once per period
+A6_BASE_PROMPT = """
 You are a senior AI marketing strategist. Produce deeply-researched, *actionable* guidance for ranking in LLM search (ChatGPT/Claude/Gemini/Perplexity), contrasted with Google SEO.
 
 Output MUST be valid JSON with these keys:
-- executive_summary: string
 - llm_vs_google: string  # clear, practical differences (retrieval, citation, freshness, trust signals)
 - ranking_matrix: [      # weight 0–100 (sum ≈ 100), rationale, quick actions
-    { "signal": "Reviews", "weight": 0-100, "rationale": "...", "quick_actions": ["...", "..."] },
+    {{ "signal": "Reviews", "weight": 0-100, "rationale": "...", "quick_actions": ["...", "..."] }},
     ...
   ]
 - website_requirements: [ "..." ]        # concrete on-page/off-page must-haves
-- examples_that_stand_out: [ { "pattern": "Case studies hub", "why_it_works": "...", "how_to_build": "..." }, ... ]
-- 90_day_plan: [ { "week": 1, "focus": "...", "deliverables": ["..."] }, ... ]
+- examples_that_stand_out: [ {{ "pattern": "Case studies hub", "why_it_works": "...", "how_to_build": "..." }}, ... ]
 - sources_and_notes: [ "..." ]           # cite known patterns/standards; do not fabricate URLs
 
-Tailor to the business: {business_name} ({domain}) in {industry}.
+Tailor to businesses in {industry}.
 Prioritize signals LLMs favor: verifiable third-party proofs, structured knowledge, FAQ/QA coverage, entity clarity, and “answerability.”
 Make it specific, non-generic, with short, high-utility sentences.
 """
 
-def a6_generate_education(business_name: str, domain: str, industry: str):
-    prompt = A6_PROMPT.format(business_name=business_name, domain=domain, industry=industry)
-    resp = client.chat.completions.create(
-        model=MODEL,
-        messages=[
-            {"role": "system", "content": "You are a precise, no-fluff AI marketing strategist."},
-            {"role": "user", "content": prompt}
-        ],
-        response_format={ "type": "json_object" }
+# Business-specific sections: a small call on top of the cached industry playbook
+A6_PERSONALIZE_PROMPT = """
+Personalize an LLM visibility playbook for {business_name} ({domain}) in {industry}.
+Industry ranking signals (weight): {signals}
+Industry website must-haves: {requirements}
+
+Output MUST be valid JSON with these keys:
+- executive_summary: string   # 3–5 sentences specific to this business
+- 90_day_plan: [ {{ "week": 1, "focus": "...", "deliverables": ["..."] }}, ... ]
+
+Be concrete about this business's site and market; do not repeat the industry guidance.
+"""
+
+STREAM = setting("A6_STREAM", "1") == "1"   # stream completions and parse sections as they arrive
+PERSONALIZE = setting("A6_PERSONALIZE", "llm")          # llm | template (no per-client LLM call)
+PLAYBOOK_PERIOD = setting("A6_PLAYBOOK_PERIOD", "month")  # month | week — how long an industry playbook is reused
+
+_playbook_locks = {}
+_playbook_locks_guard = threading.Lock()
+
+
+def _messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": "You are a precise, no-fluff AI marketing strategist."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _parses(text: str) -> bool:
+    """Stream validation: the answer holds a JSON object, repairing truncation like the parser does."""
+    try:
+        return isinstance(loads_lenient(text), dict)
+    except ValueError:
+        return False
+
+
+def _generate(prompt: str, on_section=None, stats: dict = None) -> dict:
+    """
+    One JSON completion. When streaming, on_section(name, value) fires as soon as
+    each top-level section completes, and once per list item as "key[]".
+    Truncated output is repaired instead of re-requested.
+    """
+    stats = stats if stats is not None else {}
+    started = time.monotonic()
+    router = get_router()
+
+    if not STREAM:
+        resp = router.complete(_messages(prompt), json_mode=True)
+        stats.update(total_s=round(time.monotonic() - started, 2), streamed=False, repaired=False,
+                     provider=resp.provider, hedged=resp.hedged)
+        return json.loads(resp.text)
+
+    def emit(name, value):
+        stats.setdefault("first_section_s", round(time.monotonic() - started, 2))
+        if on_section:
+            on_section(name, value)
+
+    parser = IncrementalJSONObject(
+        on_member=emit,
+        on_item=lambda key, item: emit(f"{key}[]", item),
     )
-    import json
-    data = json.loads(resp.choices[0].message.content)
+    stream = router.stream(_messages(prompt), json_mode=True, validate=_parses)
+    try:
+        for chunk in stream:
+            check_budget()
+            parser.feed(chunk)
+        data = parser.finish()
+    except ValueError as e:
+        # Invalid streamed answer: validated completion, falling through to the next provider
+        print(f"⚠️ [A6] {e} — retrying without streaming")
+        resp = router.complete(_messages(prompt), json_mode=True)
+        stats.update(total_s=round(time.monotonic() - started, 2), streamed=False, repaired=False,
+                     provider=resp.provider, hedged=resp.hedged)
+        return json.loads(resp.text)
+    finally:
+        stream.close()
+
+    stats.update(total_s=round(time.monotonic() - started, 2), streamed=True, repaired=parser.repaired)
     return data
 
+
+# --------------------------------------------------------------------
+# 🏭 Industry playbooks (cached per industry and period under data/playbooks)
+# --------------------------------------------------------------------
+def _period(now: datetime = None) -> str:
+    now = now or datetime.utcnow()
+    if PLAYBOOK_PERIOD == "week":
+        iso = now.isocalendar()
+        return f"{iso[0]}-W{iso[1]:02d}"
+    return now.strftime("%Y-%m")
+
+
+def _playbook_path(industry: str, period: str):
+    slug = re.sub(r"[^a-z0-9]+", "-", (industry or "local services").lower()).strip("-") or "general"
+    return data_dir() / "playbooks" / period / f"{slug}.json"
+
+
+def industry_playbook(industry: str, on_section=None, stats: dict = None):
+    """
+    The industry-level playbook for the current period: read from the cache, or
+    generated once (concurrent clients of the same industry wait for it).
+    on_section only fires when the playbook is generated by this call.
+    Returns (playbook, cached).
+    """
+    path = _playbook_path(industry, _period())
+    with _playbook_locks_guard:
+        lock = _playbook_locks.setdefault(str(path), threading.Lock())
+    with lock:
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8")), True
+        print(f"🏭 [A6] Generating {industry} industry playbook for {path.parent.name}...")
+        playbook = _generate(A6_BASE_PROMPT.format(industry=industry), on_section, stats)
+        if playbook.get("ranking_matrix") or playbook.get("website_requirements"):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(playbook, indent=2), encoding="utf-8")
+            os.replace(tmp_path, path)
+        return playbook, False
+
+
+# --------------------------------------------------------------------
+# 🎯 Per-client personalization
+# --------------------------------------------------------------------
+def _top_signals(playbook: dict, limit: int = 5) -> list:
+    rows = [r for r in playbook.get("ranking_matrix", []) if isinstance(r, dict)]
+    weight = lambda r: r.get("weight") if isinstance(r.get("weight"), (int, float)) else 0
+    return sorted(rows, key=weight, reverse=True)[:limit]
+
+
+def _template_personalization(business_name: str, domain: str, industry: str, playbook: dict) -> dict:
+    """Business-specific sections filled from the industry playbook, without an LLM call."""
+    signals = _top_signals(playbook, 3)
+    requirements = playbook.get("website_requirements", [])[:3]
+    summary = f"{business_name} ({domain}) competes for AI-assistant recommendations in {industry}."
+    if signals:
+        summary += " The signals that matter most are " + ", ".join(
+            f"{r.get('signal')} ({r.get('weight')})" for r in signals) + "."
+    if requirements:
+        summary += " First priorities for the site: " + "; ".join(str(r).rstrip(".") for r in requirements) + "."
+    plan = [
+        {"week": 1 + 2 * i, "focus": f"{r.get('signal')} for {domain}", "deliverables": list(r.get("quick_actions", []))[:3]}
+        for i, r in enumerate(_top_signals(playbook, 6))
+    ]
+    return {"executive_summary": summary, "90_day_plan": plan}
+
+
+def _personalize(business_name: str, domain: str, industry: str, playbook: dict, stats: dict) -> dict:
+    if PERSONALIZE == "template":
+        stats.update(total_s=0.0, streamed=False, template=True)
+        return _template_personalization(business_name, domain, industry, playbook)
+    prompt = A6_PERSONALIZE_PROMPT.format(
+        business_name=business_name,
+        domain=domain,
+        industry=industry,
+        signals=", ".join(f"{r.get('signal')} ({r.get('weight')})" for r in _top_signals(playbook)) or "n/a",
+        requirements="; ".join(map(str, playbook.get("website_requirements", [])[:5])) or "n/a",
+    )
+    started = time.monotonic()
+    resp = get_router().complete(_messages(prompt), json_mode=True)
+    stats.update(total_s=round(time.monotonic() - started, 2), streamed=False, template=False, provider=resp.provider)
+    return json.loads(resp.text)
+
+
+def a6_generate_education(business_name: str, domain: str, industry: str, on_section=None, stats: dict = None):
+    """
+    Generate the playbook JSON: the industry sections come from the cached
+    industry playbook (generated on first use, streaming sections to
+    on_section), the business-specific sections from a small personalization
+    step. `stats` receives timings for both tiers.
+    """
+    stats = stats if stats is not None else {}
+    started = time.monotonic()
+    base_stats, personal_stats = {}, {}
+
+    playbook, cached = industry_playbook(industry, on_section=on_section, stats=base_stats)
+    personal = _personalize(business_name, domain, industry, playbook, personal_stats)
+    if on_section and "executive_summary" in personal:
+        on_section("executive_summary", personal["executive_summary"])
+
+    stats.update(
+        total_s=round(time.monotonic() - started, 2),
+        base_cached=cached,
+        base_s=base_stats.get("total_s", 0.0),
+        personalize_s=personal_stats.get("total_s", 0.0),
+        personalize=PERSONALIZE,
+        repaired=base_stats.get("repaired", False),
+    )
+    stats.setdefault("first_section_s", base_stats.get("first_section_s", stats["total_s"]))
+    if stats["repaired"]:
+        print(f"🩹 [A6] Repaired truncated output for the {industry} playbook")
+    return {"executive_summary": personal.get("executive_summary", ""), **playbook,
+            "90_day_plan": personal.get("90_day_plan", [])}
+
+
+def _log_ranking_row(client_id: str, domain: str, row: dict):
+    topic = f"Ranking Signal: {row.get('signal','')}"
+    insight = f"Weight {row.get('weight',0)} — {row.get('rationale','')}\nQuick actions: {', '.join(row.get('quick_actions',[]))}"
+    log_research_insight(
+        agent_id="A6",
+        client_id=client_id,
+        topic=topic,
+        insight=insight,
+        source="LLM (A6 synthesis)",
+        confidence=0.85,
+        notes=f"{domain}"
+    )
+
 def a6_log_outputs(client_id: str, business_name: str, domain: str, industry: str, data: dict):
     # 1) Save brochure text to content_outputs
     brochure_sections = [
@@ -73,17 +270,7 @@ def a6_log_outputs(client_id: str, business_name: str, domain: str, industry: st
 
     # 2) Save ranking matrix rows to research_insights
     for row in data.get("ranking_matrix", []):
-        topic = f"Ranking Signal: {row.get('signal','')}"
-        insight = f"Weight {row.get('weight',0)} — {row.get('rationale','')}\nQuick actions: {', '.join(row.get('quick_actions',[]))}"
-        log_research_insight(
-            agent_id="A6",
-            client_id=client_id,
-            topic=topic,
-            insight=insight,
-            source="OpenAI (A6 synthesis)",
-            confidence=0.85,
-            notes=f"{domain}"
-        )
+        _log_ranking_row(client_id, domain, row)
 
     # 3) Governance trail
     log_governance_event(
@@ -98,8 +285,18 @@ def a6_log_outputs(client_id: str, business_name: str, domain: str, industry: st
         notes=f"Sections: executive_summary, llm_vs_google, matrix, website_requirements, examples, 90_day_plan"
     )
 
-def run_a6_education(client_id: str, business_name: str, domain: str, industry: str):
-    data = a6_generate_education(business_name, domain, industry)
+def run_a6_education(client_id: str, business_name: str, domain: str, industry: str, ctx=None):
+    def on_section(name, value):
+        # Progress only: nothing is persisted until the whole document has parsed
+        if name == "ranking_matrix[]" and isinstance(value, dict):
+            print(f"📊 [A6] Ranking signal ready for {business_name}: {value.get('signal', '')}")
+        elif name == "executive_summary":
+            print(f"🧾 [A6] Executive summary ready for {business_name}: {str(value)[:120]}")
+
+    stats = {}
+    data = a6_generate_education(business_name, domain, industry, on_section=on_section, stats=stats)
+    tier = "cached" if stats["base_cached"] else f"generated in {stats['base_s']}s"
+    print(f"⏱️ [A6] {business_name}: industry playbook {tier}, personalization ({stats['personalize']}) {stats['personalize_s']}s")
     a6_log_outputs(client_id, business_name, domain, industry, data)
     return data
 
@@ -4,7 +4,7 @@ Ensures compliance, data accuracy, and AI output accountability.
 """
 
 from datetime import datetime
-from common.db_utils import log_governance_event
+from apps.common.db_utils import log_governance_event
 
 def review_status(client_id: str):
     """Simulates a compliance review event."""
@@ -32,7 +32,7 @@ def generate_audit_report(client_id: str):
     print(report)
     return report
 
-def run_a7_governance(client_id: str, business_name: str, domain: str, industry: str):
+def run_a7_governance(client_id: str, business_name: str, domain: str, industry: str, ctx=None):
     print(f"🏛️ [A7] Running Governance Agent for {business_name} ({domain})")
     # TODO: Add data checks and compliance verification
     governance_report = {
@@ -4,10 +4,12 @@ AI Design Solutions | AI Visibility Engine
 Purpose:
 Coordinates execution of all AIVE agents,
 logs outputs to Supabase, and maintains client visibility metrics.
+
+The dashboard / orchestration routes live on `router`; the served app is
+built by run_orchestrator_api.create_app(), which mounts this router.
 """
 
 import sys
-import os
 from pathlib import Path
 
 # --- Add project root to path so local imports work ---
@@ -16,55 +18,87 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 
+import asyncio
+import multiprocessing
+import threading
 import time
 import logging
-
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from apps.common.db_utils import fetch_client_list
-from pathlib import Path
-from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from apps.common.settings import setting
+from apps.common.progress import bus as progress_bus, publish, sse_events
+from apps.common import checkpoints, progress, scheduler
+from apps.common.db_utils import ClientRecord, fetch_client_list, get_client, mark_tables_written
+from apps.common.response_cache import cached_json_response
+from apps.AI_Visibility_Engine.agents.agent_registry import get_agent, startup_report
+from apps.AI_Visibility_Engine.agents.client_context import ClientContext
 from datetime import datetime
 
 # ======================================================
 # 📡 Retool API Endpoints for Render
 # ======================================================
-app = FastAPI()
+router = APIRouter()
 
 
-@app.get("/clients")
-async def get_clients():
-    """Returns all clients from Supabase."""
+@router.get("/clients")
+def get_clients(request: Request):
+    """Returns all clients from Supabase (ETag / gzip aware); runs in the threadpool, Supabase calls block."""
     try:
-        clients = fetch_client_list()
-        return JSONResponse({"clients": clients})
+        return cached_json_response(request, "clients", ["clients"], lambda: {"clients": fetch_client_list()})
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
-@app.post("/run_orchestration")
-async def trigger_orchestration(request: Request):
-    """Runs orchestration manually (triggered by Retool)."""
+@router.post("/run_orchestration")
+async def run_orchestration(request: Request):
+    """
+    Queue a manual rerun (triggered by Retool). With {"client_id": ...} the client
+    goes ahead of scheduled work; without one the whole fleet is queued.
+    """
     try:
-        body = await request.json()
-        client_id = body.get("client_id", "LOTUS001")  # default for testing
+        body = await request.json() if await request.body() else {}
+        client_id = body.get("client_id")
+        pool = orchestration_pool(request)
+        if client_id is None:
+            print("🧭 Manual orchestration triggered for all clients")
+            pool.submit(orchestrate_all_clients)
+            return JSONResponse({"status": "queued", "scope": "all"}, status_code=202)
+
+        client = await run_in_threadpool(get_client, client_id)
+        if client is None:
+            return JSONResponse({"error": f"Unknown client {client_id}"}, status_code=404)
         print(f"🧭 Manual orchestration triggered for client {client_id}")
-        orchestrate_all_clients()  # or a single-client version if you prefer
-        return JSONResponse({"status": "success", "client_id": client_id})
+        scheduler.enqueue([client], urgency=scheduler.MANUAL, source="manual")
+        pool.submit(run_queued_clients)   # a run already in progress picks it up first anyway
+        return JSONResponse(
+            {"status": "queued", "client_id": client_id, "position": scheduler.position(client_id)}, status_code=202
+        )
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+
+@router.get("/queue")
+def get_queue():
+    """Orchestration queue depth per tier, running jobs and wait times (last 24h)."""
+    return JSONResponse(scheduler.stats())
+
 # ======================================================
 # 🧾 Governance Events Endpoint for Retool
 # ======================================================
 from fastapi.responses import JSONResponse
 
-@app.get("/governance")
-def get_governance_logs():
+@router.get("/governance")
+def get_governance_logs(request: Request):
     """Return all governance events from Supabase for dashboard display."""
     try:
         from apps.common.db_utils import fetch_table_data
-        logs = fetch_table_data("governance_events")  # generic fetch helper in db_utils.py
-        return JSONResponse({"data": logs})
+        return cached_json_response(
+            request, "governance", ["governance_events"],
+            lambda: {"data": fetch_table_data("governance_events")},  # generic fetch helper in db_utils.py
+        )
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
@@ -72,66 +106,252 @@ def get_governance_logs():
 # 📊 Visibility Metrics Endpoint for Retool
 # ======================================================
 
-@app.get("/metrics")
-def get_metrics():
+@router.get("/metrics")
+def get_metrics(request: Request):
     """Return visibility and performance metrics from Supabase."""
     try:
         from apps.common.db_utils import fetch_table_data
-        metrics = fetch_table_data("visibility_metrics")
-        return JSONResponse({"data": metrics})
+        return cached_json_response(
+            request, "metrics", ["visibility_metrics"],
+            lambda: {"data": fetch_table_data("visibility_metrics")},
+        )
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@router.get("/search")
+def search_content(q: str, client_id: str = None, kind: str = None, limit: int = 20, offset: int = 0, match: str = "all"):
+    """
+    Ranked keyword / full-text search over content_outputs and research_insights.
+    kind: content_outputs | research_insights; match=any matches any term instead of all.
+    """
+    try:
+        from apps.common import search_index
+        return JSONResponse(search_index.search(q, client_id=client_id, kind=kind, limit=limit, offset=offset, match_any=match == "any"))
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@router.post("/digests/weekly")
+def build_digests(week: str = None):
+    """Build the weekly digests for every active client (?week=2026-W41, default last week)."""
+    try:
+        from apps.AI_Visibility_Engine.agents.A4_analytics_agent import build_weekly_digests
+        result = build_weekly_digests(week)
+        result["digests"] = {client_id: d["summary"] for client_id, d in result["digests"].items()}
+        return JSONResponse(result)
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid week: {e}"}, status_code=400)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+@router.get("/digests/weekly/{client_id}")
+def get_digest(client_id: str, week: str = None):
+    """
+    One client's weekly digest (served from the digest cache when its data is unchanged).
+    Read-only: a stale digest is rendered but neither cached nor logged; POST /digests/weekly does both.
+    """
+    try:
+        from apps.AI_Visibility_Engine.agents.A4_analytics_agent import build_weekly_digests
+        digest = build_weekly_digests(week, client_ids=[client_id], record=False)["digests"].get(client_id)
+        if digest is None:
+            return JSONResponse({"error": f"Unknown client {client_id}"}, status_code=404)
+        return JSONResponse(digest)
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid week: {e}"}, status_code=400)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@router.post("/llm_probes/run")
+def run_llm_probes(day: str = None):
+    """Probe AI assistants for every active client (queries shared per industry + location, cached per day)."""
+    try:
+        from apps.AI_Visibility_Engine.agents.A10_llm_discovery_agent import probe_fleet
+        return JSONResponse(probe_fleet(day))
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@router.get("/startup")
+def get_startup_report():
+    """Agents loaded so far in this process and the import cost of each."""
+    return JSONResponse(startup_report())
+
+
+@router.get("/events/stream")
+async def stream_events(request: Request, client_id: str = None):
+    """Live orchestration progress as Server-Sent Events (optionally for one client)."""
+    last_event_id = request.headers.get("last-event-id")
+    return StreamingResponse(
+        sse_events(request, client_id, int(last_event_id) if last_event_id and last_event_id.isdigit() else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/events/stats")
+def get_event_stats():
+    """Connected progress subscribers and events dropped for slow ones."""
+    return JSONResponse(progress_bus.stats())
+
+
+@router.get("/budget")
+def get_budget():
+    """Supabase request budget per table/operation: consumption today, remaining tokens, deferred writes."""
+    from apps.common import spend_guard
+    return JSONResponse(spend_guard.report())
+
+
+@router.post("/budget/flush")
+def flush_budget_queue():
+    """Write deferred rows now, as far as the budget allows."""
+    from apps.common.db_utils import flush_deferred
+    return JSONResponse({"flushed": flush_deferred()})
+
+
+@router.get("/dependencies")
+def get_dependencies():
+    """Circuit breaker state and adaptive concurrency limit per external dependency."""
+    return JSONResponse({"dependencies": dependency_status()})
+
+
 # --------------------------------------------------------
-# 🔧 FastAPI Setup (for Render health checks + manual runs)
+# 🔧 Manual runs (health checks live in run_orchestrator_api)
 # --------------------------------------------------------
 
-@app.get("/")
-def root():
-    return {"status": "AIVE Orchestrator is running!"}
+@router.get("/orchestrate")
+async def trigger_orchestration(request: Request, profile: str = None, resume: str = None, retry_failed: str = None):
+    """
+    Manual trigger endpoint for orchestration runs (?profile=sample|cprofile to capture a profile).
+    ?resume=<run_id|latest> picks up a crashed or cancelled run; ?retry_failed=<run_id|latest>
+    reruns only the clients that ended in the error branch of that run.
+    """
+    if profile is not None and profile not in profiling.MODES:
+        return JSONResponse({"error": f"profile must be one of {', '.join(profiling.MODES)}"}, status_code=400)
+    if resume is not None and retry_failed is not None:
+        return JSONResponse({"error": "resume and retry_failed are mutually exclusive"}, status_code=400)
+    try:
+        resolve_run(resume, retry_failed)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    try:
+        run = await orchestration_pool(request).run(
+            partial(orchestrate_run, profile=profile, resume=resume, retry_failed=retry_failed)
+        )
+    except ValueError as e:
+        # Taken over by another worker between the check above and the run
+        return JSONResponse({"error": str(e)}, status_code=409)
+    response = {"status": "success", "message": "AIVE orchestration completed.", "run_id": run["run_id"],
+                "mode": run["mode"], "clients": run["clients"]}
+    if run["profile"]:
+        response["profile"] = run["profile"]
+    return response
+
+
+@router.get("/runs")
+def get_runs(limit: int = 20):
+    """Latest orchestration runs with their client count per branch (checkpointed runs can be resumed)."""
+    return JSONResponse(checkpoints.recent_runs(limit))
 
-@app.get("/orchestrate")
-def trigger_orchestration():
-    """Manual trigger endpoint for orchestration runs."""
-    orchestrate_all_clients()
-    return {"status": "success", "message": "AIVE orchestration completed."}
 
 # --------------------------------------------------------
-# 🧾 Logging Setup
+# 🏭 Orchestration Process Pool (opened by the API lifespan)
 # --------------------------------------------------------
-LOG_DIR = Path(__file__).resolve().parents[3] / "logs"
-LOG_DIR.mkdir(exist_ok=True)
-timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-log_file = LOG_DIR / f"orchestrator_run_{timestamp}.log"
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    handlers=[logging.FileHandler(log_file), logging.StreamHandler()]
-)
-logging.info(f"🪄 Starting orchestrator run at {timestamp}")
+ORCHESTRATION_PROCESSES = int(setting("AIVE_ORCHESTRATION_PROCESSES", "1"))   # 0 = thread in the API process
+DASHBOARD_TABLES = ("clients", "visibility_metrics", "governance_events")
+
+
+class OrchestrationPool:
+    """
+    Runs orchestrations in spawned worker processes so a run never competes
+    with request handling for the API worker's event loop or GIL. Progress
+    events are relayed back to this process's bus for /events/stream.
+    With processes=0 runs go to the event loop's default thread pool.
+    """
+
+    def __init__(self, processes: int = 0):
+        self.processes = processes
+        self._pool = None
+        self._events = None
+        self._relay = None
+        if processes > 0:
+            ctx = multiprocessing.get_context("spawn")   # no inherited sockets, locks or sqlite handles
+            self._events = ctx.Queue()
+            self._pool = ProcessPoolExecutor(
+                max_workers=processes, mp_context=ctx, initializer=progress.forward_to, initargs=(self._events,)
+            )
+            self._relay = threading.Thread(target=progress.relay, args=(self._events,), name="progress-relay", daemon=True)
+            self._relay.start()
+
+    def submit(self, fn, *args):
+        """Start fn(*args) off the event loop (call from async code); returns an awaitable future."""
+        future = asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        future.add_done_callback(self._finished)
+        return future
+
+    async def run(self, fn, *args):
+        """Run fn(*args) off the event loop and return its result."""
+        return await self.submit(fn, *args)
+
+    def _finished(self, future):
+        if self._pool is not None:
+            # Writes happened in another process; cached dashboard bodies are stale
+            mark_tables_written(*DASHBOARD_TABLES)
+        if not future.cancelled() and future.exception() is not None:
+            logging.error(f"❌ Orchestration task failed: {future.exception()}")
+
+    def close(self):
+        """Cancel queued runs, wait for running ones, stop the relay."""
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._events.put(None)
+        self._relay.join(timeout=5)
+        self._events.close()
+        self._pool = None
+
+
+_in_process = OrchestrationPool(0)
+
+
+def orchestration_pool(request: Request) -> OrchestrationPool:
+    """The app's pool; falls back to in-process threads when the lifespan hasn't run (e.g. bare TestClient)."""
+    return getattr(request.app.state, "orchestration", None) or _in_process
+
 
 # --------------------------------------------------------
-# 🧠 Path and Environment Setup
+# 🧾 Logging Setup (one log file per orchestration run)
 # --------------------------------------------------------
-ROOT_DIR = Path(__file__).resolve().parents[3]
-APPS_DIR = ROOT_DIR / "apps"
-ENGINE_DIR = APPS_DIR / "AI_Visibility_Engine" / "agents"
+LOG_DIR = ROOT_DIR / "logs"
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 
-for path in [ROOT_DIR, APPS_DIR, ENGINE_DIR]:
-    if str(path) not in sys.path:
-        sys.path.insert(0, str(path))
 
-dotenv_path = ROOT_DIR / ".env"
-load_dotenv(dotenv_path=dotenv_path)
-logging.info(f"✅ Environment loaded from {dotenv_path}")
+def _open_run_log():
+    """Attach a file handler for this run; returns it so the caller can detach it."""
+    LOG_DIR.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    handler = logging.FileHandler(LOG_DIR / f"orchestrator_run_{timestamp}.log")
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logging.getLogger().addHandler(handler)
+    logging.info(f"🪄 Starting orchestrator run at {timestamp}")
+    return handler
 
 # --------------------------------------------------------
 # 📚 Imports
 # --------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from apps.common import profiling
+from apps.common.resilience import CircuitOpenError, dependency_status
+from apps.common.deadlines import CLIENT_BUDGET_S, BudgetExceeded, agent_budget_seconds, budget_scope
 from apps.common.db_utils import (
+    CLIENT_PAGE_SIZE,
     fetch_client_list,
+    iter_clients,
+    flush_deferred,
     log_lead_discovery,
     log_visibility_metrics,
     log_content_output,
@@ -139,47 +359,77 @@ from apps.common.db_utils import (
     log_research_insight
 )
 
-# AIVE Agents (A1–A9)
-from apps.AI_Visibility_Engine.agents.A1_strategy_agent import run_a1_strategy
-from apps.AI_Visibility_Engine.agents.A2_dev_agent import run_a2_dev
-from apps.AI_Visibility_Engine.agents.A3_automation_agent import run_a3_automation
-from apps.AI_Visibility_Engine.agents.A4_analytics_agent import run_a4_analytics
-from apps.AI_Visibility_Engine.agents.A5_content_agent import run_a5_content
-from apps.AI_Visibility_Engine.agents.A6_education_agent import run_a6_education
-from apps.AI_Visibility_Engine.agents.A7_governance_agent import run_a7_governance
-from apps.AI_Visibility_Engine.agents.A9_research_intelligence_agent import propose_aive_updates
+# AIVE Agents (A1–A10) are resolved lazily through agent_registry.get_agent()
 
 
 # --------------------------------------------------------
 # 🤖 Main Orchestration Function
 # --------------------------------------------------------
-def orchestrate_all_clients():
-    """Main loop to coordinate all AIVE agents for each active client."""
-    clients = fetch_client_list()
-    logging.info(f"📋 Found {len(clients)} active clients in Supabase.")
-
-    for client in clients:
-        cid = client["client_id"]
-        domain = client.get("domain", "N/A")
-        name = client.get("client_name", "Unknown")
-        industry = client.get("industry", "Local Services")
-
-        print(f"\n--- Running AIVE orchestration for {name} ({domain}) ---\n")
-        logging.info(f"🎯 Processing client: {name} ({domain})")
+CLIENT_WORKERS = int(setting("AIVE_CLIENT_WORKERS", "1"))   # clients processed concurrently
+CLIENT_PAUSE_S = float(setting("AIVE_CLIENT_PAUSE_S", "2"))
+
+
+def _run_agent(ctx: ClientContext, agent_id: str, /, **kwargs):
+    """
+    Run one agent step under its own sub-budget and keep its result on the context.
+    Steps already checkpointed in this run are restored instead of run again.
+    """
+    if agent_id in ctx.checkpointed:
+        result = ctx.checkpointed[agent_id]
+        publish("agent_finished", client_id=ctx.client_id, agent_id=agent_id, status="restored", duration_s=0.0)
+        ctx.record(agent_id, result)
+        return result
+
+    run_agent = get_agent(agent_id)
+    publish("agent_started", client_id=ctx.client_id, agent_id=agent_id)
+    started = time.monotonic()
+    status = "error"
+    try:
+        with profiling.agent_scope(agent_id), budget_scope(agent_id, agent_budget_seconds(agent_id)):
+            result = run_agent(**kwargs)
+        status = "ok"
+    except BudgetExceeded:
+        status = "budget_exceeded"
+        raise
+    finally:
+        publish("agent_finished", client_id=ctx.client_id, agent_id=agent_id,
+                status=status, duration_s=round(time.monotonic() - started, 3))
+    if ctx.run_id:
+        checkpoints.save_step(ctx.run_id, ctx.client_id, agent_id, result)
+    ctx.record(agent_id, result)
+    return result
+
+
+def _run_client(client, job: dict = None, run_id: str = None) -> str:
+    """Run the full agent sequence for one client within its time budget; returns the run status."""
+    ctx = ClientContext(client, run_id)
+    cid, name, domain = ctx.client_id, ctx.business_name, ctx.domain
+    agent_kwargs = ctx.agent_kwargs()
+    if run_id and not (job and job["source"] == "manual"):
+        # A manual rerun asks for fresh results, so only batch / retry jobs restore steps
+        ctx.checkpointed = checkpoints.load_steps(run_id, cid)
+
+    print(f"\n--- Running AIVE orchestration for {name} ({domain}) ---\n")
+    logging.info(f"🎯 Processing client: {name} ({domain})")
+    queue_info = {"tier": job["tier"], "source": job["source"], "queue_wait_s": job["wait_s"]} if job else {}
+    publish("client_started", client_id=cid, client_name=name, domain=domain, **queue_info)
+    started = time.monotonic()
+    status = "ok"
 
-        try:
+    try:
+        with budget_scope(f"client {cid}", CLIENT_BUDGET_S):
             # --- A1 Strategy & Planning ---
-            run_a1_strategy(client_id=cid, business_name=name, domain=domain, industry=industry)
+            _run_agent(ctx, "A1", **agent_kwargs)
 
             # --- A2 Development & Infrastructure ---
-            run_a2_dev(client_id=cid, business_name=name, domain=domain, industry=industry)
+            _run_agent(ctx, "A2", **agent_kwargs)
 
             # --- A3 Automation & Workflows ---
-            run_a3_automation(client_id=cid, business_name=name, domain=domain, industry=industry)
+            _run_agent(ctx, "A3", **agent_kwargs)
 
             # --- A4 Analytics ---
-            result = run_a4_analytics(client_id=cid, business_name=name, domain=domain, industry=industry)
-            if result:
+            result = _run_agent(ctx, "A4", **agent_kwargs)
+            if result and "A4" not in ctx.checkpointed:   # logged by the attempt that ran A4
                 log_visibility_metrics(
                     agent_id="A4",
                     client_id=cid,
@@ -190,70 +440,265 @@ def orchestrate_all_clients():
                     notes="Auto-logged by orchestrator"
                 )
 
+            # --- A10 LLM Discovery (answers shared by clients in the same industry + location) ---
+            _run_agent(ctx, "A10", **agent_kwargs)
+
             # --- A5 Content & SEO ---
-            run_a5_content(client_id=cid, business_name=name, domain=domain, industry=industry)
+            _run_agent(ctx, "A5", **agent_kwargs)
 
             # --- A6 Education (Marketing Content + Research Brochure) ---
-            run_a6_education(client_id=cid, business_name=name, domain=domain, industry=industry)
+            _run_agent(ctx, "A6", **agent_kwargs)
 
             # --- A7 Governance & Oversight ---
-            run_a7_governance(client_id=cid, business_name=name, domain=domain, industry=industry)
+            _run_agent(ctx, "A7", **agent_kwargs)
 
             # --- A9 Research & Intelligence ---
-            propose_aive_updates()
-
-            # --- Governance completion log ---
-            log_governance_event(
-                agent_id="A8",
-                client_id=cid,
-                event_type="orchestration_run",
-                description=f"Completed orchestrator run for {name}.",
-                category="System",
-                action_required=False,
-                approval_status="Approved",
-                reviewer="Alicia Sorensen",
-                notes=f"Domain processed: {domain}"
-            )
+            _run_agent(ctx, "A9")
+
+        # --- Governance completion log ---
+        log_governance_event(
+            agent_id="A8",
+            client_id=cid,
+            event_type="orchestration_run",
+            description=f"Completed orchestrator run for {name}.",
+            category="System",
+            action_required=False,
+            approval_status="Approved",
+            reviewer="Alicia Sorensen",
+            notes=f"Domain processed: {domain}"
+        )
+
+    except BudgetExceeded as e:
+        # Remaining steps are cancelled; record what did finish
+        logging.warning(f"⏱️ {name}: {e} — completed {ctx.completed or 'no agents'}")
+        status = "partial"
+        publish("error", client_id=cid, error="budget_exceeded", message=str(e))
+        log_governance_event(
+            agent_id="A8",
+            client_id=cid,
+            event_type="orchestration_partial",
+            description=f"Partially completed orchestrator run for {name} ({e.budget_name} budget exceeded).",
+            category="System",
+            action_required=True,
+            approval_status="Pending",
+            reviewer="System",
+            notes=f"Completed: {', '.join(ctx.completed) or 'none'}"
+        )
+
+    except CircuitOpenError as e:
+        # Dependency is known to be down — skip the rest of this client without waiting on it
+        logging.warning(f"⛔ Skipping {name}: {e}")
+        status = "skipped"
+        publish("error", client_id=cid, error="dependency_unavailable", dependency=e.dependency, message=str(e))
+        log_governance_event(
+            agent_id="A8",
+            client_id=cid,
+            event_type="dependency_unavailable",
+            description=f"Skipped orchestrator sequence for {name}: {e.dependency} circuit open",
+            category="System",
+            action_required=True,
+            approval_status="Pending",
+            reviewer="System",
+            notes=str(e)
+        )
 
-        except Exception as e:
-            logging.error(f"❌ Error running orchestrator for {name}: {e}")
-            log_governance_event(
-                agent_id="A8",
-                client_id=cid,
-                event_type="error",
-                description=f"Error in orchestrator sequence for {name}",
-                category="System",
-                action_required=True,
-                approval_status="Pending",
-                reviewer="System",
-                notes=str(e)
-            )
+    except Exception as e:
+        logging.error(f"❌ Error running orchestrator for {name}: {e}")
+        status = "error"
+        publish("error", client_id=cid, error=type(e).__name__, message=str(e))
+        log_governance_event(
+            agent_id="A8",
+            client_id=cid,
+            event_type="error",
+            description=f"Error in orchestrator sequence for {name}",
+            category="System",
+            action_required=True,
+            approval_status="Pending",
+            reviewer="System",
+            notes=str(e)
+        )
+
+    if run_id:
+        checkpoints.save_client(run_id, ctx.client, status)
+    publish("client_finished", client_id=cid, status=status, completed=list(ctx.completed),
+            duration_s=round(time.monotonic() - started, 3))
+    time.sleep(CLIENT_PAUSE_S)
+    return status
+
+
+def _work_queue(run_id: str, skip) -> int:
+    """Claim and run queued clients (apps.common.scheduler) until the queue is empty."""
+    count = 0
+    while True:
+        job = scheduler.claim(run_id)
+        if job is None:
+            return count
+        if job["source"] != "manual" and str(job["client"]["client_id"]) in skip:
+            # Already finished in this run (resume); a manual rerun always runs
+            scheduler.finish(job["id"], "skipped")
+            continue
+        status = "error"
+        try:
+            status = _run_client(ClientRecord(**job["client"]), job, run_id)
+        finally:
+            # Only a complete run resets staleness; failed clients keep their place near the front
+            scheduler.finish(job["id"], "done" if status == "ok" else "failed")
+        count += 1
+
+
+def _drain_queue(workers: int, run_id: str, skip=frozenset()) -> int:
+    """Run queued clients on `workers` threads, each claiming its next client as it frees up."""
+    if workers <= 1:
+        return _work_queue(run_id, skip)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(lambda _: _work_queue(run_id, skip), range(workers)))
+
+
+def _enqueue_fleet(run_id: str, skip=frozenset()) -> int:
+    """Queue every active client (page by page) for run_id, except those in `skip`."""
+    queued = 0
+    page = []
+    for client in iter_clients():
+        if str(client.client_id) in skip:
+            continue
+        page.append(client)
+        if len(page) >= CLIENT_PAGE_SIZE:
+            queued += scheduler.enqueue(page, run_id=run_id)
+            page = []
+    return queued + scheduler.enqueue(page, run_id=run_id)
+
+
+def _orchestrate(run_id: str, mode: str = "full"):
+    """mode: full (whole fleet) | resume (clients not finished in run_id) | retry_failed | queued (queue only)."""
+    publish("run_started", run_id=run_id, mode=mode)
+    started = time.monotonic()
+    count = 0
+    # Jobs whose worker died mid-run go back in the queue
+    requeued = scheduler.requeue_stale(CLIENT_BUDGET_S + 60)
+    if requeued:
+        logging.warning(f"♻️ Requeued {requeued} clients left running by a previous run")
+
+    skip = checkpoints.finished_clients(run_id) if mode != "full" else set()
+    try:
+        if mode in ("full", "resume"):
+            # Queued by tier, staleness and urgency instead of Supabase order
+            queued = _enqueue_fleet(run_id, skip)
+            logging.info(f"📥 Queued {queued} active clients from Supabase ({len(skip)} already finished in {run_id}).")
+        elif mode == "retry_failed":
+            failed = checkpoints.failed_clients(run_id)
+            skip -= {str(c["client_id"]) for c in failed}
+            scheduler.enqueue(failed, source="retry", run_id=run_id)
+            logging.info(f"🔁 Retrying {len(failed)} clients that failed in {run_id}.")
+    except Exception as e:
+        logging.error(f"❌ Error fetching clients: {e}")
+        publish("error", error=type(e).__name__, message=f"client fetch failed: {e}")
 
-        time.sleep(2)
+    try:
+        # Per-dependency AIMD limits in apps.common.resilience cap the real fan-out
+        count = _drain_queue(CLIENT_WORKERS, run_id, skip)
+        logging.info(f"📋 Processed {count} queued clients.")
+        logging.info("✅ All clients processed successfully.")
+        logging.info("🧠 Research & Intelligence updates complete.")
+    except Exception as e:
+        logging.error(f"❌ Error running queued clients after {count} processed: {e}")
+        publish("error", error=type(e).__name__, message=str(e))
 
-    logging.info("✅ All clients processed successfully.")
-    logging.info("🧠 Research & Intelligence updates complete.")
+    try:
+        # Rows deferred by the spend guardrail go out in multi-row inserts while budget allows
+        flush_deferred()
+    except Exception as e:
+        logging.error(f"❌ Error flushing deferred writes: {e}")
+
+    publish("run_finished", run_id=run_id, clients=count, duration_s=round(time.monotonic() - started, 3))
+
+
+def resolve_run(resume: str = None, retry_failed: str = None):
+    """
+    (mode, run_id) for the requested run: a new full run, or an existing run id
+    ("latest" or "" for the most recent resumable / any run). Raises ValueError
+    when there is no such run or it is still live in another worker.
+    """
+    if resume is not None:
+        latest = resume in ("", "latest")
+        run = checkpoints.latest_resumable() if latest else checkpoints.find_run(resume)
+        if run is None or run["status"] not in checkpoints.RESUMABLE:
+            raise ValueError(f"No resumable run {'found' if latest else resume} (crashed or cancelled runs can be resumed)")
+        if checkpoints.is_live(run):
+            raise ValueError(f"Run {run['run_id']} is still running in {run['owner']}")
+        return "resume", run["run_id"]
+    if retry_failed is not None:
+        run = checkpoints.find_run(retry_failed or None)
+        if run is None:
+            raise ValueError(f"No run {retry_failed or 'found'} to retry")
+        if checkpoints.is_live(run):
+            raise ValueError(f"Run {run['run_id']} is still running in {run['owner']}")
+        return "retry_failed", run["run_id"]
+    return "full", None
+
+
+def orchestrate_run(profile: str = None, resume: str = None, retry_failed: str = None, queued_only: bool = False) -> dict:
+    """
+    One checkpointed orchestration run; returns checkpoints.run_summary() plus "profile".
+    resume / retry_failed take a run id ("" or "latest" for the most recent one).
+    profile="sample" | "cprofile" wraps the run in a profiler;
+    AIVE_PROFILE_SAMPLE_RATE picks a fraction of other runs for sampling.
+    """
+    mode, run_id = ("queued", None) if queued_only else resolve_run(resume, retry_failed)
+    if run_id is None:
+        run_id = checkpoints.start_run(mode)
+        checkpoints.prune()
+        scheduler.prune()
+    elif not checkpoints.reopen_run(run_id, mode):
+        raise ValueError(f"Run {run_id} was picked up by another worker")
+    if profile is None and profiling.should_profile():
+        profile = "sample"
+
+    run_log = _open_run_log()
+    logging.info(f"🧷 Run {run_id} ({mode})")
+    status = "cancelled"   # anything that stops the run early leaves it resumable
+    try:
+        with checkpoints.lease(run_id), (profiling.profile_run(profile) if profile else nullcontext(None)) as report:
+            _orchestrate(run_id, mode)
+        status = "finished"
+        if report:
+            logging.info(f"🔥 Profile ({profile}) saved to {report['file']}")
+    finally:
+        checkpoints.finish_run(run_id, status)
+        logging.getLogger().removeHandler(run_log)
+        run_log.close()
+    return {**checkpoints.run_summary(run_id), "profile": report}
+
+
+def orchestrate_all_clients(profile: str = None):
+    """
+    Main loop to coordinate all AIVE agents for each active client.
+    Returns the profile report when the run was profiled (see orchestrate_run).
+    """
+    return orchestrate_run(profile=profile)["profile"]
+
+
+def run_queued_clients():
+    """Run whatever is already queued (e.g. manual reruns) without fetching the fleet."""
+    return orchestrate_run(queued_only=True)
 
-# ======================================================
-# 🧭 Route Debugger (for Render visibility)
-# ======================================================
-if __name__ == "__main__":
-    import uvicorn
-    from fastapi.routing import APIRoute
 
-    print("\n🔍 Registered routes:")
-    for route in app.routes:
-        if isinstance(route, APIRoute):
-            print(f"➡️  {route.path}")
+def __getattr__(name):
+    # `A8_orchestrator_agent:app` keeps working for existing deploy commands
+    if name == "app":
+        from apps.AI_Visibility_Engine.agents.run_orchestrator_api import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    print("\n🚀 Starting FastAPI for local testing...\n")
-    uvicorn.run(app, host="0.0.0.0", port=10000)
 
 # --------------------------------------------------------
-# 🧩 Run when launched directly
+# 🧩 Run when launched directly (`serve` starts the API for local testing)
 # --------------------------------------------------------
 if __name__ == "__main__":
-    print("\n🤖 AIVE Orchestrator Agent Active")
-    print("✅ All agents connected successfully.")
-    print("📊 AIVE Visibility Engine ready for execution and monitoring.\n")
-    orchestrate_all_clients()
+    if sys.argv[1:2] == ["serve"]:
+        from apps.AI_Visibility_Engine.agents.run_orchestrator_api import serve
+        serve(sys.argv[2:])
+    else:
+        print("\n🤖 AIVE Orchestrator Agent Active")
+        print("✅ All agents connected successfully.")
+        print("📊 AIVE Visibility Engine ready for execution and monitoring.\n")
+        orchestrate_all_clients()
@@ -4,17 +4,10 @@ AI Design Solutions | AI Visibility Engine
 Purpose: Continuous SEO + AI Visibility research aggregator
 """
 
-import os, json, datetime, requests
-from dotenv import load_dotenv
-from pathlib import Path
+import json, datetime
+from apps.common.settings import ROOT_DIR
 
-# --- Load environment variables ---
-base_dir = Path(__file__).resolve().parents[3]
-dotenv_path = base_dir / ".env"
-load_dotenv(dotenv_path=dotenv_path)
-
-DATA_DIR = base_dir / "data"
-DATA_DIR.mkdir(exist_ok=True)
+DATA_DIR = ROOT_DIR / "data"
 CATALOG_FILE = DATA_DIR / "metrics_catalog.json"
 
 def fetch_research_sources():
@@ -46,6 +39,7 @@ def fetch_research_sources():
 def update_metrics_catalog(new_sources):
     """Append new findings to metrics_catalog.json."""
     timestamp = datetime.datetime.now().isoformat(timespec='seconds')
+    DATA_DIR.mkdir(exist_ok=True)
     if CATALOG_FILE.exists():
         with open(CATALOG_FILE, "r") as f:
             catalog = json.load(f)
@@ -0,0 +1,125 @@
+"""
+agent_registry.py
+Lazy registry of AIVE agents.
+
+Agents are looked up by id ("A1"…"A10") and their module is only imported
+the first time the agent is actually run, so the API (and /health checks)
+start without paying for OpenAI clients, HTTP libraries or agent setup
+they may never use. Import cost of every module loaded through the
+registry is recorded for the startup report.
+
+    python -m apps.AI_Visibility_Engine.agents.agent_registry   # cold-start report
+"""
+
+import importlib
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from apps.common.settings import ROOT_DIR
+
+_PKG = "apps.AI_Visibility_Engine.agents"
+
+# agent id -> (module, entry point the orchestrator calls)
+AGENTS = {
+    "A1": (f"{_PKG}.A1_strategy_agent", "run_a1_strategy"),
+    "A2": (f"{_PKG}.A2_dev_agent", "run_a2_dev"),
+    "A3": (f"{_PKG}.A3_automation_agent", "run_a3_automation"),
+    "A4": (f"{_PKG}.A4_analytics_agent", "run_a4_analytics"),
+    "A5": (f"{_PKG}.A5_content_agent", "run_a5_content"),
+    "A6": (f"{_PKG}.A6_education_agent", "run_a6_education"),
+    "A7": (f"{_PKG}.A7_governance_agent", "run_a7_governance"),
+    "A9": (f"{_PKG}.A9_research_intelligence_agent", "propose_aive_updates"),
+    "A10": (f"{_PKG}.A10_llm_discovery_agent", "run_a10_llm_discovery"),
+}
+
+_PROCESS_START = time.perf_counter()
+_loaded = {}          # agent id -> entry point
+_import_costs = {}    # module -> seconds spent importing it (incl. first-time dependencies)
+_lock = threading.Lock()
+
+
+def agent_ids():
+    return list(AGENTS)
+
+
+def get_agent(agent_id: str):
+    """Return the agent's entry point, importing its module on first use."""
+    entry = _loaded.get(agent_id)
+    if entry is not None:
+        return entry
+    if agent_id not in AGENTS:
+        raise KeyError(f"Unknown agent: {agent_id}")
+
+    module_name, attr = AGENTS[agent_id]
+    with _lock:
+        if agent_id not in _loaded:
+            start = time.perf_counter()
+            module = importlib.import_module(module_name)
+            _import_costs.setdefault(module_name, time.perf_counter() - start)
+            _loaded[agent_id] = getattr(module, attr)
+    return _loaded[agent_id]
+
+
+def startup_report() -> dict:
+    """Which agents this process has loaded so far and what each import cost."""
+    return {
+        "uptime_s": round(time.perf_counter() - _PROCESS_START, 3),
+        "agents_loaded": sorted(_loaded),
+        "agents_pending": sorted(set(AGENTS) - set(_loaded)),
+        "import_ms": {m: round(s * 1000, 1) for m, s in sorted(_import_costs.items(), key=lambda kv: -kv[1])},
+    }
+
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def cold_start_report(modules=None, top: int = 15) -> dict:
+    """
+    Measure each module's cold import in a fresh interpreter (python -X importtime).
+    Returns cumulative ms per module plus its heaviest dependencies.
+    """
+    modules = modules or [module for module, _ in AGENTS.values()] + [f"{_PKG}.A8_orchestrator_agent"]
+
+    def importtime(code: str):
+        return subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT_DIR, capture_output=True, text=True
+        )
+
+    # Modules every interpreter imports at startup aren't the module's fault
+    baseline = {m.group(4) for m in map(_IMPORTTIME_LINE.match, importtime("pass").stderr.splitlines()) if m}
+
+    report = {}
+    for module in modules:
+        proc = importtime(f"import {module}")
+        deps = []
+        total_us = None
+        for line in proc.stderr.splitlines():
+            match = _IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            cumulative_us, name = int(match.group(2)), match.group(4)
+            if name == module:
+                total_us = cumulative_us
+            elif name not in baseline and len(match.group(3)) <= 3:   # top two levels only
+                deps.append((name, cumulative_us))
+        deps.sort(key=lambda d: -d[1])
+        report[module] = {
+            "ok": proc.returncode == 0,
+            "cumulative_ms": round((total_us or 0) / 1000, 1),
+            "heaviest": {name: round(us / 1000, 1) for name, us in deps[:top]},
+        }
+        if proc.returncode != 0:
+            report[module]["error"] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+    return report
+
+
+if __name__ == "__main__":
+    print("\n⏱️ AIVE cold-start report (fresh interpreter per module)\n")
+    for module, info in cold_start_report().items():
+        status = "✅" if info["ok"] else f"❌ {info.get('error')}"
+        print(f"{info['cumulative_ms']:>9.1f} ms  {module}  {status}")
+        for name, ms in list(info["heaviest"].items())[:5]:
+            print(f"{'':>14}{ms:>9.1f} ms  ↳ {name}")
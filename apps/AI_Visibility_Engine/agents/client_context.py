@@ -0,0 +1,69 @@
+"""
+client_context.py
+Per-client context shared by every agent during one orchestration run.
+
+The orchestrator builds one ClientContext per client and passes it to each
+agent as `ctx`. It carries the client record (db_utils.ClientRecord),
+lazily loads the client's latest metrics, memoizes external lookups (e.g.
+the MCP analyzeSEO call) so each is fetched at most once per client per
+run, and keeps every agent's return value for the agents that run after it.
+"""
+
+import threading
+
+from apps.common.db_utils import ClientRecord, fetch_client_metrics
+
+
+class ClientContext:
+    def __init__(self, client, run_id: str = None):
+        if not isinstance(client, ClientRecord):
+            client = ClientRecord.from_row(client)
+        self.client = client
+        self.run_id = run_id
+        self.client_id = client.client_id
+        self.business_name = client.client_name
+        self.domain = client.domain
+        self.industry = client.industry
+        self.location = client.location
+        self.results = {}      # agent id -> that agent's return value
+        self.completed = []    # agent ids in the order they finished
+        self.checkpointed = {} # agent id -> result saved by an earlier attempt of this run (resume / retry)
+        self._memo = {}
+        self._memo_locks = {}
+        self._lock = threading.Lock()
+
+    def agent_kwargs(self) -> dict:
+        """Keyword arguments every run_aX_* entry point accepts."""
+        return dict(
+            client_id=self.client_id,
+            business_name=self.business_name,
+            domain=self.domain,
+            industry=self.industry,
+            ctx=self,
+        )
+
+    def memo(self, key: str, loader):
+        """Return loader() for `key`, calling it at most once for this client and run."""
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+            key_lock = self._memo_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._memo:
+                self._memo[key] = loader()
+            return self._memo[key]
+
+    @property
+    def metrics(self) -> list:
+        """Latest visibility_metrics rows for this client (loaded on first access)."""
+        return self.memo("supabase.visibility_metrics", lambda: fetch_client_metrics(self.client_id))
+
+    def latest_metric(self, metric_type: str, default=None):
+        for row in self.metrics:
+            if row.get("metric_type") == metric_type:
+                return row.get("metric_value")
+        return default
+
+    def record(self, agent_id: str, result):
+        self.results[agent_id] = result
+        self.completed.append(agent_id)
@@ -0,0 +1,87 @@
+"""
+run_orchestration.py
+Command-line entry point for one orchestration run.
+
+    python -m apps.AI_Visibility_Engine.agents.run_orchestration
+    python -m apps.AI_Visibility_Engine.agents.run_orchestration --record baseline
+    python -m apps.AI_Visibility_Engine.agents.run_orchestration --replay baseline --latency zero
+    python -m apps.AI_Visibility_Engine.agents.run_orchestration --profile [sample|cprofile]
+    python -m apps.AI_Visibility_Engine.agents.run_orchestration --resume [RUN_ID]
+    python -m apps.AI_Visibility_Engine.agents.run_orchestration --retry-failed [RUN_ID]
+
+A replay with --latency zero measures the orchestrator's own overhead;
+with --latency original the run reproduces the recorded timings.
+--resume picks up a crashed or cancelled run (default: latest) from its
+checkpoints; --retry-failed reruns only the clients that ended in error.
+"""
+
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+import argparse
+import json
+import time
+
+from apps.common import cassette
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run AIVE orchestration for all active clients.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="RUN_ID", nargs="?", const="", help="record all outbound I/O to a cassette")
+    mode.add_argument("--replay", metavar="RUN_ID", nargs="?", const="", help="replay a recorded cassette (default: latest)")
+    run = parser.add_mutually_exclusive_group()
+    run.add_argument("--resume", metavar="RUN_ID", nargs="?", const="latest",
+                     help="resume a crashed or cancelled run from its checkpoints (default: latest)")
+    run.add_argument("--retry-failed", metavar="RUN_ID", nargs="?", const="latest",
+                     help="rerun only the clients that ended in error (default: latest run)")
+    parser.add_argument("--latency", choices=["original", "zero"], default="original", help="replayed call latency")
+    parser.add_argument("--workers", type=int, help="clients processed concurrently (AIVE_CLIENT_WORKERS)")
+    parser.add_argument("--pause", type=float, help="seconds to pause between clients (AIVE_CLIENT_PAUSE_S)")
+    parser.add_argument("--profile", nargs="?", const="sample", choices=["sample", "cprofile"],
+                        help="profile the run (default: sample); writes logs/profile_*.folded or .pstats")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.record is not None:
+        tape = cassette.configure(cassette.RECORD, args.record or None, args.latency)
+    elif args.replay is not None:
+        tape = cassette.configure(cassette.REPLAY, args.replay or None, args.latency)
+    else:
+        tape = cassette.configure()
+
+    # Imported after the cassette is configured so every client picks it up
+    from apps.AI_Visibility_Engine.agents import A8_orchestrator_agent as orchestrator
+
+    if args.workers is not None:
+        orchestrator.CLIENT_WORKERS = args.workers
+    if args.pause is not None:
+        orchestrator.CLIENT_PAUSE_S = args.pause
+
+    started = time.perf_counter()
+    try:
+        run = orchestrator.orchestrate_run(profile=args.profile, resume=args.resume, retry_failed=args.retry_failed)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    wall_s = time.perf_counter() - started
+    profile = run["profile"]
+
+    summary = {"run_id": run["run_id"], "mode": run["mode"], "clients": run["clients"], "steps": run["steps"],
+               "wall_s": round(wall_s, 3), **tape.summary()}
+    if profile:
+        summary["profile"] = {"file": profile["file"], "agents": profile["agents"]}
+    if tape.mode == cassette.REPLAY:
+        # Replayed I/O time is known exactly; the rest is the orchestrator itself
+        summary["overhead_s"] = round(wall_s - tape.replayed_latency_s, 3)
+    print("\n📊 Run summary")
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,178 @@
 """
 run_orchestrator_api.py
 Launches the AIVE Orchestrator as a FastAPI service for Render + Retool integration.
+
+create_app() builds the one app that serves every route: the A8 dashboard /
+orchestration router and the logging / ingestion routes below. Shared
+resources (Supabase client, response cache, orchestration process pool,
+progress relay) are opened in the lifespan hook of each worker process and
+closed on shutdown, so the app runs under several workers:
+
+    uvicorn apps.AI_Visibility_Engine.agents.run_orchestrator_api:create_app --factory --workers 4
+    gunicorn "apps.AI_Visibility_Engine.agents.run_orchestrator_api:create_app()" -k uvicorn.workers.UvicornWorker -w 4
+    python -m apps.AI_Visibility_Engine.agents.run_orchestrator_api --workers 4
+
+Each worker keeps its own response cache and progress bus; /events/stream
+shows the runs started through the worker it is connected to.
 """
 
-from fastapi import FastAPI
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+import argparse
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from apps.common.db_utils import log_visibility_metrics, log_research_insight
+from apps.common import db_utils, ingest, llm_gateway, response_cache
+from apps.common.progress import bus as progress_bus
+from apps.common.settings import setting
+from apps.common.db_utils import (
+    log_visibility_metrics,
+    log_research_insight,
+    log_visibility_metrics_bulk,
+    log_research_insights_bulk,
+)
+from apps.AI_Visibility_Engine.agents import A8_orchestrator_agent
 
 
 from datetime import datetime
 
-app = FastAPI(title="AIVE Orchestrator API", version="1.0")
+router = APIRouter()
 
-# --- Allow Retool and your local dev environment ---
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # For testing; restrict later to Retool domain
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-@app.get("/")
+# --------------------------------------------------------------------
+# ♻️ LIFESPAN (per worker process)
+# --------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open this worker's shared resources; flush and close them on shutdown."""
+    started = time.perf_counter()
+    progress_bus.open()
+    response_cache.clear()
+    try:
+        db_utils.open_client()   # one pooled HTTP client per worker, created after the fork
+    except Exception as e:
+        print(f"⚠️ Supabase client not created at startup (retried on first use): {e}")
+    app.state.orchestration = A8_orchestrator_agent.OrchestrationPool(A8_orchestrator_agent.ORCHESTRATION_PROCESSES)
+    print(f"🚀 AIVE API worker {os.getpid()} ready in {time.perf_counter() - started:.2f}s")
+    try:
+        yield
+    finally:
+        progress_bus.close()   # ends open SSE streams so shutdown doesn't wait on them
+        app.state.orchestration.close()
+        app.state.orchestration = None
+        try:
+            db_utils.flush_deferred()
+        except Exception as e:
+            print(f"⚠️ Deferred writes left queued at shutdown: {e}")
+        db_utils.close_client()
+        llm_gateway.close_router()
+        response_cache.clear()
+        print(f"👋 AIVE API worker {os.getpid()} stopped")
+
+
+def create_app() -> FastAPI:
+    """The AIVE API: every route on one app, resources managed by the lifespan hook."""
+    app = FastAPI(title="AIVE Orchestrator API", version="1.0", lifespan=lifespan)
+
+    # --- Allow Retool and your local dev environment ---
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # For testing; restrict later to Retool domain
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    app.include_router(A8_orchestrator_agent.router)
+    return app
+
+
+@router.get("/")
 def root():
     return {"status": "✅ AIVE Orchestrator API is running", "timestamp": datetime.utcnow()}
 
-@app.get("/health")
+@router.get("/health")
 def health_check():
     return {"status": "ok", "time": datetime.utcnow()}
 
-@app.post("/log/visibility")
+@router.post("/log/visibility")
 def log_visibility(agent_id: str, client_id: str, domain: str, metric_type: str, metric_value: float, source: str):
     """Test endpoint for logging visibility metrics"""
     result = log_visibility_metrics(agent_id, client_id, domain, metric_type, metric_value, source, notes="Test log via Render API")
     return {"status": "success", "details": str(result)}
 
-@app.post("/log/research")
+@router.post("/log/research")
 def log_research(agent_id: str, client_id: str, topic: str, insight: str, source: str):
     """Test endpoint for research insights"""
     result = log_research_insight(agent_id, client_id, topic, insight, source, confidence=0.95, notes="Logged via Render API")
     return {"status": "success", "details": str(result)}
+
+
+# --------------------------------------------------------------------
+# 📦 BULK INGESTION (JSON array or NDJSON body)
+# --------------------------------------------------------------------
+async def _ingest(request: Request, schema: dict, writer):
+    body = await request.body()
+    try:
+        records, errors = ingest.parse_records(body, request.headers.get("content-type", ""))
+    except ingest.IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Validation and chunked inserts are blocking; keep them off the event loop
+    rows, invalid = await run_in_threadpool(ingest.validate, records, schema, errors)
+    outcome = await run_in_threadpool(writer, rows) if rows else {"inserted": 0, "deferred": 0}
+    return {
+        "status": "success" if not invalid else "partial",
+        "received": len(records),
+        "valid": len(rows),
+        **outcome,
+        "invalid": invalid,
+    }
+
+
+@router.post("/log/visibility/batch")
+async def log_visibility_batch(request: Request):
+    """Bulk visibility metrics: a JSON array or NDJSON of {client_id, domain, metric_type, metric_value, source, ...}"""
+    return await _ingest(request, ingest.VISIBILITY_SCHEMA, log_visibility_metrics_bulk)
+
+
+@router.post("/log/research/batch")
+async def log_research_batch(request: Request):
+    """Bulk research insights: a JSON array or NDJSON of {client_id, topic, insight, source, ...}"""
+    return await _ingest(request, ingest.RESEARCH_SCHEMA, log_research_insights_bulk)
+
+
+app = create_app()
+
+
+# --------------------------------------------------------------------
+# 🚀 Local / multi-worker serving
+# --------------------------------------------------------------------
+def serve(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the AIVE API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(setting("PORT", "10000")))
+    parser.add_argument("--workers", type=int, default=int(setting("WEB_CONCURRENCY", "1")))
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    print("\n🔍 Registered routes:")
+    for path in app.openapi()["paths"]:
+        print(f"➡️  {path}")
+    print(f"\n🚀 Starting FastAPI with {args.workers} worker(s)...\n")
+    uvicorn.run(
+        "apps.AI_Visibility_Engine.agents.run_orchestrator_api:create_app",
+        factory=True, host=args.host, port=args.port, workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,170 @@
+"""
+anomaly.py
+Streaming anomaly detection for incoming visibility metrics.
+
+Every (client, metric_type) series keeps running statistics in data/anomaly.db
+that each new point updates in O(1): an EWMA level, a seasonal baseline (one
+EWMA per weekday) and the exponentially weighted variance of the residual
+against that baseline. A point is anomalous once the series has warmed up
+(AIVE_ANOMALY_WARMUP points) and its residual is both AIVE_ANOMALY_Z standard
+deviations and AIVE_ANOMALY_MIN_CHANGE (relative) away from the expected
+value. AIVE_ANOMALY_DIRECTION picks drops only (default) or both directions;
+a series alerts at most once per AIVE_ANOMALY_COOLDOWN_H hours.
+"""
+
+import json
+import math
+from datetime import datetime, timedelta, timezone
+
+from apps.common.settings import setting
+from apps.common.local_store import connect, transaction
+
+ENABLED = setting("AIVE_ANOMALY_ENABLED", "1") == "1"
+ALPHA = float(setting("AIVE_ANOMALY_ALPHA", "0.1"))                # EWMA weight of the newest point
+SEASON_ALPHA = float(setting("AIVE_ANOMALY_SEASON_ALPHA", "0.3"))  # weight within one weekday's baseline
+WARMUP = int(setting("AIVE_ANOMALY_WARMUP", "8"))
+SEASON_MIN = int(setting("AIVE_ANOMALY_SEASON_MIN", "3"))          # points per weekday before its baseline is used
+Z_THRESHOLD = float(setting("AIVE_ANOMALY_Z", "4"))
+MIN_CHANGE = float(setting("AIVE_ANOMALY_MIN_CHANGE", "0.15"))
+DIRECTION = setting("AIVE_ANOMALY_DIRECTION", "drop")              # drop | both
+COOLDOWN_H = float(setting("AIVE_ANOMALY_COOLDOWN_H", "24"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    client_id TEXT NOT NULL,
+    metric_type TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    level REAL NOT NULL,
+    resid_var REAL NOT NULL,
+    season TEXT NOT NULL,
+    last_value REAL,
+    last_ts TEXT,
+    alerted_at TEXT,
+    PRIMARY KEY (client_id, metric_type)
+);
+"""
+
+
+def _db():
+    return connect("anomaly", SCHEMA)
+
+
+def _parse_ts(value) -> datetime:
+    """Naive UTC datetime from an ISO timestamp (now when missing or unparseable)."""
+    if value is None:
+        return datetime.utcnow()
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def _update(state: dict, value: float, ts: datetime):
+    """Fold one point into the series state; returns the anomaly dict or None."""
+    slot = ts.weekday()
+    season = state["season"]                       # [[mean, count]] × 7 weekdays
+    slot_mean, slot_n = season[slot]
+    expected = slot_mean if slot_n >= SEASON_MIN else state["level"]
+
+    anomaly = None
+    if state["n"] >= WARMUP:
+        resid = value - expected
+        sd = math.sqrt(state["resid_var"])
+        z = resid / sd if sd > 0 else math.copysign(math.inf, resid) if resid else 0.0
+        change = resid / abs(expected) if expected else (math.inf if resid else 0.0)
+        direction = "drop" if resid < 0 else "spike"
+        cooled = not state["alerted_at"] or ts - _parse_ts(state["alerted_at"]) >= timedelta(hours=COOLDOWN_H)
+        if (abs(z) >= Z_THRESHOLD and abs(change) >= MIN_CHANGE and cooled
+                and (DIRECTION == "both" or direction == "drop")):
+            anomaly = {
+                "value": value,
+                "expected": round(expected, 4),
+                "previous": state["last_value"],
+                "z": round(z, 2) if math.isfinite(z) else None,
+                "change_pct": round(change * 100, 1) if math.isfinite(change) else None,
+                "direction": direction,
+            }
+            state["alerted_at"] = ts.isoformat()
+
+    # Residual variance against the baseline in use, then the baselines themselves
+    if state["n"]:
+        resid = value - expected
+        state["resid_var"] = (1 - ALPHA) * (state["resid_var"] + ALPHA * resid * resid)
+        state["level"] += ALPHA * (value - state["level"])
+    else:
+        state["level"] = value
+    season[slot] = [value, 1] if not slot_n else [slot_mean + SEASON_ALPHA * (value - slot_mean), slot_n + 1]
+    state["n"] += 1
+    state["last_value"] = value
+    state["last_ts"] = ts.isoformat()
+    return anomaly
+
+
+def observe_many(points) -> list:
+    """
+    Update the running statistics with (client_id, metric_type, value, timestamp)
+    points, in order, in one transaction. Returns the anomalies found, each a dict
+    with client_id, metric_type, value, expected, previous, z, change_pct, direction.
+    """
+    anomalies = []
+    conn = _db()
+    with transaction(conn, immediate=True):
+        states = {}
+        for client_id, metric_type, value, timestamp in points:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if not math.isfinite(value):
+                continue
+            key = (str(client_id), metric_type)
+            state = states.get(key)
+            if state is None:
+                row = conn.execute(
+                    "SELECT n, level, resid_var, season, last_value, last_ts, alerted_at FROM series "
+                    "WHERE client_id = ? AND metric_type = ?", key,
+                ).fetchone()
+                state = dict(row) if row else {
+                    "n": 0, "level": 0.0, "resid_var": 0.0, "season": None,
+                    "last_value": None, "last_ts": None, "alerted_at": None,
+                }
+                state["season"] = json.loads(state["season"]) if state["season"] else [[0.0, 0]] * 7
+                states[key] = state
+            anomaly = _update(state, value, _parse_ts(timestamp))
+            if anomaly:
+                anomalies.append({"client_id": client_id, "metric_type": metric_type, **anomaly})
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO series (client_id, metric_type, n, level, resid_var, season, last_value, last_ts, alerted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(*key, s["n"], s["level"], s["resid_var"], json.dumps(s["season"]), s["last_value"], s["last_ts"], s["alerted_at"])
+             for key, s in states.items()],
+        )
+    return anomalies
+
+
+def observe(client_id, metric_type: str, value, timestamp=None):
+    """Update one series with one point; returns its anomaly dict or None."""
+    found = observe_many([(client_id, metric_type, value, timestamp)])
+    return found[0] if found else None
+
+
+def describe(anomaly: dict) -> str:
+    """One-line summary for governance events and logs."""
+    change = f"{anomaly['change_pct']:+.1f}%" if anomaly["change_pct"] is not None else "from zero"
+    return (f"{anomaly['metric_type']} {anomaly['direction']}: {anomaly['value']:g} vs expected "
+            f"{anomaly['expected']:g} ({change})")
+
+
+def series_state(client_id, metric_type: str):
+    """Current running statistics of one series (None before its first point)."""
+    row = _db().execute(
+        "SELECT * FROM series WHERE client_id = ? AND metric_type = ?", (str(client_id), metric_type)
+    ).fetchone()
+    if row is None:
+        return None
+    state = dict(row)
+    state["season"] = json.loads(state["season"])
+    state["sd"] = math.sqrt(state["resid_var"])
+    return state
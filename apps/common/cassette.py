@@ -0,0 +1,260 @@
+"""
+cassette.py
+Record / replay of outbound agent I/O (Supabase, MCP, LLM) for deterministic runs.
+
+    AIVE_CASSETTE_MODE=record   capture every request/response with its latency
+    AIVE_CASSETTE_MODE=replay   serve them back locally, no network needed
+    AIVE_CASSETTE_RUN_ID        cassette name (default: timestamp when recording,
+                                latest recording when replaying)
+    AIVE_CASSETTE_LATENCY       "original" (sleep the recorded latency) or "zero"
+
+Cassettes live in logs/cassettes/{run_id}/{channel}.jsonl. Requests are
+matched on a key built from the parts that identify a call (method, table,
+filters, prompt…) but not volatile payloads such as insert timestamps;
+repeated calls with the same key are served back in recorded order.
+
+Local state that decides which calls are made (the SQLite stores under data/
+— dedup signatures, search index, spend buckets, scheduler — and the A6
+playbook / A4 digest caches) is not part of a cassette, so every record and
+replay session runs on a fresh, empty data folder in the temp directory.
+"""
+
+import hashlib
+import json
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from types import SimpleNamespace
+
+from apps.common import local_store
+from apps.common.settings import ROOT_DIR, setting
+
+CASSETTE_DIR = ROOT_DIR / "logs" / "cassettes"
+OFF, RECORD, REPLAY = "off", "record", "replay"
+
+
+class CassetteMiss(RuntimeError):
+    """Replay found no recorded response for a request."""
+
+
+class RecordedResponse:
+    """Stands in for a requests.Response during replay."""
+
+    def __init__(self, status_code: int, body=None, text: str = ""):
+        self.status_code = status_code
+        self._body = body
+        self.text = text if body is None else json.dumps(body)
+
+    def json(self):
+        if self._body is None:
+            return json.loads(self.text)
+        return self._body
+
+
+class Cassette:
+    def __init__(self, mode: str, run_id: str = None, latency: str = "original"):
+        if mode not in (OFF, RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.mode = mode
+        self.latency = latency
+        self.run_id = run_id or (self._latest_run_id() if mode == REPLAY else datetime.now().strftime("%Y%m%d_%H%M%S"))
+        self.path = CASSETTE_DIR / self.run_id if self.run_id else None
+        self._tapes = {}     # channel -> {key: deque(entries)}
+        self._last = {}      # (channel, key) -> last entry served
+        self._lock = threading.Lock()
+        self.stats = defaultdict(int)
+        self.replayed_latency_s = 0.0
+        if mode == REPLAY and (self.path is None or not self.path.exists()):
+            raise FileNotFoundError(f"No cassette to replay under {CASSETTE_DIR} (run id: {self.run_id})")
+        if mode == RECORD:
+            self.path.mkdir(parents=True, exist_ok=True)
+            (self.path / "meta.json").write_text(json.dumps({"run_id": self.run_id, "recorded_at": datetime.utcnow().isoformat()}))
+
+    @staticmethod
+    def _latest_run_id():
+        runs = sorted(p.name for p in CASSETTE_DIR.glob("*") if p.is_dir()) if CASSETTE_DIR.exists() else []
+        return runs[-1] if runs else None
+
+    @staticmethod
+    def key(channel: str, request: dict) -> str:
+        canonical = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha1(f"{channel}:{canonical}".encode("utf-8")).hexdigest()
+
+    # -- recording -------------------------------------------------------
+    def _write(self, channel: str, entry: dict):
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            with open(self.path / f"{channel}.jsonl", "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.stats[f"recorded_{channel}"] += 1
+
+    # -- replay ----------------------------------------------------------
+    def _tape(self, channel: str) -> dict:
+        tape = self._tapes.get(channel)
+        if tape is None:
+            tape = defaultdict(deque)
+            file = self.path / f"{channel}.jsonl"
+            if file.exists():
+                with open(file, encoding="utf-8") as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        tape[entry["key"]].append(entry)
+            self._tapes[channel] = tape
+        return tape
+
+    def _next(self, channel: str, key: str, request: dict) -> dict:
+        with self._lock:
+            queue = self._tape(channel).get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[(channel, key)] = entry
+            elif (channel, key) in self._last:
+                entry = self._last[(channel, key)]   # more calls than recorded: repeat the last answer
+                self.stats[f"repeated_{channel}"] += 1
+            else:
+                self.stats[f"missed_{channel}"] += 1
+                raise CassetteMiss(f"No recorded {channel} response for {json.dumps(request, default=str)[:200]}")
+            self.stats[f"replayed_{channel}"] += 1
+        return entry
+
+    def _sleep(self, seconds: float):
+        if self.latency == "original" and seconds > 0:
+            self.replayed_latency_s += seconds
+            time.sleep(seconds)
+
+    # -- public ----------------------------------------------------------
+    def call(self, channel: str, request: dict, live, encode=None, decode=None):
+        """Run live() (recording it) or serve the recorded answer, depending on mode."""
+        if self.mode == OFF:
+            return live()
+        key = self.key(channel, request)
+
+        if self.mode == REPLAY:
+            entry = self._next(channel, key, request)
+            self._sleep(entry["latency_s"])
+            if "error" in entry:
+                raise RuntimeError(f"[replayed] {entry['error']['type']}: {entry['error']['message']}")
+            payload = entry["response"]
+            return decode(payload) if decode else payload
+
+        started = time.monotonic()
+        try:
+            response = live()
+        except Exception as e:
+            if type(e).__name__ != "CircuitOpenError":   # breaker state is local, not part of the recording
+                self._write(channel, {"key": key, "request": request, "latency_s": time.monotonic() - started,
+                                      "error": {"type": type(e).__name__, "message": str(e)}})
+            raise
+        self._write(channel, {"key": key, "request": request, "latency_s": time.monotonic() - started,
+                              "response": encode(response) if encode else response})
+        return response
+
+    def stream(self, channel: str, request: dict, live):
+        """Generator version of call() for streamed text; keeps per-chunk timing."""
+        if self.mode == OFF:
+            yield from live()
+            return
+        key = self.key(channel, request)
+
+        if self.mode == REPLAY:
+            entry = self._next(channel, key, request)
+            for offset, chunk in zip(entry["offsets"], entry["chunks"]):
+                self._sleep(offset)
+                yield chunk
+            return
+
+        chunks, offsets = [], []
+        started = last = time.monotonic()
+        for chunk in live():
+            now = time.monotonic()
+            chunks.append(chunk)
+            offsets.append(now - last)
+            last = now
+            yield chunk
+        self._write(channel, {"key": key, "request": request, "latency_s": time.monotonic() - started,
+                              "chunks": chunks, "offsets": offsets})
+
+    def summary(self) -> dict:
+        return {
+            "mode": self.mode,
+            "run_id": self.run_id,
+            "latency": self.latency,
+            "replayed_latency_s": round(self.replayed_latency_s, 3),
+            **dict(self.stats),
+        }
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def configure(mode: str = None, run_id: str = None, latency: str = None) -> Cassette:
+    """(Re)configure the process-wide cassette; defaults come from AIVE_CASSETTE_* settings."""
+    global _active
+    with _active_lock:
+        _active = Cassette(
+            mode or setting("AIVE_CASSETTE_MODE", OFF),
+            run_id or setting("AIVE_CASSETTE_RUN_ID"),
+            latency or setting("AIVE_CASSETTE_LATENCY", "original"),
+        )
+        if _active.mode != OFF:
+            print(f"📼 Cassette {_active.mode}: {_active.path} (latency: {_active.latency})")
+            # Same (empty) local state for the recording and every replay of it
+            local_store.use_data_dir(tempfile.mkdtemp(prefix=f"aive-{_active.mode}-{_active.run_id}-"))
+            print(f"🗃️ Local stores for this session: {local_store.data_dir()}")
+    return _active
+
+
+def active() -> Cassette:
+    if _active is None:
+        return configure()
+    return _active
+
+
+def replaying() -> bool:
+    return active().mode == REPLAY
+
+
+# --------------------------------------------------------------------
+# 🔌 Channel helpers
+# --------------------------------------------------------------------
+def _query_request(query) -> dict:
+    """Identify a PostgREST query by method, table and filters (not the insert body)."""
+    req = getattr(query, "request", None)
+    if req is None:
+        return {"query": type(query).__name__}
+    return {
+        "method": str(getattr(req.http_method, "value", req.http_method)),
+        "table": str(req.path).rsplit("/", 1)[-1],
+        "params": str(req.params),
+    }
+
+
+def execute_query(query, live):
+    """Supabase query execution; the replayed response exposes .data and .count."""
+    return active().call(
+        "supabase",
+        _query_request(query),
+        live,
+        encode=lambda r: {"data": r.data, "count": getattr(r, "count", None)},
+        decode=lambda p: SimpleNamespace(data=p["data"], count=p["count"]),
+    )
+
+
+def http_post(path: str, body: dict, live):
+    """HTTP POST (MCP tools); the replayed response supports .status_code, .json() and .text."""
+    def encode(r):
+        try:
+            return {"status_code": r.status_code, "body": r.json()}
+        except ValueError:
+            return {"status_code": r.status_code, "text": r.text}
+
+    return active().call(
+        "mcp",
+        {"path": path, "body": body},
+        live,
+        encode=encode,
+        decode=lambda p: RecordedResponse(p["status_code"], p.get("body"), p.get("text", "")),
+    )
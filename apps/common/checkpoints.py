@@ -0,0 +1,262 @@
+"""
+checkpoints.py
+Per-run checkpoints for orchestration (data/checkpoints.db).
+
+Every orchestration run has a run_id. Each agent step that finishes is saved
+as (run_id, client_id, agent_id) with its JSON result, and each client's
+final branch (ok / partial / skipped / error) is saved when it ends. A run
+that crashed (still "running") or was cancelled can be resumed: finished
+clients are skipped and finished agent steps are restored from their saved
+result instead of being called again. Retrying failed clients reruns only
+the clients that ended in the error branch, from the step that failed.
+
+A live run holds a lease: its owner (host:pid) refreshes heartbeat_at every
+AIVE_RUN_HEARTBEAT_S seconds. Resumable runs are "cancelled" ones and
+"running" ones whose owner died (process gone, or no heartbeat for three
+intervals); a run that is still live can't be resumed or retried.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+
+from apps.common.settings import setting
+from apps.common.local_store import connect, transaction
+
+RESUMABLE = ("running", "cancelled")
+HEARTBEAT_S = float(setting("AIVE_RUN_HEARTBEAT_S", "30"))
+LEASE_S = 3 * HEARTBEAT_S
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    owner TEXT,
+    heartbeat_at REAL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    agent_id TEXT NOT NULL,
+    result TEXT,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (run_id, client_id, agent_id)
+);
+CREATE TABLE IF NOT EXISTS clients (
+    run_id TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    client TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (run_id, client_id)
+);
+CREATE INDEX IF NOT EXISTS clients_status ON clients(run_id, status);
+"""
+COLUMNS = {"runs": {"owner": "TEXT", "heartbeat_at": "REAL"}}   # added after the first release of the schema
+
+
+def _db():
+    return connect("checkpoints", SCHEMA, COLUMNS)
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: str) -> bool:
+    """False only when the owner ran on this host and its process is gone."""
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname():
+        return True   # another machine: only its heartbeat can tell
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+def is_live(run: dict) -> bool:
+    """A run still being worked on by its owner (running, heartbeat fresh, owner process alive)."""
+    if run["status"] != "running":
+        return False
+    heartbeat = run.get("heartbeat_at") or run["updated_at"]
+    return time.time() - heartbeat < LEASE_S and _owner_alive(run.get("owner"))
+
+
+def start_run(mode: str = "full") -> str:
+    """Register a new run owned by this process and return its id."""
+    now = time.time()
+    run_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+    conn = _db()
+    with transaction(conn, immediate=True):
+        conn.execute(
+            "INSERT INTO runs (run_id, mode, status, started_at, updated_at, owner, heartbeat_at) "
+            "VALUES (?, ?, 'running', ?, ?, ?, ?)",
+            (run_id, mode, now, now, _owner(), now),
+        )
+    return run_id
+
+
+def heartbeat(run_id: str):
+    """Renew this process's lease on a run."""
+    conn = _db()
+    with transaction(conn, immediate=True):
+        conn.execute("UPDATE runs SET heartbeat_at = ? WHERE run_id = ? AND owner = ?", (time.time(), run_id, _owner()))
+
+
+@contextmanager
+def lease(run_id: str):
+    """Keep the run's heartbeat fresh from a background thread while the block runs."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_S):
+            try:
+                heartbeat(run_id)
+            except Exception as e:
+                print(f"⚠️ Could not renew lease on run {run_id}: {e}")
+
+    thread = threading.Thread(target=beat, name=f"run-lease-{run_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def find_run(run_id: str = None):
+    """A run by id, or the latest run for None / "latest". None when there is none."""
+    conn = _db()
+    if run_id and run_id != "latest":
+        row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    else:
+        row = conn.execute("SELECT * FROM runs ORDER BY started_at DESC LIMIT 1").fetchone()
+    return dict(row) if row else None
+
+
+def latest_resumable():
+    """The newest run that is cancelled or whose owner died, or None."""
+    rows = _db().execute(
+        f"SELECT * FROM runs WHERE status IN ({','.join('?' * len(RESUMABLE))}) ORDER BY started_at DESC",
+        RESUMABLE,
+    )
+    return next((dict(row) for row in rows if not is_live(dict(row))), None)
+
+
+def reopen_run(run_id: str, mode: str) -> bool:
+    """
+    Take over an existing run (resume / retry) for this process. False when it
+    is gone or another owner still holds it — checked under the write lock, so
+    two workers can't both pick up the same run.
+    """
+    now = time.time()
+    conn = _db()
+    with transaction(conn, immediate=True):
+        row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None or is_live(dict(row)):
+            return False
+        conn.execute(
+            "UPDATE runs SET status = 'running', mode = ?, updated_at = ?, finished_at = NULL, owner = ?, heartbeat_at = ? "
+            "WHERE run_id = ?",
+            (mode, now, _owner(), now, run_id),
+        )
+    return True
+
+
+def finish_run(run_id: str, status: str = "finished"):
+    """Close a run: finished, or cancelled (still resumable)."""
+    now = time.time()
+    conn = _db()
+    with transaction(conn, immediate=True):
+        conn.execute("UPDATE runs SET status = ?, updated_at = ?, finished_at = ? WHERE run_id = ?",
+                     (status, now, now, run_id))
+
+
+def save_step(run_id: str, client_id, agent_id: str, result):
+    """Checkpoint one finished agent step."""
+    conn = _db()
+    with transaction(conn, immediate=True):
+        conn.execute(
+            "INSERT OR REPLACE INTO steps (run_id, client_id, agent_id, result, finished_at) VALUES (?, ?, ?, ?, ?)",
+            (run_id, str(client_id), agent_id, json.dumps(result, default=str), time.time()),
+        )
+        conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+
+def load_steps(run_id: str, client_id) -> dict:
+    """agent_id -> saved result for one client in one run."""
+    rows = _db().execute(
+        "SELECT agent_id, result FROM steps WHERE run_id = ? AND client_id = ?", (run_id, str(client_id))
+    ).fetchall()
+    return {row["agent_id"]: json.loads(row["result"]) if row["result"] is not None else None for row in rows}
+
+
+def save_client(run_id: str, client, status: str):
+    """Record the branch a client's sequence ended in (ok / partial / skipped / error)."""
+    data = asdict(client) if is_dataclass(client) else dict(client)
+    conn = _db()
+    with transaction(conn, immediate=True):
+        conn.execute(
+            """INSERT INTO clients (run_id, client_id, client, status, finished_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(run_id, client_id) DO UPDATE SET
+                   status = excluded.status, client = excluded.client,
+                   attempts = attempts + 1, finished_at = excluded.finished_at""",
+            (run_id, str(data["client_id"]), json.dumps(data, default=str), status, time.time()),
+        )
+
+
+def finished_clients(run_id: str) -> set:
+    """Client ids whose sequence already ended (any branch) in this run."""
+    return {row["client_id"] for row in _db().execute("SELECT client_id FROM clients WHERE run_id = ?", (run_id,))}
+
+
+def failed_clients(run_id: str) -> list:
+    """Client dicts (as queued) that ended in the error branch of this run."""
+    rows = _db().execute("SELECT client FROM clients WHERE run_id = ? AND status = 'error'", (run_id,)).fetchall()
+    return [json.loads(row["client"]) for row in rows]
+
+
+def run_summary(run_id: str) -> dict:
+    """A run with its client count per branch and number of checkpointed steps."""
+    run = find_run(run_id)
+    if run is None:
+        return None
+    conn = _db()
+    run["clients"] = {row["status"]: row["n"] for row in conn.execute(
+        "SELECT status, COUNT(*) AS n FROM clients WHERE run_id = ? GROUP BY status", (run_id,)
+    )}
+    run["steps"] = conn.execute("SELECT COUNT(*) FROM steps WHERE run_id = ?", (run_id,)).fetchone()[0]
+    return run
+
+
+def recent_runs(limit: int = 20) -> list:
+    """Summaries of the latest runs, newest first."""
+    ids = [row["run_id"] for row in _db().execute("SELECT run_id FROM runs ORDER BY started_at DESC LIMIT ?", (limit,))]
+    return [run_summary(run_id) for run_id in ids]
+
+
+def prune(keep_days: float = 14) -> int:
+    """Delete finished runs (and their steps) older than keep_days."""
+    cutoff = time.time() - keep_days * 86400
+    conn = _db()
+    with transaction(conn, immediate=True):
+        old = [row["run_id"] for row in conn.execute(
+            "SELECT run_id FROM runs WHERE status != 'running' AND started_at < ?", (cutoff,)
+        )]
+        for table in ("steps", "clients", "runs"):
+            conn.executemany(f"DELETE FROM {table} WHERE run_id = ?", [(r,) for r in old])
+    return len(old)
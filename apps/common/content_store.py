@@ -0,0 +1,133 @@
+"""
+content_store.py
+Content-addressed storage for generated text bodies (A5 copy, A6 brochures).
+
+Each body is hashed (sha256), zlib-compressed and written once to the
+`content_blobs` table. `content_outputs` rows only carry the hash, the
+original size and their metadata, so a byte-identical regeneration costs
+one hash lookup and no blob write.
+
+Expected Supabase schema:
+
+    create table content_blobs (
+        content_hash text primary key,
+        encoding     text not null default 'zlib+b64',
+        size_bytes   int8 not null,
+        body         text not null,
+        created_at   timestamptz default now()
+    );
+    alter table content_outputs
+        add column content_hash text references content_blobs (content_hash),
+        add column text_size    int8;
+"""
+
+import base64
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from apps.common import cassette, spend_guard
+from apps.common.resilience import guarded
+
+BLOB_TABLE = "content_blobs"
+ENCODING = "zlib+b64"
+_FETCH_CHUNK = 100
+
+_lock = threading.Lock()
+_known_hashes = OrderedDict()   # hashes already present in content_blobs
+_bodies = OrderedDict()         # hash -> decoded text (read-side cache)
+_KNOWN_MAX = 4096
+_BODIES_MAX = 256
+
+
+def _lru_put(cache: OrderedDict, key, value, limit: int):
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+
+def _lru_get(cache: OrderedDict, key):
+    with _lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    return None
+
+
+def hash_text(text: str) -> str:
+    """Stable content address for a text body."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode_text(text: str) -> str:
+    return base64.b64encode(zlib.compress(text.encode("utf-8"), 9)).decode("ascii")
+
+
+def decode_text(body: str, encoding: str = ENCODING) -> str:
+    if encoding != ENCODING:
+        raise ValueError(f"Unsupported content encoding: {encoding}")
+    return zlib.decompress(base64.b64decode(body)).decode("utf-8")
+
+
+def put_text(client, text: str):
+    """
+    Store `text` once and return (content_hash, size_bytes).
+    Repeated bodies are skipped in-process and ignored server-side on conflict.
+    """
+    text = text or ""
+    content_hash = hash_text(text)
+    size = len(text.encode("utf-8"))
+    if _lru_get(_known_hashes, content_hash) is None:
+        query = client.table(BLOB_TABLE).upsert(
+            {
+                "content_hash": content_hash,
+                "encoding": ENCODING,
+                "size_bytes": size,
+                "body": encode_text(text),
+            },
+            on_conflict="content_hash",
+            ignore_duplicates=True,
+        )
+        if not cassette.replaying():
+            spend_guard.charge(BLOB_TABLE, "write")
+        cassette.execute_query(query, lambda: guarded("supabase", query.execute))
+        _lru_put(_known_hashes, content_hash, True, _KNOWN_MAX)
+    _lru_put(_bodies, content_hash, text, _BODIES_MAX)
+    return content_hash, size
+
+
+def rehydrate(client, rows):
+    """Fill in `text` for content_outputs rows that only carry a content_hash."""
+    pending = {
+        row["content_hash"]
+        for row in rows
+        if row.get("content_hash") and row.get("text") is None
+    }
+    bodies = {}
+    for h in list(pending):
+        cached = _lru_get(_bodies, h)
+        if cached is not None:
+            bodies[h] = cached
+            pending.discard(h)
+
+    pending = sorted(pending)
+    for start in range(0, len(pending), _FETCH_CHUNK):
+        chunk = pending[start:start + _FETCH_CHUNK]
+        query = client.table(BLOB_TABLE).select("content_hash,encoding,body").in_("content_hash", chunk)
+        if not cassette.replaying():
+            spend_guard.charge(BLOB_TABLE, "read")
+        response = cassette.execute_query(query, lambda: guarded("supabase", query.execute))
+        for blob in response.data or []:
+            text = decode_text(blob["body"], blob.get("encoding") or ENCODING)
+            bodies[blob["content_hash"]] = text
+            _lru_put(_bodies, blob["content_hash"], text, _BODIES_MAX)
+            _lru_put(_known_hashes, blob["content_hash"], True, _KNOWN_MAX)
+
+    for row in rows:
+        h = row.get("content_hash")
+        if h and row.get("text") is None:
+            row["text"] = bodies.get(h)
+    return rows
@@ -2,34 +2,220 @@
 db_utils.py
 Handles all database logging for AIVE Agents.
 Updated to match Supabase schema (client_id = int8).
+The Supabase client is created on first use, so importing this module is cheap.
 """
 
-from dotenv import load_dotenv
-from pathlib import Path
-import os
+import json
+import threading
+from dataclasses import dataclass
 from datetime import datetime
-from supabase import create_client, Client
+from apps.common import anomaly, cassette, content_store, dedup, search_index, spend_guard
+from apps.common.spend_guard import SpendBudgetExceeded
+from apps.common.settings import ROOT_DIR, setting
+from apps.common.resilience import CircuitOpenError, guarded
+from apps.common.deadlines import SUPABASE_TIMEOUT_S, call_timeout
 
-# --- Load environment variables ---
-# Go up two directories from /apps/common/ to reach project root
-env_path = Path(__file__).resolve().parents[2] / ".env"
-print(f"🔍 Loading .env from: {env_path}")
-load_dotenv(dotenv_path=env_path)
+# --- Supabase client (created lazily by _client()) ---
+supabase = None
+_client_lock = threading.Lock()
 
-# --- Verify env variables loaded ---
-if not os.getenv("SUPABASE_URL") or not os.getenv("SUPABASE_KEY"):
-    raise ValueError("❌ Could not load SUPABASE_URL or SUPABASE_KEY from .env")
 
-# --- Initialize Supabase client ---
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def _client():
+    """Return the shared Supabase client, creating it on first use."""
+    global supabase
+    if supabase is None:
+        with _client_lock:
+            if supabase is None:
+                from supabase import create_client, ClientOptions
+
+                url, key = setting("SUPABASE_URL"), setting("SUPABASE_KEY")
+                if cassette.replaying() and not (url and key):
+                    # Replays never reach the network; the client only builds queries
+                    url, key = "http://cassette.local", "replay.replay.replay"
+                if not url or not key:
+                    raise ValueError("❌ Could not load SUPABASE_URL or SUPABASE_KEY from .env")
+                supabase = create_client(
+                    url,
+                    key,
+                    options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT_S),  # no query may hang forever
+                )
+    return supabase
+
+
+def open_client():
+    """Create the shared Supabase client now instead of on first use (API worker startup)."""
+    return _client()
+
+
+def close_client():
+    """Close the Supabase client's HTTP connections (API shutdown); the next _client() call opens a new one."""
+    global supabase
+    with _client_lock:
+        client, supabase = supabase, None
+    session = getattr(getattr(client, "_postgrest", None), "session", None)
+    if session is not None:
+        session.close()
 
 def _timestamp():
     """UTC timestamp helper"""
     return datetime.utcnow().isoformat()
 
 
+def _query_target(query):
+    """(table, "read" | "write") of a PostgREST query, for the spend guardrail."""
+    req = getattr(query, "request", None)
+    if req is None:
+        return "unknown", "read"
+    method = str(getattr(req.http_method, "value", req.http_method)).upper()
+    return str(req.path).rsplit("/", 1)[-1], "read" if method in ("GET", "HEAD", "SELECT") else "write"
+
+
+def _execute(query, charge: bool = True):
+    """
+    Run a Supabase query behind the shared circuit breaker / concurrency limit.
+    Raises BudgetExceeded once the caller's time budget is spent, and
+    SpendBudgetExceeded when the table's read budget is exhausted.
+    Recorded / replayed when a cassette is active (apps.common.cassette).
+    """
+    if charge and not cassette.replaying():
+        spend_guard.charge(*_query_target(query))
+
+    def run():
+        # The client's static timeout, capped by what's left of the caller's budget
+        timeout = call_timeout(SUPABASE_TIMEOUT_S)
+        if timeout < SUPABASE_TIMEOUT_S:
+            _bound_timeout(query, timeout)
+        return guarded("supabase", query.execute)
+
+    return cassette.execute_query(query, run)
+
+
+class _TimeoutSession:
+    """HTTP session proxy that sends every request with one query's timeout."""
+
+    def __init__(self, session, timeout: float):
+        self._session = session
+        self._timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs["timeout"] = self._timeout
+        return self._session.request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def _bound_timeout(query, timeout: float):
+    """Give one built query its own request timeout (postgrest keeps the session on its request config)."""
+    holder = getattr(query, "request", None)
+    if not hasattr(holder, "session"):
+        holder = query   # older postgrest builders hold the session themselves
+    session = getattr(holder, "session", None)
+    if session is not None and hasattr(session, "request"):
+        holder.session = _TimeoutSession(getattr(session, "_session", session), timeout)
+
+GOVERNANCE_FALLBACK_FILE = ROOT_DIR / "logs" / "governance_fallback.jsonl"
+
+
+def _record_governance_fallback(data: dict):
+    """Keep governance events locally while Supabase is unavailable."""
+    GOVERNANCE_FALLBACK_FILE.parent.mkdir(exist_ok=True)
+    with open(GOVERNANCE_FALLBACK_FILE, "a") as f:
+        f.write(json.dumps(data, default=str) + "\n")
+
+
+# --------------------------------------------------------------------
+# 🏷️ TABLE WRITE VERSIONS (drive ETag / Last-Modified on dashboard endpoints)
+# --------------------------------------------------------------------
+_table_versions = {}
+_table_versions_lock = threading.Lock()
+
+
+def _mark_table_written(table_name: str):
+    """Bump the write counter for a table after a successful insert."""
+    with _table_versions_lock:
+        version, _ = _table_versions.get(table_name, (0, None))
+        _table_versions[table_name] = (version + 1, datetime.utcnow())
+
+
+def mark_tables_written(*table_names: str):
+    """Invalidate cached dashboard responses for tables written by another process (e.g. an orchestration worker)."""
+    for table_name in table_names:
+        _mark_table_written(table_name)
+
+
+def table_version(table_name: str):
+    """Return (write_counter, last_write_utc) for a table as seen by this process."""
+    return _table_versions.get(table_name, (0, None))
+
+
+# --------------------------------------------------------------------
+# 💸 SPEND GUARDRAIL (apps.common.spend_guard)
+# --------------------------------------------------------------------
+DEFERRED = {"status": "deferred"}
+
+
+def _insert_or_defer(table_name: str, data: dict, coalesce_key: str = None):
+    """
+    Insert a non-critical row, or queue it locally when the table's write budget
+    is short (see spend_guard). Returns the insert result or DEFERRED.
+    """
+    if cassette.replaying() or spend_guard.try_write(table_name):
+        result = _execute(_client().table(table_name).insert(data), charge=False)
+        _mark_table_written(table_name)
+        return result
+    spend_guard.defer(table_name, data, coalesce_key)
+    print(f"⏳ {table_name} write deferred (Supabase write budget low)")
+    return DEFERRED
+
+
+def flush_deferred(chunk_size: int = 500) -> dict:
+    """Write queued rows with multi-row inserts while the budget allows; the rest stay queued."""
+    flushed = {}
+    for table_name, items in spend_guard.pending().items():
+        flushed[table_name] = 0
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            if not spend_guard.try_write(table_name):
+                print(f"⏳ Write budget still low — {len(items) - start} {table_name} rows stay queued")
+                break
+            try:
+                _execute(_client().table(table_name).insert([payload for _, payload in chunk]), charge=False)
+            except Exception as e:
+                print(f"❌ Error flushing deferred {table_name} rows: {e}")
+                break
+            spend_guard.remove_deferred(row_id for row_id, _ in chunk)
+            _mark_table_written(table_name)
+            flushed[table_name] += len(chunk)
+        if flushed[table_name]:
+            print(f"📤 Flushed {flushed[table_name]} deferred {table_name} rows")
+    return flushed
+
+
+def _insert_many(table_name: str, payloads: list, coalesce_keys=None, chunk_size: int = 500) -> dict:
+    """
+    Multi-row inserts in chunks of `chunk_size` (one request and one budget token
+    per chunk). Chunks the write budget can't cover are deferred.
+    Returns {"inserted", "deferred", "rows"} where rows are the inserted rows as returned.
+    """
+    inserted, deferred, returned = 0, 0, []
+    for start in range(0, len(payloads), chunk_size):
+        chunk = payloads[start:start + chunk_size]
+        if cassette.replaying() or spend_guard.try_write(table_name):
+            result = _execute(_client().table(table_name).insert(chunk), charge=False)
+            returned.extend(getattr(result, "data", None) or [])
+            inserted += len(chunk)
+        else:
+            keys = coalesce_keys[start:start + chunk_size] if coalesce_keys is not None else None
+            spend_guard.defer_many(table_name, chunk, keys)
+            deferred += len(chunk)
+    if inserted:
+        _mark_table_written(table_name)
+    if deferred:
+        print(f"⏳ {deferred} {table_name} rows deferred (Supabase write budget low)")
+    return {"inserted": inserted, "deferred": deferred, "rows": returned}
+
+
 # --------------------------------------------------------------------
 # 🧠 AGENT 1: Lead Discovery Agent
 # --------------------------------------------------------------------
@@ -46,7 +232,7 @@ def log_lead_discovery(agent_id, client_id, lead_name, source, relevance_score,
             "contact_info": contact_info,
             "notes": notes,
         }
-        result = supabase.table("lead_data").insert(data).execute()
+        result = _insert_or_defer("lead_data", data, coalesce_key=f"lead_data|{client_id}|{lead_name}")
         print("📩 Supabase insert result:", result)
         return result
     except Exception as e:
@@ -69,28 +255,101 @@ def log_visibility_metrics(agent_id, client_id, domain, metric_type, metric_valu
         "notes": notes or "",
     }
     try:
-        supabase.table("visibility_metrics").insert(payload).execute()
-        print(f"📈 Metric logged: {metric_type}={metric_value} for {domain}")
+        # Deferred metrics coalesce: only the latest value per client, domain, metric and source is kept
+        result = _insert_or_defer(
+            "visibility_metrics", payload,
+            coalesce_key=f"visibility_metrics|{client_id}|{domain}|{metric_type}|{source}",
+        )
+        if result is not DEFERRED:
+            print(f"📈 Metric logged: {metric_type}={metric_value} for {domain}")
     except Exception as e:
         print(f"❌ Error logging metric: {e}")
+        return
+    _check_anomalies([payload])
+
+def log_visibility_metrics_bulk(rows, chunk_size: int = 500) -> dict:
+    """
+    Insert many visibility_metrics rows (dicts with the log_visibility_metrics
+    fields; agent_id, notes and timestamp optional) with multi-row inserts.
+    """
+    payloads = [
+        {
+            "timestamp": row.get("timestamp") or _timestamp(),
+            "agent_id": row.get("agent_id") or "API",
+            "client_id": row["client_id"],
+            "domain": row["domain"],
+            "metric_type": row["metric_type"],
+            "metric_value": row["metric_value"],
+            "source": row["source"],
+            "notes": row.get("notes") or "",
+        }
+        for row in rows
+    ]
+    # Keyed per timestamp too: a deferred historical export keeps every point, not just the latest
+    keys = [
+        f"visibility_metrics|{p['client_id']}|{p['domain']}|{p['metric_type']}|{p['source']}|{p['timestamp']}"
+        for p in payloads
+    ]
+    outcome = _insert_many("visibility_metrics", payloads, keys, chunk_size)
+    print(f"📈 Bulk metrics: {outcome['inserted']} inserted, {outcome['deferred']} deferred")
+    anomalies = _check_anomalies(sorted(payloads, key=lambda p: str(p["timestamp"])))
+    return {"inserted": outcome["inserted"], "deferred": outcome["deferred"], "anomalies": anomalies}
+
+
+def _check_anomalies(payloads) -> int:
+    """Feed logged metrics to the streaming detector (apps.common.anomaly); anomalies become governance events."""
+    if not anomaly.ENABLED or not payloads:
+        return 0
+    try:
+        found = anomaly.observe_many(
+            (p["client_id"], p["metric_type"], p["metric_value"], p["timestamp"]) for p in payloads
+        )
+    except Exception as e:
+        print(f"❌ Error updating anomaly statistics: {e}")
+        return 0
+    events = [
+        {
+            "agent_id": "A4",
+            "client_id": a["client_id"],
+            "event_type": "metric_anomaly",
+            "description": f"Anomalous {anomaly.describe(a)}",
+            "category": "Analytics",
+            "action_required": True,
+            "approval_status": "Pending",
+            "reviewer": "System",
+            "notes": json.dumps(a, default=str),
+        }
+        for a in found
+    ]
+    for event in events:
+        print(f"🚨 {event['description']} (client {event['client_id']})")
+    if len(events) == 1:
+        log_governance_event(**events[0])
+    elif events:
+        log_governance_events_bulk(events)
+    return len(events)
+
 
 # --------------------------------------------------------------------
 # ✍️ AGENT 5: Content Engine Agent
 # --------------------------------------------------------------------
 def log_content_output(agent_id, client_id, content_type, text, keywords, status, meta):
-    """Logs generated content or social posts."""
+    """Logs generated content or social posts (body stored once in content_blobs)."""
     try:
+        content_hash, text_size = content_store.put_text(_client(), text)
         data = {
             "timestamp": _timestamp(),
             "agent_id": agent_id,
             "client_id": client_id,
             "content_type": content_type,
-            "text": text,
+            "content_hash": content_hash,
+            "text_size": text_size,
             "keywords": keywords,
             "status": status,
             "meta": meta,
         }
-        result = supabase.table("content_outputs").insert(data).execute()
+        result = _insert_or_defer("content_outputs", data)
+        _index_for_search("content_outputs", dict(data, text=text), result)
         print(f"📝 Content logged: {content_type}")
         return result
     except Exception as e:
@@ -115,18 +374,128 @@ def log_governance_event(agent_id, client_id, event_type, description, category,
             "reviewer": reviewer,
             "notes": notes,
         }
-        result = supabase.table("governance_events").insert(data).execute()
+        result = _execute(_client().table("governance_events").insert(data))
+        _mark_table_written("governance_events")
         print(f"🏛️ Governance event logged: {event_type} ({approval_status})")
         return result
+    except CircuitOpenError as e:
+        _record_governance_fallback(data)
+        print(f"⚠️ Governance event kept locally ({e}): {event_type}")
+        return None
     except Exception as e:
         print(f"❌ Error logging governance event: {e}")
         return None
 
+
+def log_governance_events_bulk(events, chunk_size: int = 500) -> int:
+    """
+    Log many governance events with multi-row inserts. Each event is a dict of
+    the log_governance_event fields; chunks that hit an open circuit are kept locally.
+    """
+    rows = [{"timestamp": _timestamp(), **event} for event in events]
+    logged = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            _execute(_client().table("governance_events").insert(chunk))
+            logged += len(chunk)
+        except CircuitOpenError as e:
+            for row in chunk:
+                _record_governance_fallback(row)
+            print(f"⚠️ {len(chunk)} governance events kept locally ({e})")
+        except Exception as e:
+            print(f"❌ Error logging {len(chunk)} governance events: {e}")
+    if logged:
+        _mark_table_written("governance_events")
+        print(f"🏛️ {logged} governance events logged")
+    return logged
+
 # --------------------------------------------------------------------
 # ✍️ AGENT 9: Research Intelligence Agent
 # --------------------------------------------------------------------
+# --------------------------------------------------------------------
+# 🔎 SEARCH INDEX (apps.common.search_index)
+# --------------------------------------------------------------------
+def _index_for_search(table_name: str, data: dict, result=None):
+    """Add a freshly logged row to the local search index; never fails the insert."""
+    try:
+        rows = getattr(result, "data", None) or []
+        row_id = rows[0].get("id") if rows and isinstance(rows[0], dict) else None
+        ref = row_id if row_id is not None else f"{data['timestamp']}:{data.get('content_hash') or data.get('topic')}"
+        search_index.index_rows(table_name, [dict(data, ref=ref)])
+    except Exception as e:
+        print(f"⚠️ Search index update failed for {table_name}: {e}")
+
+
+def backfill_search_index(page_size: int = 1000) -> dict:
+    """Index every existing content_outputs and research_insights row (safe to re-run)."""
+    counts = {}
+    for table_name in ("content_outputs", "research_insights"):
+        counts[table_name] = 0
+        start = 0
+        while True:
+            query = _client().table(table_name).select("*").order("id").range(start, start + page_size - 1)
+            rows = _execute(query).data or []
+            if table_name == "content_outputs":
+                rows = content_store.rehydrate(_client(), rows)
+            counts[table_name] += search_index.index_rows(table_name, [dict(r, ref=r["id"]) for r in rows])
+            if len(rows) < page_size:
+                break
+            start += page_size
+        print(f"🔎 Indexed {counts[table_name]} {table_name} rows")
+    return counts
+
+
+# --------------------------------------------------------------------
+# ♻️ NEAR-DUPLICATE SUPPRESSION (apps.common.dedup)
+# --------------------------------------------------------------------
+def _check_duplicate(table_name: str, scope: str, text: str):
+    """
+    Returns the dedup result for a row about to be inserted, or None when
+    suppression is off or the local index is unavailable. For a duplicate
+    the repeat is recorded (and pushed to the original row in collapse mode).
+    """
+    if dedup.ACTION == "off":
+        return None
+    try:
+        check = dedup.check(f"{table_name}|{scope}", text)
+    except Exception as e:
+        print(f"⚠️ Dedup index unavailable, inserting anyway: {e}")
+        return None
+    if check.duplicate:
+        print(f"♻️ Near-duplicate {table_name} row skipped (similarity {check.similarity:.2f}, seen {check.seen_count}×)")
+        if dedup.ACTION == "collapse" and check.remote_id:
+            try:
+                # Needs seen_count (int) and last_seen_at (timestamptz) columns on the table
+                _execute(
+                    _client().table(table_name)
+                    .update({"seen_count": check.seen_count, "last_seen_at": _timestamp()})
+                    .eq("id", check.remote_id)
+                )
+            except Exception as e:
+                print(f"⚠️ Could not collapse duplicate into {table_name} row {check.remote_id}: {e}")
+    return check
+
+
+def _remember_insert(check, result):
+    if check is not None:
+        rows = getattr(result, "data", None) or []
+        dedup.attach_remote_id(check.entry_id, rows[0].get("id") if rows and isinstance(rows[0], dict) else None)
+
+
+def _forget_insert(check):
+    if check is not None:
+        try:
+            dedup.forget(check.entry_id)
+        except Exception:
+            pass
+
+
 def log_research_insight(agent_id, client_id, topic, insight, source, confidence, notes):
-    """Logs AI-driven research or market insights."""
+    """Logs AI-driven research or market insights (near-duplicates of recent rows are skipped)."""
+    check = _check_duplicate("research_insights", f"{client_id}|{str(topic).strip().lower()}", f"{topic}\n{insight}")
+    if check is not None and check.duplicate:
+        return {"status": "duplicate", "entry_id": check.entry_id, "seen_count": check.seen_count}
     try:
         data = {
             "timestamp": _timestamp(),
@@ -138,12 +507,79 @@ def log_research_insight(agent_id, client_id, topic, insight, source, confidence
             "confidence": confidence,
             "notes": notes,
         }
-        result = supabase.table("research_insights").insert(data).execute()
+        result = _insert_or_defer("research_insights", data)
+        _remember_insert(check, result)
+        _index_for_search("research_insights", data, result)
         print(f"🔬 Research insight logged: {topic}")
         return result
     except Exception as e:
+        _forget_insert(check)
         print(f"❌ Error logging research insight: {e}")
         return None
+    except BaseException:
+        # e.g. BudgetExceeded: the retry must not be suppressed by this attempt's signature
+        _forget_insert(check)
+        raise
+
+def log_research_insights_bulk(rows, chunk_size: int = 500) -> dict:
+    """
+    Insert many research_insights rows with multi-row inserts; near-duplicates
+    (within the batch or of recent rows) are skipped like single inserts.
+    """
+    payloads, checks, duplicates = [], [], 0
+    for row in rows:
+        check = _check_duplicate(
+            "research_insights", f"{row['client_id']}|{str(row['topic']).strip().lower()}", f"{row['topic']}\n{row['insight']}"
+        )
+        if check is not None and check.duplicate:
+            duplicates += 1
+            continue
+        checks.append(check)
+        payloads.append({
+            "timestamp": row.get("timestamp") or _timestamp(),
+            "agent_id": row.get("agent_id") or "API",
+            "client_id": row["client_id"],
+            "topic": row["topic"],
+            "insight": row["insight"],
+            "source": row["source"],
+            "confidence": 0.95 if row.get("confidence") is None else row["confidence"],
+            "notes": row.get("notes") or "",
+        })
+    try:
+        outcome = _insert_many("research_insights", payloads, chunk_size=chunk_size)
+    except BaseException:
+        for check in checks:
+            _forget_insert(check)
+        raise
+
+    # Multi-row inserts return rows in payload order; without them, fall back to synthetic refs
+    returned = outcome["rows"] if len(outcome["rows"]) == len(payloads) else [{}] * len(payloads)
+    refs = []
+    for check, data, row in zip(checks, payloads, returned):
+        row_id = row.get("id") if isinstance(row, dict) else None
+        if check is not None:
+            dedup.attach_remote_id(check.entry_id, row_id)
+        refs.append(dict(data, ref=row_id if row_id is not None else f"{data['timestamp']}:{data['topic']}"))
+    try:
+        search_index.index_rows("research_insights", refs)
+    except Exception as e:
+        print(f"⚠️ Search index update failed for research_insights: {e}")
+    print(f"🔬 Bulk insights: {outcome['inserted']} inserted, {outcome['deferred']} deferred, {duplicates} duplicates skipped")
+    return {"inserted": outcome["inserted"], "deferred": outcome["deferred"], "duplicates": duplicates}
+
+
+# --------------------------------------------------------------------
+# 🔭 AGENT 10: LLM Discovery Agent
+# --------------------------------------------------------------------
+def log_llm_visibility_results(rows, chunk_size: int = 500) -> dict:
+    """
+    Logs LLM probe outcomes (one row per client, assistant and query) into
+    llm_visibility_results with multi-row inserts.
+    """
+    outcome = _insert_many("llm_visibility_results", list(rows), chunk_size=chunk_size)
+    print(f"🔭 LLM probe results: {outcome['inserted']} logged, {outcome['deferred']} deferred")
+    return {"inserted": outcome["inserted"], "deferred": outcome["deferred"]}
+
 
 # --------------------------------------------------------------------
 # 📋 CLIENT FETCH UTILITY
@@ -151,23 +587,131 @@ def log_research_insight(agent_id, client_id, topic, insight, source, confidence
 def fetch_client_list():
     """Fetch all clients from the Supabase 'clients' table."""
     try:
-        response = supabase.table("clients").select("*").execute()
+        response = _execute(_client().table("clients").select("*"))
         clients = response.data or []
         print(f"📋 Retrieved {len(clients)} clients from Supabase.")
         return clients
+    except SpendBudgetExceeded:
+        raise   # callers (dashboard cache) fall back to their last response
     except Exception as e:
         print(f"❌ Error fetching clients: {e}")
         return []
 
 
+CLIENT_PAGE_SIZE = int(setting("AIVE_CLIENT_PAGE_SIZE", "200"))
+# clients column holding the business location (city / region), if the table has one
+CLIENT_LOCATION_COLUMN = setting("AIVE_CLIENT_LOCATION_COLUMN", "")
+# clients column holding the service tier (Basic / Growth / Pro), if the table has one
+CLIENT_TIER_COLUMN = setting("AIVE_CLIENT_TIER_COLUMN", "")
+
+
+@dataclass(slots=True, frozen=True)
+class ClientRecord:
+    """The client columns the orchestrator actually uses."""
+    client_id: object
+    client_name: str = "Unknown"
+    domain: str = "N/A"
+    industry: str = "Local Services"
+    location: str = ""
+    tier: str = ""
+
+    @classmethod
+    def from_row(cls, row: dict) -> "ClientRecord":
+        return cls(
+            client_id=row["client_id"],
+            client_name=row.get("client_name", "Unknown"),
+            domain=row.get("domain", "N/A"),
+            industry=row.get("industry", "Local Services"),
+            location=row.get("location") or row.get(CLIENT_LOCATION_COLUMN or "location") or "",
+            tier=row.get("tier") or row.get(CLIENT_TIER_COLUMN or "tier") or "",
+        )
+
+
+def _client_columns() -> str:
+    columns = "client_id,client_name,domain,industry"
+    if CLIENT_LOCATION_COLUMN:
+        columns += f",location:{CLIENT_LOCATION_COLUMN}"   # PostgREST column alias
+    if CLIENT_TIER_COLUMN:
+        columns += f",tier:{CLIENT_TIER_COLUMN}"
+    return columns
+
+
+def iter_clients(page_size: int = CLIENT_PAGE_SIZE):
+    """
+    Yield ClientRecords page by page (ordered by client_id), fetching the next
+    page only when the caller is ready for it — memory stays at one page.
+    """
+    columns = _client_columns()
+    start = 0
+    while True:
+        query = (
+            _client().table("clients")
+            .select(columns)
+            .order("client_id")
+            .range(start, start + page_size - 1)
+        )
+        rows = _execute(query).data or []
+        for row in rows:
+            yield ClientRecord.from_row(row)
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+def get_client(client_id):
+    """One client's ClientRecord (None if there is no such client)."""
+    query = _client().table("clients").select(_client_columns()).eq("client_id", client_id).limit(1)
+    rows = _execute(query).data or []
+    return ClientRecord.from_row(rows[0]) if rows else None
+
+
+def fetch_client_metrics(client_id, limit: int = 50):
+    """Fetch a client's most recent visibility_metrics rows (newest first)."""
+    try:
+        query = (
+            _client().table("visibility_metrics")
+            .select("metric_type,metric_value,source,timestamp")
+            .eq("client_id", client_id)
+            .order("timestamp", desc=True)
+            .limit(limit)
+        )
+        return _execute(query).data or []
+    except Exception as e:
+        print(f"❌ Error fetching metrics for client {client_id}: {e}")
+        return []
+
+
+def fetch_rows_between(table_name: str, start: str, end: str, columns: str = "*", client_ids=None,
+                       page_size: int = 1000, **equals):
+    """
+    Every row of a table with start <= timestamp < end, across all clients, in
+    one paged query (optionally restricted to client_ids and column == value filters).
+    """
+    rows, offset = [], 0
+    while True:
+        query = _client().table(table_name).select(columns).gte("timestamp", start).lt("timestamp", end)
+        if client_ids is not None:
+            query = query.in_("client_id", list(client_ids))
+        for column, value in equals.items():
+            query = query.eq(column, value)
+        page = _execute(query.order("timestamp").range(offset, offset + page_size - 1)).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+
 def log_recommendation(client_id: str, domain: str, recommendation: str, source: str = "A6", notes: str = ""):
     """
     Logs content or educational recommendations into the Supabase recommendations table.
+    Near-duplicates of a recent recommendation for the same client and source are skipped.
     """
     print(f"📝 [DB] Logging recommendation for {domain}: {recommendation}")
 
+    check = _check_duplicate("recommendations", f"{client_id}|{source}", recommendation)
+    if check is not None and check.duplicate:
+        return True
     try:
-        from common.supabase_client import supabase  # or adjust if you import differently
         data = {
             "client_id": client_id,
             "domain": domain,
@@ -175,18 +719,27 @@ def log_recommendation(client_id: str, domain: str, recommendation: str, source:
             "source": source,
             "notes": notes
         }
-        supabase.table("recommendations").insert(data).execute()
+        result = _insert_or_defer("recommendations", data)
+        _remember_insert(check, result)
         print("✅ Recommendation logged successfully.")
         return True
     except Exception as e:
+        _forget_insert(check)
         print(f"⚠️ Failed to log recommendation: {e}")
         return False
+    except BaseException:
+        _forget_insert(check)
+        raise
 
 def fetch_table_data(table_name: str):
     """Fetch all records from a specified Supabase table."""
     try:
-        response = supabase.table(table_name).select("*").execute()
+        response = _execute(_client().table(table_name).select("*"))
+        if table_name == "content_outputs":
+            return content_store.rehydrate(_client(), response.data or [])
         return response.data
+    except SpendBudgetExceeded:
+        raise   # callers (dashboard cache) fall back to their last response
     except Exception as e:
         print(f"❌ Error fetching table {table_name}: {e}")
         return []
@@ -0,0 +1,111 @@
+"""
+deadlines.py
+Per-client and per-agent time budgets with cooperative cancellation.
+
+The orchestrator opens a client budget, and a nested sub-budget for each
+agent; a child never outlives its parent. The active budget lives in a
+context variable, so any outbound call can size its timeout with
+call_timeout(default) and every guarded() call checks it first. Once a
+budget is spent, BudgetExceeded is raised at the next check point.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+from apps.common.settings import setting
+
+CLIENT_BUDGET_S = float(setting("AIVE_CLIENT_BUDGET_S", "600"))
+DEFAULT_AGENT_BUDGET_S = float(setting("AIVE_AGENT_BUDGET_S", "60"))
+
+# Per-agent sub-budgets (seconds); override with AIVE_AGENT_BUDGET_<ID>, e.g. AIVE_AGENT_BUDGET_A6=300
+AGENT_BUDGETS = {
+    "A6": 240.0,
+    "A10": 180.0,
+}
+
+# Default per-call timeouts when no budget is active
+HTTP_TIMEOUT_S = float(setting("AIVE_HTTP_TIMEOUT_S", "30"))
+LLM_TIMEOUT_S = float(setting("AIVE_LLM_TIMEOUT_S", "120"))
+SUPABASE_TIMEOUT_S = float(setting("AIVE_SUPABASE_TIMEOUT_S", "15"))
+
+
+class BudgetExceeded(BaseException):
+    """
+    Raised when the active time budget has been spent.
+    Like asyncio.CancelledError it derives from BaseException, so the agents'
+    broad `except Exception` handlers don't swallow the cancellation.
+    """
+
+    def __init__(self, budget_name: str):
+        super().__init__(f"time budget exceeded: {budget_name}")
+        self.budget_name = budget_name
+
+
+class Budget:
+    def __init__(self, name: str, seconds: float, parent: "Budget" = None):
+        self.name = name
+        self.parent = parent
+        deadline = time.monotonic() + seconds
+        if parent is not None and parent.deadline < deadline:
+            # Parent runs out first — report the parent when it does
+            deadline = parent.deadline
+            self.name = parent.name
+        self.deadline = deadline
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def check(self):
+        if self.expired():
+            raise BudgetExceeded(self.name)
+
+
+_current = contextvars.ContextVar("aive_budget", default=None)
+
+
+def agent_budget_seconds(agent_id: str) -> float:
+    override = setting(f"AIVE_AGENT_BUDGET_{agent_id}")
+    if override:
+        return float(override)
+    return AGENT_BUDGETS.get(agent_id, DEFAULT_AGENT_BUDGET_S)
+
+
+@contextmanager
+def budget_scope(name: str, seconds: float):
+    """Run the enclosed block under a (nested) time budget."""
+    budget = Budget(name, seconds, parent=_current.get())
+    budget.check()
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+
+
+def current_budget():
+    return _current.get()
+
+
+def check_budget():
+    """Cooperative cancellation point."""
+    budget = _current.get()
+    if budget is not None:
+        budget.check()
+
+
+def budget_expired() -> bool:
+    budget = _current.get()
+    return budget is not None and budget.expired()
+
+
+def call_timeout(default: float) -> float:
+    """Timeout for an outbound call: the default, capped by what's left of the budget."""
+    budget = _current.get()
+    if budget is None:
+        return default
+    budget.check()
+    return min(default, budget.remaining())
@@ -0,0 +1,183 @@
+"""
+dedup.py
+Near-duplicate detection for generated rows (research insights, recommendations).
+
+Each row's text is reduced to word 3-gram shingles (numbers masked) and a
+64-value MinHash signature; signatures are banded (16 bands × 4 rows) into
+an LSH index in data/dedup.db so candidates are found with a few indexed lookups instead of
+a scan. A candidate whose estimated Jaccard similarity reaches
+AIVE_DEDUP_THRESHOLD (default 0.85) within the recent window
+(AIVE_DEDUP_WINDOW_DAYS, default 30) and whose numbers are exactly the same
+is a near-duplicate: the caller skips the insert and the entry's "seen
+again" counter is bumped instead. "Visibility up 3.2 points" and "… 12.7
+points" are different rows.
+
+Scopes keep comparisons meaningful, e.g. "research_insights|<client>|<topic>".
+"""
+
+import hashlib
+import random
+import re
+import time
+from array import array
+
+from apps.common.settings import setting
+from apps.common.local_store import connect, transaction
+
+ACTION = setting("AIVE_DEDUP_ACTION", "drop")            # drop | collapse | off
+THRESHOLD = float(setting("AIVE_DEDUP_THRESHOLD", "0.85"))
+WINDOW_DAYS = float(setting("AIVE_DEDUP_WINDOW_DAYS", "30"))
+
+NUM_PERM, BANDS = 64, 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)     # fixed seed: signatures must be stable across processes
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    preview TEXT,
+    numbers TEXT,
+    remote_id TEXT,
+    seen_count INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_seen ON entries(last_seen);
+CREATE TABLE IF NOT EXISTS bands (
+    scope TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_lookup ON bands(scope, band, bucket);
+CREATE INDEX IF NOT EXISTS bands_entry ON bands(entry_id);
+"""
+COLUMNS = {"entries": {"numbers": "TEXT"}}   # added after the first release of the schema
+
+_WORD = re.compile(r"[a-z0-9%]+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+class DedupResult:
+    __slots__ = ("duplicate", "entry_id", "similarity", "seen_count", "remote_id")
+
+    def __init__(self, duplicate, entry_id, similarity=0.0, seen_count=1, remote_id=None):
+        self.duplicate = duplicate
+        self.entry_id = entry_id
+        self.similarity = similarity
+        self.seen_count = seen_count
+        self.remote_id = remote_id
+
+
+def _db():
+    return connect("dedup", SCHEMA, COLUMNS)
+
+
+def numbers(text: str) -> str:
+    """The text's numbers in order; near-duplicates must match these exactly."""
+    return " ".join(n.replace(",", "") for n in _NUMBER.findall(text))
+
+
+def shingles(text: str) -> set:
+    # Numbers are masked so wording decides similarity; check() compares them exactly
+    words = _WORD.findall(_NUMBER.sub("0", text.lower()))
+    if len(words) >= 3:
+        return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+    joined = " ".join(words) or text
+    return {joined[i:i + 4] for i in range(max(1, len(joined) - 3))}
+
+
+def signature(text: str) -> list:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") & _PRIME
+        for s in shingles(text)
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def _buckets(sig: list):
+    for band in range(BANDS):
+        chunk = ",".join(map(str, sig[band * ROWS:(band + 1) * ROWS]))
+        yield band, int.from_bytes(hashlib.blake2b(chunk.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def _similarity(a: list, b: list) -> float:
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def check(scope: str, text: str) -> DedupResult:
+    """
+    Compare `text` with recent entries in `scope`. A near-duplicate bumps that
+    entry's counter; anything else is remembered as a new entry.
+    """
+    sig = signature(text)
+    nums = numbers(text)
+    buckets = list(_buckets(sig))
+    now = time.time()
+    cutoff = now - WINDOW_DAYS * 86400
+    conn = _db()
+    with transaction(conn, immediate=True):
+        clauses = " OR ".join("(band = ? AND bucket = ?)" for _ in buckets)
+        params = [scope] + [v for pair in buckets for v in pair] + [cutoff]
+        candidates = conn.execute(
+            f"""SELECT DISTINCT e.id, e.signature, e.seen_count, e.remote_id
+                FROM bands b JOIN entries e ON e.id = b.entry_id
+                WHERE b.scope = ? AND ({clauses}) AND e.last_seen >= ? AND e.numbers = ?""",
+            params + [nums],
+        ).fetchall()
+
+        best, best_sim = None, 0.0
+        for row in candidates:
+            sim = _similarity(sig, array("Q", row["signature"]).tolist())
+            if sim > best_sim:
+                best, best_sim = row, sim
+
+        if best is not None and best_sim >= THRESHOLD:
+            conn.execute("UPDATE entries SET seen_count = seen_count + 1, last_seen = ? WHERE id = ?", (now, best["id"]))
+            return DedupResult(True, best["id"], best_sim, best["seen_count"] + 1, best["remote_id"])
+
+        entry_id = conn.execute(
+            "INSERT INTO entries (scope, signature, preview, numbers, created_at, last_seen) VALUES (?, ?, ?, ?, ?, ?)",
+            (scope, array("Q", sig).tobytes(), text[:200], nums, now, now),
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO bands (scope, band, bucket, entry_id) VALUES (?, ?, ?, ?)",
+            [(scope, band, bucket, entry_id) for band, bucket in buckets],
+        )
+    if random.random() < 0.01:
+        prune()
+    return DedupResult(False, entry_id)
+
+
+def attach_remote_id(entry_id: int, remote_id):
+    """Remember the Supabase row id so later duplicates can collapse into it."""
+    if remote_id is not None:
+        _db().execute("UPDATE entries SET remote_id = ? WHERE id = ?", (str(remote_id), entry_id))
+
+
+def forget(entry_id: int):
+    """Drop an entry whose row never made it into Supabase."""
+    conn = _db()
+    with transaction(conn):
+        conn.execute("DELETE FROM bands WHERE entry_id = ?", (entry_id,))
+        conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+
+
+def prune():
+    """Remove entries not seen within the window."""
+    cutoff = time.time() - WINDOW_DAYS * 86400
+    conn = _db()
+    with transaction(conn):
+        conn.execute("DELETE FROM bands WHERE entry_id IN (SELECT id FROM entries WHERE last_seen < ?)", (cutoff,))
+        conn.execute("DELETE FROM entries WHERE last_seen < ?", (cutoff,))
+
+
+def stats() -> dict:
+    row = _db().execute(
+        "SELECT COUNT(*) AS entries, COALESCE(SUM(seen_count - 1), 0) AS suppressed FROM entries"
+    ).fetchone()
+    return {"entries": row["entries"], "suppressed": row["suppressed"], "threshold": THRESHOLD, "action": ACTION}
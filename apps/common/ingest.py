@@ -0,0 +1,140 @@
+"""
+ingest.py
+Parsing and validation for bulk ingestion (run_orchestrator_api batch endpoints).
+
+Bodies are a JSON array of objects or NDJSON (one object per line). Rows are
+validated column-wise with pandas rather than one model at a time, and every
+invalid row is reported by its position in the request so the caller can
+resend just those rows.
+"""
+
+import json
+
+from apps.common.settings import setting
+
+MAX_ROWS = int(setting("AIVE_INGEST_MAX_ROWS", "100000"))
+
+VISIBILITY_SCHEMA = {
+    "required_text": ["client_id", "domain", "metric_type", "source"],
+    "required_numeric": ["metric_value"],
+    "optional_text": ["agent_id", "notes"],
+    "optional_numeric": [],
+}
+RESEARCH_SCHEMA = {
+    "required_text": ["client_id", "topic", "insight", "source"],
+    "required_numeric": [],
+    "optional_text": ["agent_id", "notes"],
+    "optional_numeric": ["confidence"],
+}
+
+
+_UNPARSEABLE = object()
+
+
+class IngestError(ValueError):
+    """The body as a whole could not be parsed."""
+
+
+def parse_records(body: bytes, content_type: str = ""):
+    """
+    Returns (records, errors): records keeps the request order (None where a
+    line could not be parsed), errors maps row index -> [messages].
+    """
+    text = body.decode("utf-8-sig").strip()
+    if not text:
+        return [], {}
+    ndjson = "ndjson" in (content_type or "") or "jsonl" in (content_type or "") or not text.startswith("[")
+    if not ndjson:
+        try:
+            records = json.loads(text)
+        except ValueError as e:
+            raise IngestError(f"Invalid JSON array: {e}")
+        if not isinstance(records, list):
+            raise IngestError("Expected a JSON array of objects")
+    else:
+        records = []
+        for line in filter(str.strip, text.splitlines()):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(_UNPARSEABLE)
+
+    if len(records) > MAX_ROWS:
+        raise IngestError(f"Too many rows ({len(records)} > {MAX_ROWS}); split the upload")
+
+    errors = {}
+    for i, record in enumerate(records):
+        if record is _UNPARSEABLE:
+            errors[i] = ["invalid JSON"]
+            records[i] = None
+        elif not isinstance(record, dict):
+            errors[i] = ["expected a JSON object"]
+            records[i] = None
+    return records, errors
+
+
+def validate(records: list, schema: dict, errors: dict = None):
+    """
+    Vectorised validation. Returns (valid_rows, invalid) where valid_rows are
+    clean dicts (numbers coerced, timestamps normalised to ISO-8601 UTC) and
+    invalid is [{"index", "errors"}] sorted by index.
+    """
+    import numpy as np
+    import pandas as pd
+
+    errors = {i: list(msgs) for i, msgs in (errors or {}).items()}
+    if not records:
+        return [], []
+    # dtype=object keeps ids exact: a bad row must not turn client_id 1 into a float ("1.0" once stringified)
+    df = pd.DataFrame([r if r is not None else {} for r in records], index=range(len(records)), dtype=object)
+    problems = []   # (mask, message)
+
+    for col in schema["required_text"]:
+        if col not in df:
+            df[col] = None
+        values = df[col].where(df[col].notna(), "").astype(str).str.strip()
+        problems.append((values.eq(""), f"{col} is required"))
+        df[col] = values
+
+    for col in schema["optional_text"]:
+        if col in df:
+            df[col] = df[col].where(df[col].notna(), "").astype(str).str.strip()
+
+    for col in schema["required_numeric"] + schema["optional_numeric"]:
+        required = col in schema["required_numeric"]
+        if col not in df:
+            if not required:
+                continue
+            df[col] = None
+        raw = df[col]
+        numeric = pd.to_numeric(raw.where(~raw.map(lambda v: isinstance(v, bool)), None), errors="coerce")
+        missing = raw.isna()
+        bad = numeric.isna() & ~missing
+        infinite = numeric.notna() & ~np.isfinite(numeric.fillna(0))
+        if required:
+            problems.append((missing, f"{col} is required"))
+        problems.append((bad, f"{col} must be a number"))
+        problems.append((infinite, f"{col} must be finite"))
+        df[col] = numeric
+
+    if "confidence" in df:
+        problems.append((df["confidence"].notna() & ~df["confidence"].between(0, 1), "confidence must be between 0 and 1"))
+
+    if "timestamp" in df:
+        raw = df["timestamp"]
+        parsed = pd.to_datetime(raw, errors="coerce", utc=True, format="ISO8601")
+        problems.append((raw.notna() & parsed.isna(), "timestamp must be ISO-8601"))
+        df["timestamp"] = parsed.dt.strftime("%Y-%m-%dT%H:%M:%S.%f%z").where(parsed.notna(), None)
+
+    unparsed = set(errors)   # already reported; their column checks would only add noise
+    for mask, message in problems:
+        for i in np.flatnonzero(mask.to_numpy()):
+            if int(i) not in unparsed:
+                errors.setdefault(int(i), []).append(message)
+
+    keep = np.ones(len(df), dtype=bool)
+    keep[list(errors)] = False
+    clean = df[keep].astype(object).where(df[keep].notna(), None)
+    valid_rows = clean.to_dict("records")
+    invalid = [{"index": i, "errors": errors[i]} for i in sorted(errors)]
+    return valid_rows, invalid
@@ -0,0 +1,246 @@
+"""
+json_stream.py
+Incremental parsing of a streamed JSON object (LLM completions).
+
+IncrementalJSONObject is fed text chunks as they arrive and calls back as
+soon as each top-level member is complete — and, for top-level arrays, as
+soon as each element is complete — instead of waiting for the last token.
+Anything before the object's opening brace (prose, a ```json fence) and
+after its closing brace is ignored. repair_json() salvages truncated output
+by closing open strings and containers at the last point where the document
+was still well formed.
+"""
+
+import json
+
+_OPENERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJSONObject:
+    """
+    Feed chunks of one JSON object.
+
+    on_member(key, value)  — a top-level member finished, e.g. ("executive_summary", "...")
+    on_item(key, item)     — an element of a top-level array finished, e.g. ("ranking_matrix", {...})
+    """
+
+    def __init__(self, on_member=None, on_item=None):
+        self.on_member = on_member
+        self.on_item = on_item
+        self.buffer = ""
+        self.members = {}
+        self.repaired = False
+        self._preamble = ""           # text before the opening brace, until it arrives
+        self._started = False
+        self._done = False            # top-level object closed; the rest is ignored
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False      # inside the top-level object, before a key
+        self._key_start = None
+        self._key = None
+        self._value_start = None      # start of the current top-level member's value
+        self._item_start = None       # start of the current element of a top-level array
+
+    # -- scanning --------------------------------------------------------
+    def feed(self, chunk: str):
+        if self._done:
+            return
+        if not self._started:
+            self._preamble += chunk
+            start = self._preamble.find("{")
+            if start < 0:
+                return
+            chunk, self._preamble, self._started = self._preamble[start:], "", True
+        self.buffer += chunk
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+                        self._key_start = None
+                continue
+
+            depth = len(self._stack)
+            if ch.isspace():
+                continue
+            if depth == 1 and self._expect_key:
+                if ch == '"':
+                    self._in_string = True
+                    self._key_start = i
+                    self._expect_key = False
+                elif ch == "}":
+                    self._stack.pop()
+                    if not self._stack:
+                        self._close(i)
+                        break
+                continue
+            if depth == 1 and ch == ":":
+                continue
+
+            # First character of a top-level value / top-level array element
+            if depth == 1 and self._value_start is None and ch not in ",}":
+                self._value_start = i
+            elif depth == 2 and self._stack[-1] == "[" and self._item_start is None and ch not in ",]":
+                self._item_start = i
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in _OPENERS:
+                self._stack.append(ch)
+                if len(self._stack) == 1 and ch == "{":
+                    self._expect_key = True
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 2 and self._item_start is not None and self._stack[-1] == "[":
+                    self._emit_item(buf[self._item_start:i + 1])        # container element closed
+                elif depth == 1 and ch == "]" and self._item_start is not None:
+                    self._emit_item(buf[self._item_start:i].rstrip())   # last scalar element
+                if depth == 1 and self._value_start is not None:
+                    self._emit_member(buf[self._value_start:i + 1])     # container value closed
+                elif depth == 0 and self._value_start is not None:
+                    self._emit_member(buf[self._value_start:i].rstrip())  # last scalar member
+                if depth == 0:
+                    self._close(i)
+                    break
+            elif ch == ",":
+                if depth == 1:
+                    if self._value_start is not None:
+                        self._emit_member(buf[self._value_start:i].rstrip())
+                    self._expect_key = True
+                elif depth == 2 and self._stack[-1] == "[" and self._item_start is not None:
+                    self._emit_item(buf[self._item_start:i].rstrip())
+        self._pos = len(self.buffer)
+
+    def _close(self, end: int):
+        """The top-level object ended at `end`: drop trailing text (e.g. a closing fence)."""
+        self._done = True
+        self.buffer = self.buffer[:end + 1]
+
+    def _emit_member(self, text: str):
+        key, self._value_start, self._item_start = self._key, None, None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return
+        self.members[key] = value
+        if self.on_member:
+            self.on_member(key, value)
+
+    def _emit_item(self, text: str):
+        self._item_start = None
+        try:
+            item = json.loads(text)
+        except ValueError:
+            return
+        if self.on_item:
+            self.on_item(self._key, item)
+
+    # -- completion ------------------------------------------------------
+    def finish(self) -> dict:
+        """Parse the full document, repairing it if the stream was cut short."""
+        text = self.buffer if self._started else self._preamble
+        try:
+            return json.loads(text)
+        except ValueError:
+            data = repair_json(text)
+            self.repaired = True
+            return data
+
+
+def loads_lenient(text: str):
+    """One JSON object out of model output, parsed like a stream: fences, prose and truncation allowed."""
+    parser = IncrementalJSONObject()
+    parser.feed(text)
+    return parser.finish()
+
+
+def repair_json(text: str):
+    """
+    Best-effort parse of truncated JSON: close an unterminated value string,
+    otherwise cut back to the last complete value, then close open containers.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    stack = []               # open containers: "{" or "["
+    expecting_key = []       # per open object: is the next string a key?
+    in_string = escape = string_is_key = False
+    safe_cut, safe_stack = None, None
+    literal_start = None
+
+    def mark(index):
+        nonlocal safe_cut, safe_stack
+        safe_cut, safe_stack = index, list(stack)
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if not string_is_key:
+                    mark(i + 1)
+            continue
+        if literal_start is not None and (ch.isspace() or ch in ",:}]"):
+            literal_start = None
+            mark(i)
+        if ch.isspace():
+            continue
+        if ch == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1] == "{" and expecting_key[-1]
+            if string_is_key:
+                expecting_key[-1] = False
+        elif ch in _OPENERS:
+            stack.append(ch)
+            expecting_key.append(ch == "{")
+            mark(i + 1)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+                expecting_key.pop()
+            mark(i + 1)
+        elif ch == ",":
+            if stack and stack[-1] == "{":
+                expecting_key[-1] = True
+        elif ch == ":":
+            pass
+        elif literal_start is None:
+            literal_start = i
+
+    def close(prefix, open_stack):
+        return prefix + "".join(_OPENERS[c] for c in reversed(open_stack))
+
+    candidates = []
+    if literal_start is not None:
+        # A number / true / false / null running up to the end is kept when it parses
+        candidates.append(close(text, stack))
+    if in_string and not string_is_key:
+        # Keep the partial string value — useful for long prose sections
+        body = text[:-1] if escape else text
+        candidates.append(close(body + '"', stack))
+    if safe_cut is not None:
+        candidates.append(close(text[:safe_cut], safe_stack))
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    raise ValueError("JSON output could not be repaired")
@@ -0,0 +1,563 @@
+"""
+llm_gateway.py
+One entry point for every LLM call the agents make.
+
+- Providers: OpenAI, Anthropic, Gemini (each enabled when its API key is set)
+  and a deterministic local stub for offline runs (AIVE_LLM_PROVIDERS=stub).
+- Routing: providers are ranked by observed latency, penalized by their
+  recent error rate; a provider whose circuit is open is skipped.
+- Hedging: when the primary hasn't answered after its p95 latency (or, for
+  streams, its p95 time-to-first-chunk), a backup provider is fired and the
+  first valid answer wins.
+
+    router = get_router()
+    text = router.complete(messages, json_mode=True).text
+    for chunk in router.stream(messages, json_mode=True): ...
+"""
+
+import contextvars
+import hashlib
+import json
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from apps.common import cassette
+from apps.common.settings import setting
+from apps.common.resilience import CircuitOpenError, get_dependency, guarded, OPEN
+from apps.common.deadlines import LLM_TIMEOUT_S, call_timeout
+
+HEDGE = setting("AIVE_LLM_HEDGE", "1") == "1"
+HEDGE_MIN_DELAY_S = float(setting("AIVE_LLM_HEDGE_MIN_S", "2"))
+MAX_TOKENS = int(setting("AIVE_LLM_MAX_TOKENS", "4096"))
+
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+
+class LLMResponse:
+    __slots__ = ("text", "provider", "latency_s", "hedged")
+
+    def __init__(self, text: str, provider: str, latency_s: float, hedged: bool = False):
+        self.text = text
+        self.provider = provider
+        self.latency_s = latency_s
+        self.hedged = hedged
+
+
+def _split_messages(messages):
+    system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    user = "\n\n".join(m["content"] for m in messages if m["role"] != "system")
+    return system, user
+
+
+# --------------------------------------------------------------------
+# 🔌 Providers
+# --------------------------------------------------------------------
+class Provider(ABC):
+    name = "base"
+
+    @abstractmethod
+    def complete(self, messages, json_mode: bool, timeout: float) -> str:
+        """Return the full answer text."""
+
+    def stream(self, messages, json_mode: bool, timeout: float):
+        """Yield text chunks; providers without native streaming yield one chunk."""
+        yield self.complete(messages, json_mode, timeout)
+
+    def close(self):
+        """Release HTTP connections; clients are recreated on next use."""
+        client, self._client = getattr(self, "_client", None), None
+        if client is not None and hasattr(client, "close"):
+            client.close()
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def __init__(self):
+        self.model = setting("OPENAI_MODEL", "gpt-4o-mini")
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=setting("OPENAI_API_KEY"), max_retries=0)
+        return self._client
+
+    def _kwargs(self, messages, json_mode, timeout):
+        kwargs = dict(model=self.model, messages=messages, timeout=timeout)
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        return kwargs
+
+    def complete(self, messages, json_mode, timeout):
+        resp = self.client().chat.completions.create(**self._kwargs(messages, json_mode, timeout))
+        return resp.choices[0].message.content
+
+    def stream(self, messages, json_mode, timeout):
+        for chunk in self.client().chat.completions.create(stream=True, **self._kwargs(messages, json_mode, timeout)):
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class AnthropicProvider(Provider):
+    name = "anthropic"
+
+    def __init__(self):
+        self.model = setting("ANTHROPIC_MODEL", "claude-3-5-sonnet-20240620")
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            import anthropic
+            self._client = anthropic.Anthropic(api_key=setting("ANTHROPIC_API_KEY"), max_retries=0)
+        return self._client
+
+    def _kwargs(self, messages, json_mode, timeout):
+        system, user = _split_messages(messages)
+        if json_mode:
+            system = f"{system}\nRespond with a single valid JSON object and nothing else.".strip()
+        return dict(
+            model=self.model,
+            max_tokens=MAX_TOKENS,
+            system=system,
+            messages=[{"role": "user", "content": user}],
+            timeout=timeout,
+        )
+
+    def complete(self, messages, json_mode, timeout):
+        resp = self.client().messages.create(**self._kwargs(messages, json_mode, timeout))
+        return "".join(block.text for block in resp.content if getattr(block, "text", None))
+
+    def stream(self, messages, json_mode, timeout):
+        with self.client().messages.stream(**self._kwargs(messages, json_mode, timeout)) as s:
+            for text in s.text_stream:
+                yield text
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+
+    def __init__(self):
+        self.model = setting("GEMINI_MODEL", "gemini-1.5-flash")
+        self._configured = False
+
+    def _model(self, system):
+        import google.generativeai as genai
+        if not self._configured:
+            genai.configure(api_key=setting("GOOGLE_API_KEY") or setting("GEMINI_API_KEY"))
+            self._configured = True
+        return genai.GenerativeModel(self.model, system_instruction=system or None)
+
+    def _generate(self, messages, json_mode, timeout, stream):
+        system, user = _split_messages(messages)
+        config = {"response_mime_type": "application/json"} if json_mode else None
+        return self._model(system).generate_content(
+            user, generation_config=config, request_options={"timeout": timeout}, stream=stream
+        )
+
+    def complete(self, messages, json_mode, timeout):
+        return self._generate(messages, json_mode, timeout, stream=False).text
+
+    def stream(self, messages, json_mode, timeout):
+        for chunk in self._generate(messages, json_mode, timeout, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubProvider(Provider):
+    """
+    Deterministic offline provider. In JSON mode it answers with an object that
+    follows the key list in the prompt ("- key: ..." lines), filled with values
+    derived from the prompt hash — same prompt, same answer.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_s: float = None, responder=None):
+        self.latency_s = float(setting("AIVE_LLM_STUB_LATENCY_S", "0")) if latency_s is None else latency_s
+        self.responder = responder
+
+    def complete(self, messages, json_mode, timeout):
+        if self.latency_s:
+            time.sleep(min(self.latency_s, timeout) if timeout else self.latency_s)
+        if self.responder is not None:
+            return self.responder(messages)
+        _, prompt = _split_messages(messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        if not json_mode:
+            return f"Stub answer {digest}."
+        return json.dumps(_skeleton_from_prompt(prompt, digest))
+
+    def stream(self, messages, json_mode, timeout):
+        text = self.complete(messages, json_mode, timeout)
+        for i in range(0, len(text), 64):
+            yield text[i:i + 64]
+
+
+_KEY_LINE = re.compile(r"^\s*-\s*([A-Za-z0-9_]+)\s*:\s*(.*)$")
+
+
+def _skeleton_from_prompt(prompt: str, digest: str) -> dict:
+    lines = prompt.splitlines()
+    data = {}
+    for idx, line in enumerate(lines):
+        match = _KEY_LINE.match(line)
+        if not match:
+            continue
+        key, rest = match.groups()
+        if not rest.lstrip().startswith("["):
+            data[key] = f"Stub {key.replace('_', ' ')} ({digest})."
+            continue
+        # Look for an example object on this line or the next few lines of the list
+        block = " ".join([rest] + [l for l in lines[idx + 1:idx + 4] if not _KEY_LINE.match(l)])
+        example = re.search(r"\{(.*?)\}", block)
+        if not example:
+            data[key] = [f"Stub {key.replace('_', ' ')} {n} ({digest})." for n in (1, 2)]
+            continue
+        fields = re.findall(r'"(\w+)"\s*:\s*("[^"]*"|\[[^\]]*\]|[^,}]+)', example.group(1))
+        items = []
+        for n in (1, 2):
+            item = {}
+            for field, sample in fields:
+                sample = sample.strip()
+                if sample.startswith("["):
+                    item[field] = [f"stub {field} {n}"]
+                elif sample.startswith('"'):
+                    item[field] = f"Stub {field} {n}"
+                else:
+                    item[field] = n * 10
+            items.append(item)
+        data[key] = items
+    return data or {"answer": f"Stub answer ({digest})."}
+
+
+_PROVIDER_TYPES = {
+    "openai": (OpenAIProvider, "OPENAI_API_KEY"),
+    "anthropic": (AnthropicProvider, "ANTHROPIC_API_KEY"),
+    "gemini": (GeminiProvider, "GOOGLE_API_KEY"),
+    "stub": (StubProvider, None),
+}
+
+
+# --------------------------------------------------------------------
+# 🧭 Router
+# --------------------------------------------------------------------
+class _ProviderStats:
+    def __init__(self):
+        self.latencies = deque(maxlen=100)
+        self.first_chunk = deque(maxlen=100)
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.wins = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool, first_chunk: bool = False):
+        with self.lock:
+            self.calls += 1
+            self.error_rate = 0.8 * self.error_rate + 0.2 * (0.0 if ok else 1.0)
+            if ok:
+                (self.first_chunk if first_chunk else self.latencies).append(latency)
+                if not first_chunk:
+                    self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+
+    def p95(self, first_chunk: bool = False):
+        samples = sorted(self.first_chunk if first_chunk else self.latencies)
+        if len(samples) < 5:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def score(self) -> float:
+        # Unmeasured providers score 0 so they get explored once
+        latency = self.ewma_latency or 0.0
+        return latency * (1.0 + 4.0 * self.error_rate) + 60.0 * self.error_rate
+
+
+class LLMRouter:
+    def __init__(self, providers):
+        if not providers:
+            raise ValueError("No LLM providers configured")
+        self.providers = {p.name: p for p in providers}
+        self.order = [p.name for p in providers]
+        self.stats = {p.name: _ProviderStats() for p in providers}
+
+    def ranked(self):
+        """Providers best-first; open circuits last (they'll fast-fail)."""
+        def key(name):
+            is_open = get_dependency(name).breaker.state == OPEN
+            return (is_open, self.stats[name].score(), self.order.index(name))
+        return sorted(self.order, key=key)
+
+    def _hedge_delay(self, name: str, first_chunk: bool = False) -> float:
+        p95 = self.stats[name].p95(first_chunk)
+        return max(HEDGE_MIN_DELAY_S, p95) if p95 is not None else max(HEDGE_MIN_DELAY_S, LLM_TIMEOUT_S / 4)
+
+    # -- single-shot -----------------------------------------------------
+    def _call(self, name, messages, json_mode, validate):
+        timeout = call_timeout(LLM_TIMEOUT_S)
+        started = time.monotonic()
+        try:
+            text = guarded(name, self.providers[name].complete, messages, json_mode, timeout)
+            if validate is not None and not validate(text):
+                raise ValueError(f"{name} returned an invalid answer")
+        except CircuitOpenError:
+            raise
+        except Exception:
+            self.stats[name].record(time.monotonic() - started, ok=False)
+            raise
+        latency = time.monotonic() - started
+        self.stats[name].record(latency, ok=True)
+        return LLMResponse(text, name, round(latency, 3))
+
+    def complete(self, messages, json_mode: bool = True, validate=None, hedge: bool = HEDGE) -> LLMResponse:
+        """Best provider first, hedged with the runner-up; falls through the rest on failure."""
+        return cassette.active().call(
+            "llm",
+            {"messages": messages, "json_mode": json_mode},
+            lambda: self._route(messages, json_mode, validate, hedge),
+            encode=lambda r: {"text": r.text, "provider": r.provider, "latency_s": r.latency_s},
+            decode=lambda p: LLMResponse(p["text"], p["provider"], p["latency_s"]),
+        )
+
+    def complete_on(self, provider: str, messages, json_mode: bool = False, validate=None) -> LLMResponse:
+        """One named provider, no routing or hedging (e.g. probing what a specific assistant answers)."""
+        if provider not in self.providers:
+            raise KeyError(f"LLM provider not configured: {provider}")
+        return cassette.active().call(
+            "llm",
+            {"provider": provider, "messages": messages, "json_mode": json_mode},
+            lambda: self._call(provider, messages, json_mode, validate),
+            encode=lambda r: {"text": r.text, "provider": r.provider, "latency_s": r.latency_s},
+            decode=lambda p: LLMResponse(p["text"], p["provider"], p["latency_s"]),
+        )
+
+    def _route(self, messages, json_mode, validate, hedge) -> LLMResponse:
+        if validate is None and json_mode:
+            validate = _is_json
+        ranked = self.ranked()
+        errors = []
+        while ranked:
+            primary = ranked.pop(0)
+            backup = ranked[0] if hedge and ranked else None
+            try:
+                if backup is None:
+                    return self._call(primary, messages, json_mode, validate)
+                response = self._hedged(primary, backup, messages, json_mode, validate)
+                if response.provider == backup:
+                    ranked.pop(0)
+                return response
+            except CircuitOpenError as e:
+                errors.append(e)
+            except Exception as e:
+                errors.append(RuntimeError(f"{primary}: {e}"))
+        _raise_all_failed(errors)
+
+    def _hedged(self, primary, backup, messages, json_mode, validate) -> LLMResponse:
+        submit = lambda name: _hedge_pool.submit(
+            contextvars.copy_context().run, self._call, name, messages, json_mode, validate
+        )
+        futures = {submit(primary): primary}
+        done, _ = wait(futures, timeout=self._hedge_delay(primary))
+        if not done:
+            print(f"🪁 Hedging slow {primary} request with {backup}")
+            futures[submit(backup)] = backup
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    response = future.result()
+                    response.hedged = len(futures) > 1
+                    self.stats[response.provider].wins += 1
+                    return response
+                last_error = future.exception()
+        raise last_error
+
+    # -- streaming -------------------------------------------------------
+    def _open_stream(self, name, messages, json_mode):
+        """Start a stream and wait for its first chunk (time-to-first-chunk is what we hedge on)."""
+        timeout = call_timeout(LLM_TIMEOUT_S)
+        started = time.monotonic()
+        def start():
+            # Provider streams are generators: the request goes out on the first next()
+            chunks = iter(self.providers[name].stream(messages, json_mode, timeout))
+            return chunks, next(chunks, "")
+
+        try:
+            chunks, first = guarded(name, start)
+        except CircuitOpenError:
+            raise
+        except Exception:
+            self.stats[name].record(time.monotonic() - started, ok=False, first_chunk=True)
+            raise
+        self.stats[name].record(time.monotonic() - started, ok=True, first_chunk=True)
+        return name, first, chunks, started
+
+    def stream(self, messages, json_mode: bool = True, hedge: bool = HEDGE, validate=None):
+        """
+        Yield text chunks from the first provider to start answering. The full
+        answer is validated once it ends (in JSON mode: it must hold a JSON
+        object, fences allowed); an invalid one counts as that provider's error
+        and raises ValueError after the last chunk, so callers can fall back to
+        complete(), which falls through to the next provider.
+        """
+        return cassette.active().stream(
+            "llm",
+            {"messages": messages, "json_mode": json_mode, "stream": True},
+            lambda: self._route_stream(messages, json_mode, hedge, validate),
+        )
+
+    def _route_stream(self, messages, json_mode, hedge, validate=None):
+        if validate is None and json_mode:
+            validate = _holds_json
+        ranked = self.ranked()
+        errors = []
+        while ranked:
+            primary = ranked.pop(0)
+            backup = ranked[0] if hedge and ranked else None
+            try:
+                opened = self._hedged_open(primary, backup, messages, json_mode)
+                break
+            except CircuitOpenError as e:
+                errors.append(e)
+            except Exception as e:
+                errors.append(RuntimeError(f"{primary}: {e}"))
+        else:
+            _raise_all_failed(errors)
+
+        name, first, chunks, started = opened
+        self.stats[name].wins += 1
+        ok = False
+        parts = []
+        try:
+            if first:
+                parts.append(first)
+                yield first
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+            if validate is not None and not validate("".join(parts)):
+                raise ValueError(f"{name} streamed an invalid answer")
+            ok = True
+        finally:
+            self.stats[name].record(time.monotonic() - started, ok=ok)
+
+    def _hedged_open(self, primary, backup, messages, json_mode):
+        if backup is None:
+            return self._open_stream(primary, messages, json_mode)
+        submit = lambda name: _hedge_pool.submit(
+            contextvars.copy_context().run, self._open_stream, name, messages, json_mode
+        )
+        futures = {submit(primary): primary}
+        done, _ = wait(futures, timeout=self._hedge_delay(primary, first_chunk=True))
+        if not done:
+            print(f"🪁 Hedging slow {primary} stream with {backup}")
+            futures[submit(backup)] = backup
+
+        pending = set(futures)
+        winner, last_error = None, None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    last_error = future.exception()
+                elif winner is None:
+                    winner = future.result()
+                else:
+                    _close_stream(future)   # both opened in the same batch: close the loser now
+        # Close the losing stream whenever it finishes opening
+        for future in pending:
+            future.add_done_callback(_close_stream)
+        if winner is None:
+            raise last_error
+        return winner
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "ewma_latency_s": round(s.ewma_latency, 3) if s.ewma_latency is not None else None,
+                "p95_s": s.p95(),
+                "p95_first_chunk_s": s.p95(first_chunk=True),
+                "error_rate": round(s.error_rate, 3),
+                "calls": s.calls,
+                "wins": s.wins,
+            }
+            for name, s in self.stats.items()
+        }
+
+
+def _raise_all_failed(errors):
+    """
+    Every provider failed. When all of them were skipped for an open circuit the
+    first CircuitOpenError is re-raised, so callers can tell an outage from an error.
+    """
+    if errors and all(isinstance(e, CircuitOpenError) for e in errors):
+        raise errors[0]
+    raise RuntimeError("All LLM providers failed — " + "; ".join(str(e) for e in errors))
+
+
+def _close_stream(future):
+    if future.exception() is None:
+        close = getattr(future.result()[2], "close", None)
+        if close:
+            close()
+
+
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _holds_json(text: str) -> bool:
+    """A JSON object, possibly wrapped in a ```json fence or prose (streamed answers are parsed that way)."""
+    start, end = text.find("{"), text.rfind("}")
+    return start >= 0 and _is_json(text[start:end + 1])
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """Router over AIVE_LLM_PROVIDERS (default: every provider with an API key set)."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                names = [n.strip() for n in setting("AIVE_LLM_PROVIDERS", "openai,anthropic,gemini").split(",") if n.strip()]
+                providers = []
+                for name in names:
+                    cls, key = _PROVIDER_TYPES[name]
+                    if key is None or setting(key) or (name == "gemini" and setting("GEMINI_API_KEY")):
+                        providers.append(cls())
+                if not providers and cassette.replaying():
+                    providers.append(StubProvider())   # replayed answers never reach a provider
+                _router = LLMRouter(providers)
+                print(f"🧭 LLM router providers: {', '.join(_router.order)}")
+    return _router
+
+
+def close_router():
+    """Close every provider's HTTP client (API shutdown). The router itself stays usable."""
+    router = _router
+    if router is not None:
+        for provider in router.providers.values():
+            try:
+                provider.close()
+            except Exception as e:
+                print(f"⚠️ Could not close {provider.name} client: {e}")
+
+
+def set_router(router: LLMRouter):
+    """Swap the process-wide router (e.g. LLMRouter([StubProvider()]) in offline tests)."""
+    global _router
+    _router = router
@@ -0,0 +1,80 @@
+"""
+local_store.py
+Small SQLite databases under data/ for process-local indexes and state.
+
+One connection per thread and database file, in WAL mode so several worker
+processes can read while one writes. Connections run in autocommit mode;
+use transaction() for multi-statement writes (immediate=True takes the
+write lock up front, which is what cross-process counters need).
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from apps.common.settings import ROOT_DIR, setting
+
+DATA_DIR = ROOT_DIR / "data"
+BUSY_TIMEOUT_MS = int(setting("AIVE_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+_local = threading.local()
+_schemas_ready = set()
+_schema_lock = threading.Lock()
+
+
+def data_dir() -> Path:
+    """Folder of the local stores (and other local caches) right now."""
+    return DATA_DIR
+
+
+def use_data_dir(path):
+    """Point every local store at another folder (cassette sessions run on fresh state)."""
+    global DATA_DIR
+    DATA_DIR = Path(path)
+
+
+def db_path(name: str):
+    return DATA_DIR / f"{name}.db"
+
+
+def connect(name: str, schema: str = None, columns: dict = None) -> sqlite3.Connection:
+    """
+    Return this thread's connection to data/{name}.db, creating the file and schema on first use.
+    columns ({table: {column: declaration}}) are added to tables created before they existed.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    path = db_path(name)
+    conn = conns.get(path)
+    if conn is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[path] = conn
+    if schema and path not in _schemas_ready:
+        with _schema_lock:
+            if path not in _schemas_ready:
+                conn.executescript(schema)
+                for table, wanted in (columns or {}).items():
+                    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                    for column, declaration in wanted.items():
+                        if column not in existing:
+                            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+                _schemas_ready.add(path)
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection, immediate: bool = False):
+    """BEGIN [IMMEDIATE] … COMMIT, rolling back on error."""
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
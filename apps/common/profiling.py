@@ -0,0 +1,192 @@
+"""
+profiling.py
+On-demand profiling of orchestration runs.
+
+Two modes:
+- "sample": a background thread snapshots every thread's stack with
+  sys._current_frames() every AIVE_PROFILE_INTERVAL_MS (default 10 ms) and
+  writes logs/profile_{ts}.folded, the collapsed-stack format read by
+  flamegraph.pl, speedscope and inferno. Cheap enough to leave on for a
+  fraction of production runs (AIVE_PROFILE_SAMPLE_RATE, e.g. 0.05).
+- "cprofile": deterministic cProfile of the orchestrating thread, written as
+  logs/profile_{ts}.pstats (snakeviz / flameprof / pstats).
+
+Both modes also record per-agent calls, wall time and CPU time (via the
+orchestrator's agent_scope()), and the sampler attributes function
+self-time to the agent that was running.
+"""
+
+import cProfile
+import io
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from apps.common.settings import ROOT_DIR, setting
+
+PROFILE_DIR = ROOT_DIR / "logs"
+SAMPLE_RATE = float(setting("AIVE_PROFILE_SAMPLE_RATE", "0"))        # fraction of runs profiled unasked
+SAMPLE_INTERVAL_S = float(setting("AIVE_PROFILE_INTERVAL_MS", "10")) / 1000
+MODES = ("sample", "cprofile")
+
+_active = None                 # the Profile currently running, if any
+_agent_by_thread = {}          # thread ident -> agent id currently running on it
+
+
+def should_profile() -> bool:
+    """Randomly pick runs for background profiling according to AIVE_PROFILE_SAMPLE_RATE."""
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})".replace(";", ",")
+
+
+class Profile:
+    def __init__(self, mode: str = "sample", interval_s: float = SAMPLE_INTERVAL_S):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode} (use one of {', '.join(MODES)})")
+        self.mode = mode
+        self.interval_s = interval_s
+        self.stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.stacks = Counter()                      # folded stack -> samples
+        self.agent_self = defaultdict(Counter)       # agent -> leaf frame -> samples
+        self.agent_samples = Counter()
+        self.agent_calls = Counter()
+        self.agent_wall = defaultdict(float)
+        self.agent_cpu = defaultdict(float)
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cprofile = None
+        self.started = self.elapsed = None
+
+    # -- sampling --------------------------------------------------------
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                agent = _agent_by_thread.get(ident)
+                root = f"{names.get(ident, ident)}" + (f";agent {agent}" if agent else "")
+                self.stacks[root + ";" + ";".join(reversed(stack))] += 1
+                if agent:
+                    self.agent_samples[agent] += 1
+                    self.agent_self[agent][stack[0]] += 1
+            self.samples += 1
+
+    # -- lifecycle -------------------------------------------------------
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == "sample":
+            self._thread = threading.Thread(target=self._sample_loop, name="aive-profiler", daemon=True)
+            self._thread.start()
+        else:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self) -> dict:
+        self.elapsed = time.perf_counter() - self.started
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        return self.write()
+
+    def record_agent(self, agent_id: str, wall_s: float, cpu_s: float):
+        with self._lock:
+            self.agent_calls[agent_id] += 1
+            self.agent_wall[agent_id] += wall_s
+            self.agent_cpu[agent_id] += cpu_s
+
+    # -- output ----------------------------------------------------------
+    def agent_report(self) -> dict:
+        report = {}
+        for agent in sorted(set(self.agent_calls) | set(self.agent_samples)):
+            entry = {
+                "calls": self.agent_calls[agent],
+                "wall_s": round(self.agent_wall[agent], 3),
+                "cpu_s": round(self.agent_cpu[agent], 3),
+            }
+            if self.mode == "sample":
+                entry["sampled_s"] = round(self.agent_samples[agent] * self.interval_s, 3)
+                entry["top_self"] = [
+                    {"frame": label, "self_s": round(n * self.interval_s, 3)}
+                    for label, n in self.agent_self[agent].most_common(10)
+                ]
+            report[agent] = entry
+        return report
+
+    def write(self) -> dict:
+        PROFILE_DIR.mkdir(exist_ok=True)
+        report = {"mode": self.mode, "elapsed_s": round(self.elapsed, 3), "agents": self.agent_report()}
+        if self.mode == "sample":
+            path = PROFILE_DIR / f"profile_{self.stamp}.folded"
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            report.update(file=str(path), samples=self.samples, interval_ms=self.interval_s * 1000)
+        else:
+            path = PROFILE_DIR / f"profile_{self.stamp}.pstats"
+            self._cprofile.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(self._cprofile, stream=out).sort_stats("tottime").print_stats(15)
+            report.update(file=str(path), top=out.getvalue().splitlines()[-20:])
+        print(f"🔥 Profile written to {path}")
+        return report
+
+
+@contextmanager
+def profile_run(mode: str = "sample"):
+    """Profile the enclosed block; the report dict is filled in on exit."""
+    global _active
+    profile = Profile(mode)
+    report = {}
+    _active = profile
+    profile.start()
+    try:
+        yield report
+    finally:
+        _active = None
+        report.update(profile.stop())
+
+
+@contextmanager
+def agent_scope(agent_id: str):
+    """Attribute samples and time on this thread to `agent_id` while profiling."""
+    profile = _active
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    previous = _agent_by_thread.get(ident)
+    _agent_by_thread[ident] = agent_id
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        profile.record_agent(agent_id, time.perf_counter() - wall, time.thread_time() - cpu)
+        if previous is None:
+            _agent_by_thread.pop(ident, None)
+        else:
+            _agent_by_thread[ident] = previous
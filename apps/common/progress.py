@@ -0,0 +1,167 @@
+"""
+progress.py
+In-process fan-out of orchestration progress events (served as SSE by A8).
+
+The orchestrator publishes from worker threads; each subscriber owns a
+bounded deque that drops its oldest events when full, and is woken on its
+own event loop with call_soon_threadsafe. Publishing never blocks on a
+slow subscriber. A short shared history lets reconnecting clients resume
+from their Last-Event-ID. Orchestrations running in worker processes send
+their events back over a multiprocessing queue (forward_to / relay).
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from apps.common.settings import setting
+
+SUBSCRIBER_BUFFER = int(setting("AIVE_PROGRESS_BUFFER", "500"))   # events kept per subscriber
+HISTORY_SIZE = int(setting("AIVE_PROGRESS_HISTORY", "200"))         # events kept for reconnects
+KEEPALIVE_S = 15.0
+
+
+class Subscriber:
+    def __init__(self, loop, client_id: str = None):
+        self.loop = loop
+        self.client_id = None if client_id is None else str(client_id)   # query strings are str, event ids int
+        self.events = deque(maxlen=SUBSCRIBER_BUFFER)
+        self.dropped = 0
+        self.wakeup = asyncio.Event()
+        self._wake_pending = False
+
+    def push(self, event: dict):
+        if self.client_id and event.get("client_id") is not None and str(event["client_id"]) != self.client_id:
+            return
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+        if not self._wake_pending:
+            # One wakeup per drain, however many events arrive in between
+            self._wake_pending = True
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def drain(self) -> list:
+        self._wake_pending = False
+        self.wakeup.clear()
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+
+class ProgressBus:
+    def __init__(self):
+        self._subscribers = set()
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def subscribe(self, client_id: str = None, last_event_id: int = None) -> Subscriber:
+        """Register a subscriber on the running event loop (call from async code)."""
+        sub = Subscriber(asyncio.get_running_loop(), client_id)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event["id"] > last_event_id:
+                        sub.push(event)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event_type: str, **fields):
+        """Fan an event out to every subscriber. Safe from any thread; never blocks."""
+        with self._lock:
+            event = {
+                "id": next(self._ids),
+                "type": event_type,
+                "ts": datetime.now(timezone.utc).isoformat(),
+                **fields,
+            }
+            self._history.append(event)
+            for sub in list(self._subscribers):
+                try:
+                    sub.push(event)
+                except RuntimeError:
+                    # Subscriber's event loop is gone
+                    self._subscribers.discard(sub)
+        return event
+
+    def open(self):
+        self.closed = False
+
+    def close(self):
+        """Wake every subscriber so open SSE streams end (API shutdown)."""
+        with self._lock:
+            self.closed = True
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.wakeup.set)
+            except RuntimeError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "dropped": sum(s.dropped for s in self._subscribers),
+                "last_event_id": self._history[-1]["id"] if self._history else 0,
+            }
+
+
+bus = ProgressBus()
+_forward_queue = None   # set in orchestration worker processes
+
+
+def publish(event_type: str, **fields):
+    if _forward_queue is not None:
+        _forward_queue.put((event_type, fields))
+        return {"type": event_type, **fields}
+    return bus.publish(event_type, **fields)
+
+
+# --------------------------------------------------------------------
+# 🔀 Relay from orchestration worker processes
+# --------------------------------------------------------------------
+def forward_to(queue):
+    """In a worker process: send every published event to `queue` instead of the local bus."""
+    global _forward_queue
+    _forward_queue = queue
+
+
+def relay(queue):
+    """In the API process: republish events from worker processes until None arrives (run on a thread)."""
+    while True:
+        item = queue.get()
+        if item is None:
+            return
+        event_type, fields = item
+        bus.publish(event_type, **fields)
+
+
+async def sse_events(request, client_id: str = None, last_event_id: int = None):
+    """Async generator of SSE frames for one HTTP subscriber."""
+    sub = bus.subscribe(client_id, last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        while not bus.closed and not await request.is_disconnected():
+            try:
+                await asyncio.wait_for(sub.wakeup.wait(), timeout=KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            dropped, sub.dropped = sub.dropped, 0
+            if dropped:
+                yield f"event: dropped\ndata: {json.dumps({'count': dropped})}\n\n"
+            for event in sub.drain():
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+    finally:
+        bus.unsubscribe(sub)
@@ -0,0 +1,221 @@
+"""
+resilience.py
+Circuit breakers and adaptive (AIMD) concurrency limits for the external
+dependencies every agent shares: Supabase, the MCP server and OpenAI.
+
+Usage:
+    result = guarded("supabase", query.execute)
+
+- A breaker opens after AIVE_CB_FAILURES consecutive failures and fast-fails
+  every call with CircuitOpenError for AIVE_CB_RESET_S seconds. It then lets
+  a single half-open probe through; success closes it, failure re-opens it.
+- Each dependency has a concurrency limit that grows by ~1 per window of
+  healthy calls and halves on an error or a call slower than its latency
+  target (additive increase / multiplicative decrease).
+"""
+
+import threading
+import time
+
+from apps.common.settings import setting
+from apps.common.deadlines import BudgetExceeded, budget_expired, check_budget, current_budget
+
+FAILURE_THRESHOLD = int(setting("AIVE_CB_FAILURES", "5"))
+RESET_TIMEOUT = float(setting("AIVE_CB_RESET_S", "30"))
+LIMIT_MAX = int(setting("AIVE_LIMIT_MAX", "16"))
+LIMIT_INITIAL = int(setting("AIVE_LIMIT_INITIAL", "4"))
+
+# Calls slower than this (seconds) count as congestion for the AIMD limiter
+LATENCY_TARGETS = {
+    "supabase": float(setting("AIVE_SUPABASE_LATENCY_TARGET", "2")),
+    "mcp": float(setting("AIVE_MCP_LATENCY_TARGET", "10")),
+    "openai": float(setting("AIVE_OPENAI_LATENCY_TARGET", "90")),
+    "anthropic": float(setting("AIVE_ANTHROPIC_LATENCY_TARGET", "90")),
+    "gemini": float(setting("AIVE_GEMINI_LATENCY_TARGET", "90")),
+    "stub": 90.0,
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, dependency: str, retry_in: float):
+        super().__init__(f"{dependency} circuit open — retry in {retry_in:.0f}s")
+        self.dependency = dependency
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Closed → open after N consecutive failures → half-open probe after a cooldown."""
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may proceed."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == OPEN and elapsed >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(self.name, max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Let another half-open probe through without changing state."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"⛔ Circuit opened for {self.name} after {self.failures} failure(s)")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: +1/limit per healthy call, ×0.5 on error or slow call."""
+
+    def __init__(self, name: str, latency_target: float, initial: int = LIMIT_INITIAL, maximum: int = LIMIT_MAX):
+        self.name = name
+        self.latency_target = latency_target
+        self.limit = float(max(1, min(initial, maximum)))
+        self.maximum = maximum
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Wait for a slot; False if none freed up within `timeout` seconds."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                wait = None if end is None else end - time.monotonic()
+                if wait is not None and wait <= 0:
+                    return False
+                self._cond.wait(wait)
+            self.in_flight += 1
+            return True
+
+    def cancel(self):
+        """Give a slot back without adjusting the limit."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, latency: float, ok: bool):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if not ok or latency > self.latency_target:
+                # Back off at most once per latency window so one burst doesn't collapse the limit
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(1.0, self.limit * 0.5)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class Dependency:
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        self.limiter = AdaptiveLimiter(name, LATENCY_TARGETS.get(name, 10.0))
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+
+
+_dependencies = {}
+_dependencies_lock = threading.Lock()
+
+
+def get_dependency(name: str) -> Dependency:
+    with _dependencies_lock:
+        if name not in _dependencies:
+            _dependencies[name] = Dependency(name)
+        return _dependencies[name]
+
+
+def guarded(name: str, fn, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs) behind the named dependency's breaker and limiter.
+    Failures caused by our own expired time budget don't count against the dependency.
+    """
+    check_budget()
+    dep = get_dependency(name)
+    try:
+        dep.breaker.before_call()
+    except CircuitOpenError:
+        dep.rejected += 1
+        raise
+
+    budget = current_budget()
+    if not dep.limiter.acquire(timeout=budget.remaining() if budget is not None else None):
+        dep.breaker.release_probe()
+        raise BudgetExceeded(budget.name)
+
+    start = time.monotonic()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as exc:
+        dep.calls += 1
+        if budget_expired():
+            # Our own deadline cut the call short — cancel instead of blaming the dependency
+            dep.limiter.cancel()
+            dep.breaker.release_probe()
+            raise BudgetExceeded(budget.name) from exc
+        dep.errors += 1
+        dep.limiter.release(time.monotonic() - start, ok=False)
+        dep.breaker.record_failure()
+        raise
+    except BaseException:
+        dep.limiter.cancel()
+        dep.breaker.release_probe()
+        raise
+
+    dep.calls += 1
+    dep.limiter.release(time.monotonic() - start, ok=True)
+    dep.breaker.record_success()
+    return result
+
+
+def dependency_status() -> dict:
+    """Snapshot of breaker state and concurrency limit per dependency."""
+    with _dependencies_lock:
+        deps = list(_dependencies.values())
+    return {
+        d.name: {
+            "state": d.breaker.state,
+            "consecutive_failures": d.breaker.failures,
+            "concurrency_limit": round(d.limiter.limit, 2),
+            "in_flight": d.limiter.in_flight,
+            "calls": d.calls,
+            "errors": d.errors,
+            "rejected": d.rejected,
+        }
+        for d in deps
+    }
@@ -0,0 +1,186 @@
+"""
+response_cache.py
+Conditional GET + compression for the Retool dashboard endpoints.
+
+Each cached endpoint is keyed by the write versions of the tables it reads
+(see db_utils.table_version). While no write has happened and the entry is
+younger than AIVE_RESPONSE_CACHE_TTL seconds, polls reuse the serialized body
+without touching Supabase; when it is stale, one request per endpoint
+refreshes it while concurrent ones wait for that result. The ETag is a hash of the serialized body, so
+clients sending If-None-Match / If-Modified-Since get a bodiless 304.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from apps.common.db_utils import table_version
+from apps.common.spend_guard import SpendBudgetExceeded
+from apps.common.settings import setting
+
+# --- Optional fast paths (fall back to stdlib when not installed) ---
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHE_TTL = float(setting("AIVE_RESPONSE_CACHE_TTL", "15"))
+COMPRESS_MIN_BYTES = int(setting("AIVE_COMPRESS_MIN_BYTES", "1024"))
+
+_entries = {}
+_entries_lock = threading.Lock()
+_refresh_locks = {}     # key -> lock held by the one request refreshing that entry
+
+
+class _CachedBody:
+    """Serialized payload for one endpoint at one table-version state."""
+
+    __slots__ = ("state", "fetched_at", "etag", "last_modified", "body", "encoded")
+
+    def __init__(self, state, body, etag, last_modified):
+        self.state = state
+        self.fetched_at = time.monotonic()
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.encoded = {"identity": body}
+
+
+def dumps(payload) -> bytes:
+    """Serialize to compact JSON bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=str, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def clear():
+    """Drop every cached body (API startup / shutdown)."""
+    with _entries_lock:
+        _entries.clear()
+        _refresh_locks.clear()
+
+
+def _http_date(dt: datetime) -> str:
+    return format_datetime(dt.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def _fresh(entry, state) -> bool:
+    return entry is not None and entry.state == state and time.monotonic() - entry.fetched_at < CACHE_TTL
+
+
+def _load(key: str, tables, loader) -> _CachedBody:
+    """Return the cached body for `key`, refreshing it when tables changed or TTL expired."""
+    state = tuple(table_version(t)[0] for t in tables)
+    with _entries_lock:
+        entry = _entries.get(key)
+        refresh_lock = _refresh_locks.setdefault(key, threading.Lock())
+    if _fresh(entry, state):
+        return entry
+
+    # Single flight: a burst of polls on a stale entry costs one Supabase read, not one per request
+    with refresh_lock:
+        with _entries_lock:
+            entry = _entries.get(key)
+        if _fresh(entry, state):
+            return entry
+        return _refresh(key, tables, loader, state, entry)
+
+
+def _refresh(key: str, tables, loader, state, entry) -> _CachedBody:
+    try:
+        body = dumps(loader())
+    except SpendBudgetExceeded as e:
+        if entry is None:
+            raise
+        # Out of read budget: a slightly stale dashboard beats an error
+        print(f"💸 {e} — serving cached '{key}' response")
+        return entry
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    if entry is not None and entry.etag == etag:
+        # Content unchanged (e.g. TTL refresh) — keep validators stable
+        entry.state = state
+        entry.fetched_at = time.monotonic()
+        return entry
+
+    writes = [table_version(t)[1] for t in tables if table_version(t)[1] is not None]
+    last_modified = max(writes) if writes else datetime.utcnow()
+    if entry is not None and entry.state == state:
+        # New body without a write from this process: another worker, the orchestration
+        # pool or an external writer changed the table, so the local write time is stale
+        last_modified = max(last_modified, datetime.utcnow())
+    entry = _CachedBody(state, body, etag, last_modified)
+    with _entries_lock:
+        _entries[key] = entry
+    return entry
+
+
+def _not_modified(request: Request, entry: _CachedBody) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or any(t.removeprefix("W/") == entry.etag for t in tags)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).astimezone(timezone.utc).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return False
+        return entry.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _pick_encoding(accept_encoding: str, size: int) -> str:
+    if size < COMPRESS_MIN_BYTES:
+        return "identity"
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def _encode(entry: _CachedBody, encoding: str) -> bytes:
+    """Compress once per (entry, encoding) and memoize."""
+    content = entry.encoded.get(encoding)
+    if content is None:
+        if encoding == "br":
+            content = brotli.compress(entry.body, quality=5)
+        else:
+            content = gzip.compress(entry.body, compresslevel=6)
+        entry.encoded[encoding] = content
+    return content
+
+
+def cached_json_response(request: Request, key: str, tables, loader) -> Response:
+    """
+    Serve `loader()` as JSON with ETag/Last-Modified validators and compression.
+    `tables` lists the Supabase tables whose writes invalidate this response.
+    """
+    entry = _load(key, tables, loader)
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": _http_date(entry.last_modified),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+
+    encoding = _pick_encoding(request.headers.get("accept-encoding", ""), len(entry.body))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=_encode(entry, encoding), media_type="application/json", headers=headers)
@@ -0,0 +1,258 @@
+"""
+scheduler.py
+Priority work queue for orchestration runs (data/scheduler.db).
+
+Clients are queued as jobs (at most one queued job per client) and claimed
+one at a time by orchestration workers in any process:
+- manual requests (e.g. a Retool rerun) are claimed before anything else,
+- otherwise tiers share the workers by weight (stride scheduling: each claim
+  advances the tier's pass by 1 / weight, the lowest pass goes next), so Pro
+  clients start early whatever the fleet size and Basic is never starved,
+- within a tier the client whose last completed run is oldest goes first.
+
+Jobs are tagged with the orchestration run that queued them (run_id) and a
+run only claims its own jobs plus untagged ones (manual reruns), so two runs
+never take each other's clients.
+
+Queue depth and wait times (enqueue → start) are reported by stats().
+
+    AIVE_TIER_WEIGHTS     e.g. "Pro:6,Growth:3,Basic:1"
+    AIVE_DEFAULT_TIER     tier for clients without one (default Basic)
+"""
+
+import json
+import time
+from dataclasses import asdict, is_dataclass
+
+from apps.common.settings import setting
+from apps.common.local_store import connect, transaction
+
+TIER_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, _, weight in (item.partition(":") for item in setting("AIVE_TIER_WEIGHTS", "Pro:6,Growth:3,Basic:1").split(","))
+    if name.strip()
+}
+DEFAULT_TIER = setting("AIVE_DEFAULT_TIER", "Basic")
+STATS_WINDOW_S = 24 * 3600
+
+MANUAL, BATCH = 1, 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    client_id TEXT NOT NULL,
+    client TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    urgency INTEGER NOT NULL DEFAULT 0,
+    source TEXT NOT NULL,
+    run_id TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_one_queued ON jobs(client_id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, tier, urgency);
+CREATE INDEX IF NOT EXISTS jobs_started ON jobs(started_at);
+CREATE TABLE IF NOT EXISTS last_runs (
+    client_id TEXT PRIMARY KEY,
+    finished_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tier_pass (
+    tier TEXT PRIMARY KEY,
+    pass REAL NOT NULL
+);
+"""
+COLUMNS = {"jobs": {"run_id": "TEXT"}}   # added after the first release of the schema
+
+
+def _db():
+    return connect("scheduler", SCHEMA, COLUMNS)
+
+
+def tier_weight(tier: str) -> float:
+    return TIER_WEIGHTS.get(tier) or TIER_WEIGHTS.get(DEFAULT_TIER) or 1.0
+
+
+def _as_dict(client) -> dict:
+    return asdict(client) if is_dataclass(client) else dict(client)
+
+
+def enqueue(clients, urgency: int = BATCH, source: str = "batch", run_id: str = None) -> int:
+    """
+    Queue jobs for clients (ClientRecords or dicts with client_id and tier).
+    A client that is already queued keeps its place; a manual request raises
+    its urgency and a run_id moves the job to that run. Returns the number of
+    clients queued or updated.
+    """
+    now = time.time()
+    rows = []
+    for client in clients:
+        data = _as_dict(client)
+        rows.append((str(data["client_id"]), json.dumps(data, default=str), data.get("tier") or DEFAULT_TIER, urgency, source, run_id, now))
+    if not rows:
+        return 0
+    conn = _db()
+    with transaction(conn, immediate=True):
+        conn.executemany(
+            """INSERT INTO jobs (client_id, client, tier, urgency, source, run_id, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(client_id) WHERE status = 'queued' DO UPDATE SET
+                   client = excluded.client,
+                   tier = excluded.tier,
+                   run_id = COALESCE(excluded.run_id, run_id),
+                   urgency = MAX(urgency, excluded.urgency),
+                   source = CASE WHEN excluded.urgency > urgency THEN excluded.source ELSE source END""",
+            rows,
+        )
+    return len(rows)
+
+
+def _pick_tier(conn, run_id):
+    """Stride scheduling over tiers that have jobs run_id may claim; advances the chosen tier's pass."""
+    tiers = [row["tier"] for row in conn.execute(
+        "SELECT DISTINCT tier FROM jobs WHERE status = 'queued' AND (run_id IS NULL OR run_id = ?)", (run_id,)
+    )]
+    if not tiers:
+        return None
+    passes = {row["tier"]: row["pass"] for row in conn.execute("SELECT tier, pass FROM tier_pass")}
+    # Virtual time (row "*") is the pass of the last tier served; a tier that was idle
+    # starts there instead of cashing in credit saved up while it had nothing queued
+    vtime = passes.get("*", 0.0)
+    active = {tier: max(passes.get(tier, vtime), vtime) for tier in tiers}
+    tier = min(tiers, key=lambda t: (active[t], -tier_weight(t), t))
+    vtime = active[tier]
+    active[tier] += 1.0 / tier_weight(tier)
+    conn.executemany(
+        "INSERT INTO tier_pass (tier, pass) VALUES (?, ?) ON CONFLICT(tier) DO UPDATE SET pass = excluded.pass",
+        [*active.items(), ("*", vtime)],
+    )
+    return tier
+
+
+def claim(run_id: str = None):
+    """
+    Take the next job queued for run_id or for no run (manual first, then by
+    weighted tier share and staleness).
+    Returns {"id", "client", "tier", "source", "run_id", "wait_s"} or None when there is none.
+    """
+    conn = _db()
+    with transaction(conn, immediate=True):
+        order = "ORDER BY COALESCE(r.finished_at, 0), j.enqueued_at, j.id LIMIT 1"
+        base = ("SELECT j.* FROM jobs j LEFT JOIN last_runs r ON r.client_id = j.client_id "
+                "WHERE j.status = 'queued' AND (j.run_id IS NULL OR j.run_id = ?)")
+        row = conn.execute(f"{base} AND j.urgency >= ? ORDER BY j.enqueued_at, j.id LIMIT 1", (run_id, MANUAL)).fetchone()
+        if row is None:
+            tier = _pick_tier(conn, run_id)
+            if tier is None:
+                return None
+            row = conn.execute(f"{base} AND j.tier = ? {order}", (run_id, tier)).fetchone()
+        now = time.time()
+        conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (now, row["id"]))
+    return {
+        "id": row["id"],
+        "client": json.loads(row["client"]),
+        "tier": row["tier"],
+        "source": row["source"],
+        "run_id": row["run_id"],
+        "wait_s": round(now - row["enqueued_at"], 3),
+    }
+
+
+def finish(job_id: int, status: str = "done"):
+    """Mark a claimed job done, failed or skipped; only done jobs reset the client's staleness."""
+    now = time.time()
+    conn = _db()
+    with transaction(conn, immediate=True):
+        conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, now, job_id))
+        if status == "done":
+            conn.execute(
+                """INSERT INTO last_runs (client_id, finished_at) SELECT client_id, ? FROM jobs WHERE id = ?
+                   ON CONFLICT(client_id) DO UPDATE SET finished_at = excluded.finished_at""",
+                (now, job_id),
+            )
+
+
+def requeue_stale(older_than_s: float) -> int:
+    """Put jobs back in the queue whose worker died mid-run (running longer than older_than_s)."""
+    conn = _db()
+    with transaction(conn, immediate=True):
+        stale = conn.execute(
+            "SELECT id, client_id FROM jobs WHERE status = 'running' AND started_at < ?", (time.time() - older_than_s,)
+        ).fetchall()
+        for row in stale:
+            already_queued = conn.execute(
+                "SELECT 1 FROM jobs WHERE client_id = ? AND status = 'queued'", (row["client_id"],)
+            ).fetchone()
+            if already_queued:
+                conn.execute("UPDATE jobs SET status = 'failed', finished_at = ? WHERE id = ?", (time.time(), row["id"]))
+            else:
+                conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE id = ?", (row["id"],))
+    return len(stale)
+
+
+def position(client_id) -> int:
+    """Place of a queued client: among manual jobs for a manual one, else the queue depth (None if not queued)."""
+    conn = _db()
+    row = conn.execute("SELECT urgency, enqueued_at, id FROM jobs WHERE client_id = ? AND status = 'queued'",
+                       (str(client_id),)).fetchone()
+    if row is None:
+        return None
+    if row["urgency"] >= MANUAL:
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND urgency >= ? AND (enqueued_at < ? OR (enqueued_at = ? AND id < ?))",
+            (MANUAL, row["enqueued_at"], row["enqueued_at"], row["id"]),
+        ).fetchone()[0]
+        return ahead + 1
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 3)
+
+
+def stats() -> dict:
+    """Queue depth per tier, running jobs, and wait-time percentiles of jobs started in the last 24h."""
+    conn = _db()
+    now = time.time()
+    tiers = {}
+    for row in conn.execute(
+        "SELECT tier, status, COUNT(*) AS n, SUM(urgency >= ?) AS manual, MIN(enqueued_at) AS oldest "
+        "FROM jobs WHERE status IN ('queued', 'running') GROUP BY tier, status", (MANUAL,)
+    ):
+        entry = tiers.setdefault(row["tier"], {"weight": tier_weight(row["tier"]), "queued": 0, "manual_queued": 0,
+                                               "running": 0, "oldest_wait_s": None})
+        if row["status"] == "queued":
+            entry["queued"] = row["n"]
+            entry["manual_queued"] = row["manual"] or 0
+            entry["oldest_wait_s"] = round(now - row["oldest"], 3)
+        else:
+            entry["running"] = row["n"]
+
+    waits = {}
+    for row in conn.execute(
+        "SELECT tier, source, started_at - enqueued_at AS wait FROM jobs WHERE started_at >= ?", (now - STATS_WINDOW_S,)
+    ):
+        waits.setdefault(row["tier"], []).append(row["wait"])
+        waits.setdefault(f"source:{row['source']}", []).append(row["wait"])
+    wait_s = {}
+    for key, values in sorted(waits.items()):
+        values.sort()
+        wait_s[key] = {"jobs": len(values), "p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95),
+                       "max": round(values[-1], 3)}
+    return {
+        "depth": sum(t["queued"] for t in tiers.values()),
+        "running": sum(t["running"] for t in tiers.values()),
+        "tiers": tiers,
+        "wait_s_24h": wait_s,
+    }
+
+
+def prune(keep_days: float = 7) -> int:
+    """Delete finished jobs older than keep_days."""
+    conn = _db()
+    with transaction(conn):
+        return conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed', 'skipped') AND finished_at < ?", (time.time() - keep_days * 86400,)
+        ).rowcount
@@ -0,0 +1,142 @@
+"""
+search_index.py
+Local full-text / keyword index over content_outputs and research_insights.
+
+Rows are indexed into SQLite FTS5 (data/search.db) as they are logged, so
+a keyword lookup is an inverted-index query instead of downloading whole
+tables. Ranking is BM25 with title (content type / topic) and keywords
+weighted above body text; results can be filtered by client and kind and
+paged with limit/offset. db_utils.backfill_search_index() indexes rows
+logged before the index existed.
+"""
+
+import hashlib
+import json
+import re
+
+from apps.common.local_store import connect, transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    ref TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    client_id TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS items_client ON items(client_id, kind);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+    title, keywords, body, tags,
+    tokenize = 'porter unicode61'
+);
+"""
+
+# BM25 column weights: title, keywords, body, tags (filter tokens only)
+_WEIGHTS = (5.0, 3.0, 1.0, 0.0)
+_TERM = re.compile(r"[\w-]+\*?", re.UNICODE)
+MAX_LIMIT = 100
+
+
+def _db():
+    return connect("search", SCHEMA)
+
+
+def _tag(prefix: str, value) -> str:
+    """Filter token for the tags column, e.g. client "LOTUS-001" -> "client3f2a…"."""
+    return prefix + hashlib.sha1(str(value).encode("utf-8")).hexdigest()[:16]
+
+
+def _doc_for(kind: str, row: dict):
+    if kind == "content_outputs":
+        keywords = row.get("keywords") or []
+        if isinstance(keywords, str):
+            try:
+                keywords = json.loads(keywords)
+            except ValueError:
+                keywords = [keywords]
+        return row.get("content_type") or "", " ".join(map(str, keywords)), row.get("text") or ""
+    if kind == "research_insights":
+        return row.get("topic") or "", row.get("source") or "", row.get("insight") or ""
+    raise ValueError(f"Unsupported search kind: {kind}")
+
+
+def index_rows(kind: str, rows):
+    """Insert or replace rows of `kind` ("content_outputs" | "research_insights"). Each row needs a ref."""
+    rows = list(rows)
+    if not rows:
+        return 0
+    conn = _db()
+    with transaction(conn, immediate=True):
+        for row in rows:
+            ref = f"{kind}:{row['ref']}"
+            existing = conn.execute("SELECT id FROM items WHERE ref = ?", (ref,)).fetchone()
+            if existing:
+                conn.execute("DELETE FROM docs WHERE rowid = ?", (existing["id"],))
+                conn.execute("DELETE FROM items WHERE id = ?", (existing["id"],))
+            item_id = conn.execute(
+                "INSERT INTO items (ref, kind, client_id, created_at) VALUES (?, ?, ?, ?)",
+                (ref, kind, None if row.get("client_id") is None else str(row["client_id"]), row.get("timestamp")),
+            ).lastrowid
+            tags = f"{_tag('client', row.get('client_id'))} {_tag('kind', kind)}"
+            conn.execute(
+                "INSERT INTO docs (rowid, title, keywords, body, tags) VALUES (?, ?, ?, ?, ?)",
+                (item_id, *_doc_for(kind, row), tags),
+            )
+    return len(rows)
+
+
+def _match_expression(query: str, match_any: bool = False) -> str:
+    """Turn free text into a safe FTS5 expression: quoted terms, optional trailing * for prefixes."""
+    terms = []
+    for term in _TERM.findall(query):
+        prefix = term.endswith("*")
+        term = term.rstrip("*").replace('"', "")
+        if term:
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    if not terms:
+        return ""
+    # Restrict the free-text terms to title/keywords/body; tags are only used as filters
+    return "{title keywords body} : (" + (" OR " if match_any else " ").join(terms) + ")"
+
+
+def search(query: str, client_id=None, kind: str = None, limit: int = 20, offset: int = 0, match_any: bool = False) -> dict:
+    """Ranked search; returns {"total", "results": [{ref, kind, client_id, created_at, title, snippet, score}]}."""
+    expression = _match_expression(query, match_any)
+    if not expression:
+        return {"total": 0, "results": []}
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    offset = max(0, int(offset))
+
+    # Filters are index terms too, so FTS intersects posting lists instead of post-filtering rows
+    if client_id is not None:
+        expression += f" AND tags : {_tag('client', client_id)}"
+    if kind:
+        expression += f" AND tags : {_tag('kind', kind)}"
+    where = "docs MATCH ?"
+    params = [expression]
+
+    conn = _db()
+    total = conn.execute(f"SELECT COUNT(*) FROM docs WHERE {where}", params).fetchone()[0]
+    rows = conn.execute(
+        f"""SELECT i.ref, i.kind, i.client_id, i.created_at, docs.title,
+                   snippet(docs, 2, '[', ']', '…', 16) AS snippet,
+                   bm25(docs, ?, ?, ?, ?) AS score
+            FROM docs JOIN items i ON i.id = docs.rowid
+            WHERE {where}
+            ORDER BY score
+            LIMIT ? OFFSET ?""",
+        [*_WEIGHTS, *params, limit, offset],
+    ).fetchall()
+    results = []
+    for row in rows:
+        result = dict(row)
+        result["ref"] = result["ref"].split(":", 1)[1]
+        result["score"] = -result["score"]   # bm25() is lower-is-better; expose higher-is-better
+        results.append(result)
+    return {"total": total, "limit": limit, "offset": offset, "results": results}
+
+
+def stats() -> dict:
+    conn = _db()
+    counts = dict(conn.execute("SELECT kind, COUNT(*) FROM items GROUP BY kind").fetchall())
+    return {"documents": sum(counts.values()), "by_kind": counts}
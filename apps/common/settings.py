@@ -0,0 +1,44 @@
+"""
+settings.py
+Single place that loads the project .env and exposes settings.
+
+Every module reads configuration through setting(), so the .env file is
+loaded exactly once per process, however the process was started (API,
+CLI or a single agent run directly).
+"""
+
+import os
+import sys
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+ENV_PATH = ROOT_DIR / ".env"
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_settings():
+    """Load the project .env once (existing environment variables win)."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            load_dotenv(dotenv_path=ENV_PATH)
+            _loaded = True
+
+
+def setting(name: str, default=None):
+    """Read a setting from the environment after the .env file has been loaded."""
+    load_settings()
+    return os.getenv(name, default)
+
+
+def ensure_project_root_on_path():
+    """Make `apps.*` importable when a module is launched as a script."""
+    if str(ROOT_DIR) not in sys.path:
+        sys.path.insert(0, str(ROOT_DIR))
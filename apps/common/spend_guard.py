@@ -0,0 +1,207 @@
+"""
+spend_guard.py
+Supabase spend guardrail: token-bucket request budgets per table and operation.
+
+Every Supabase request draws from a bucket keyed "table:read" or
+"table:write". Buckets live in data/spend_guard.db and are updated inside
+BEGIN IMMEDIATE transactions, so every worker process and thread shares
+one budget. When a bucket runs short:
+- reads are refused (SpendBudgetExceeded); dashboards fall back to their
+  last cached response,
+- non-critical writes are deferred to a local queue (and coalesced, e.g.
+  only the latest value per client + metric is kept) until flush_deferred(),
+- critical writes (governance trail, clients) always go through and are
+  charged, possibly taking the bucket into debt.
+
+    AIVE_BUDGET_READS_PER_MIN / AIVE_BUDGET_WRITES_PER_MIN     defaults per table
+    AIVE_BUDGET_<TABLE>_<READS|WRITES>_PER_MIN                  per-table override
+    AIVE_BUDGET_BURST_MIN       bucket capacity in minutes of refill (default 2)
+    AIVE_BUDGET_RESERVE         share of capacity kept for critical writes (default 0.2)
+"""
+
+import json
+import time
+from datetime import datetime
+
+from apps.common.settings import setting
+from apps.common.local_store import connect, transaction
+
+ENABLED = setting("AIVE_BUDGET_ENABLED", "1") == "1"
+READS_PER_MIN = float(setting("AIVE_BUDGET_READS_PER_MIN", "120"))
+WRITES_PER_MIN = float(setting("AIVE_BUDGET_WRITES_PER_MIN", "600"))
+BURST_MIN = float(setting("AIVE_BUDGET_BURST_MIN", "2"))
+RESERVE = float(setting("AIVE_BUDGET_RESERVE", "0.2"))
+
+CRITICAL_TABLES = {"governance_events", "clients"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    key TEXT NOT NULL,
+    consumed REAL NOT NULL DEFAULT 0,
+    denied INTEGER NOT NULL DEFAULT 0,
+    deferred INTEGER NOT NULL DEFAULT 0,
+    coalesced INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, key)
+);
+CREATE TABLE IF NOT EXISTS deferred (
+    id INTEGER PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    coalesce_key TEXT UNIQUE,
+    created REAL NOT NULL
+);
+"""
+
+
+class SpendBudgetExceeded(RuntimeError):
+    def __init__(self, key: str, retry_in: float):
+        super().__init__(f"Supabase request budget exhausted for {key} (retry in {retry_in:.0f}s)")
+        self.key = key
+        self.retry_in = retry_in
+
+
+def _db():
+    return connect("spend_guard", SCHEMA)
+
+
+def _rate_per_min(table: str, op: str) -> float:
+    default = READS_PER_MIN if op == "read" else WRITES_PER_MIN
+    return float(setting(f"AIVE_BUDGET_{table.upper()}_{op.upper()}S_PER_MIN", default))
+
+
+def _limits(key: str):
+    table, op = key.rsplit(":", 1)
+    per_min = _rate_per_min(table, op)
+    return per_min * BURST_MIN, per_min / 60.0     # capacity, refill per second
+
+
+def _bump(conn, key: str, column: str, amount=1):
+    conn.execute(
+        f"""INSERT INTO usage (day, key, {column}) VALUES (?, ?, ?)
+            ON CONFLICT(day, key) DO UPDATE SET {column} = {column} + excluded.{column}""",
+        (datetime.utcnow().strftime("%Y-%m-%d"), key, amount),
+    )
+
+
+def _take(key: str, cost: float, reserve: float, allow_debt: bool):
+    """Refill and try to take `cost` tokens, keeping `reserve` of capacity untouched. Returns (ok, tokens_after)."""
+    capacity, rate = _limits(key)
+    now = time.time()
+    conn = _db()
+    with transaction(conn, immediate=True):
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row["tokens"] + (now - row["updated"]) * rate)
+        ok = allow_debt or tokens - cost >= reserve * capacity
+        if ok:
+            tokens -= cost
+            _bump(conn, key, "consumed", cost)
+        conn.execute(
+            "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+            (key, tokens, now),
+        )
+    return ok, tokens
+
+
+def charge(table: str, op: str, cost: float = 1.0):
+    """
+    Charge one Supabase request. Reads raise SpendBudgetExceeded when the bucket
+    is empty; writes are always let through here (non-critical writes check
+    try_write() first and defer themselves).
+    """
+    if not ENABLED:
+        return
+    key = f"{table}:{op}"
+    ok, tokens = _take(key, cost, reserve=0.0, allow_debt=(op == "write"))
+    if not ok:
+        with transaction(_db()) as conn:
+            _bump(conn, key, "denied")
+        _, rate = _limits(key)
+        raise SpendBudgetExceeded(key, (cost - tokens) / rate if rate else float("inf"))
+
+
+def try_write(table: str, cost: float = 1.0) -> bool:
+    """Take write tokens for a non-critical write, leaving the critical reserve alone."""
+    if not ENABLED or table in CRITICAL_TABLES:
+        return True
+    ok, _ = _take(f"{table}:write", cost, reserve=RESERVE, allow_debt=False)
+    return ok
+
+
+def defer(table: str, payload: dict, coalesce_key: str = None):
+    """Queue a write for flush_deferred(); a newer payload with the same coalesce_key replaces the queued one."""
+    key = f"{table}:write"
+    conn = _db()
+    with transaction(conn, immediate=True):
+        replaced = coalesce_key is not None and conn.execute(
+            "SELECT 1 FROM deferred WHERE coalesce_key = ?", (coalesce_key,)
+        ).fetchone() is not None
+        conn.execute(
+            """INSERT INTO deferred (table_name, payload, coalesce_key, created) VALUES (?, ?, ?, ?)
+               ON CONFLICT(coalesce_key) DO UPDATE SET payload = excluded.payload, created = excluded.created""",
+            (table, json.dumps(payload, default=str), coalesce_key, time.time()),
+        )
+        _bump(conn, key, "coalesced" if replaced else "deferred")
+
+
+def defer_many(table: str, payloads, coalesce_keys=None):
+    """defer() for a batch of rows in one transaction."""
+    payloads = list(payloads)
+    keys = list(coalesce_keys) if coalesce_keys is not None else [None] * len(payloads)
+    now = time.time()
+    conn = _db()
+    with transaction(conn, immediate=True):
+        conn.executemany(
+            """INSERT INTO deferred (table_name, payload, coalesce_key, created) VALUES (?, ?, ?, ?)
+               ON CONFLICT(coalesce_key) DO UPDATE SET payload = excluded.payload, created = excluded.created""",
+            [(table, json.dumps(p, default=str), k, now) for p, k in zip(payloads, keys)],
+        )
+        _bump(conn, f"{table}:write", "deferred", len(payloads))
+
+
+def pending(limit: int = None):
+    """Deferred rows grouped by table: {table: [(id, payload), ...]}, oldest first."""
+    sql = "SELECT id, table_name, payload FROM deferred ORDER BY id"
+    rows = _db().execute(sql + (" LIMIT ?" if limit else ""), (limit,) if limit else ()).fetchall()
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row["table_name"], []).append((row["id"], json.loads(row["payload"])))
+    return grouped
+
+
+def remove_deferred(ids):
+    ids = list(ids)
+    if not ids:
+        return
+    conn = _db()
+    with transaction(conn):
+        conn.executemany("DELETE FROM deferred WHERE id = ?", [(i,) for i in ids])
+
+
+def report() -> dict:
+    """Budget, remaining tokens and today's consumption per bucket, plus the deferred queue."""
+    conn = _db()
+    now = time.time()
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    usage = {row["key"]: dict(row) for row in conn.execute("SELECT * FROM usage WHERE day = ?", (today,))}
+    buckets = {}
+    for row in conn.execute("SELECT key, tokens, updated FROM buckets ORDER BY key"):
+        capacity, rate = _limits(row["key"])
+        used = usage.get(row["key"], {})
+        buckets[row["key"]] = {
+            "per_min": round(rate * 60, 2),
+            "capacity": capacity,
+            "available": round(min(capacity, row["tokens"] + (now - row["updated"]) * rate), 2),
+            "consumed_today": used.get("consumed", 0),
+            "denied_today": used.get("denied", 0),
+            "deferred_today": used.get("deferred", 0),
+            "coalesced_today": used.get("coalesced", 0),
+        }
+    queued = dict(conn.execute("SELECT table_name, COUNT(*) FROM deferred GROUP BY table_name").fetchall())
+    return {"enabled": ENABLED, "reserve": RESERVE, "buckets": buckets, "deferred_pending": queued}
@@ -0,0 +1,308 @@
+"""
+api_benchmark.py
+In-process latency / throughput benchmark for the AIVE FastAPI app
+(run_orchestrator_api.create_app()).
+
+The app runs against benchmarks.memory_store seeded with --rows metrics
+(10k … 1M) so Supabase never enters the numbers. Each endpoint is driven by
+--concurrency client threads for --requests requests; a separate short pass
+under tracemalloc measures allocation per request. A final "mixed" pass
+interleaves Retool polling and integration writes. Reports are written to
+logs/benchmarks/api_<timestamp>.json; --compare prints the change against an
+earlier report.
+
+    python -m benchmarks.api_benchmark --rows 10000
+    python -m benchmarks.api_benchmark --rows 1000000 --requests 200 --endpoints clients,health
+    python -m benchmarks.api_benchmark --no-cache --compare logs/benchmarks/api_2026-10-19_12-00-00.json
+"""
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+REPORT_DIR = ROOT_DIR / "logs" / "benchmarks"
+
+
+# --------------------------------------------------------------------
+# 🎯 Endpoints: name -> (method, path, request kwargs factory)
+# --------------------------------------------------------------------
+def _visibility_params(rng):
+    client = rng.randrange(1, 50)
+    return {"params": {
+        "agent_id": "BENCH", "client_id": str(client), "domain": f"client{client}.example",
+        "metric_type": "traffic_share", "metric_value": round(rng.uniform(0, 100), 2), "source": "benchmark",
+    }}
+
+
+ENDPOINTS = {
+    "health": ("GET", "/health", lambda rng: {}),
+    "root": ("GET", "/", lambda rng: {}),
+    "clients": ("GET", "/clients", lambda rng: {"headers": {"Accept-Encoding": "gzip"}}),
+    "metrics": ("GET", "/metrics", lambda rng: {"headers": {"Accept-Encoding": "gzip"}}),
+    "governance": ("GET", "/governance", lambda rng: {"headers": {"Accept-Encoding": "gzip"}}),
+    "log_visibility": ("POST", "/log/visibility", _visibility_params),
+}
+
+# Relative request mix for the "mixed" pass: mostly dashboard polls, some integration writes
+MIX = {"clients": 2, "metrics": 4, "governance": 3, "health": 1, "log_visibility": 2}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AIVE FastAPI endpoints in-process.")
+    parser.add_argument("--rows", type=int, default=10000, help="seeded visibility_metrics rows (governance gets half)")
+    parser.add_argument("--clients", type=int, help="seeded clients (default rows // 1000, min 10)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent client threads")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests per endpoint")
+    parser.add_argument("--memory-requests", type=int, default=20, help="requests in the tracemalloc pass")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--no-mixed", action="store_true", help="skip the mixed-load pass")
+    parser.add_argument("--no-cache", action="store_true", help="disable the dashboard response cache (AIVE_RESPONSE_CACHE_TTL=0)")
+    parser.add_argument("--compare", metavar="REPORT", help="earlier report to compare against")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def _configure_environment(args):
+    """Settings that must be in place before the apps are imported."""
+    os.environ.setdefault("AIVE_BUDGET_ENABLED", "0")      # measure the API, not the spend guardrail
+    os.environ.setdefault("AIVE_DEDUP_ACTION", "off")
+    os.environ.setdefault("SUPABASE_URL", "http://memory.local")
+    os.environ.setdefault("SUPABASE_KEY", "benchmark")
+    if args.no_cache:
+        os.environ["AIVE_RESPONSE_CACHE_TTL"] = "0"
+
+
+def _load_app(store):
+    from apps.common import db_utils
+    db_utils.supabase = store
+    from apps.AI_Visibility_Engine.agents.run_orchestrator_api import create_app
+    return create_app()   # lifespan isn't entered, so the store stays in place
+
+
+# --------------------------------------------------------------------
+# 🚦 Load generation
+# --------------------------------------------------------------------
+class _Clients:
+    """One TestClient per thread: TestClient isn't meant to be shared across threads."""
+
+    def __init__(self, app):
+        from fastapi.testclient import TestClient
+        self._factory = TestClient
+        self._app = app
+        self._local = threading.local()
+
+    def get(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._factory(self._app)
+        return client
+
+
+def _send(clients, name, rng):
+    method, path, make_kwargs = ENDPOINTS[name]
+    started = time.perf_counter()
+    response = clients.get().request(method, path, **make_kwargs(rng))
+    elapsed = time.perf_counter() - started
+    return elapsed, response.status_code, len(response.content)
+
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _summarize(latencies, statuses, sizes, wall_s):
+    ms = [s * 1000 for s in latencies]
+    errors = sum(1 for s in statuses if s >= 400)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / wall_s, 1) if wall_s else None,
+        "p50_ms": round(_percentile(ms, 0.50), 3) if ms else None,
+        "p90_ms": round(_percentile(ms, 0.90), 3) if ms else None,
+        "p99_ms": round(_percentile(ms, 0.99), 3) if ms else None,
+        "max_ms": round(max(ms), 3) if ms else None,
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else None,
+        "avg_response_bytes": int(statistics.fmean(sizes)) if sizes else 0,
+    }
+
+
+def _drive(clients, names, total, concurrency, seed):
+    """Run `total` requests over `concurrency` threads; names is the endpoint sequence to cycle through."""
+    results = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        local = []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            name = names[i % len(names)]
+            local.append((name, *_send(clients, name, rng)))
+        with lock:
+            results.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+def _memory_pass(clients, name, count, seed):
+    """Peak traced allocation while serving `count` sequential requests (run apart from the timed pass)."""
+    rng = random.Random(seed)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        for _ in range(count):
+            _send(clients, name, rng)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_alloc_kb": round((peak - base) / 1024, 1), "retained_kb": round((current - base) / 1024, 1)}
+
+
+def benchmark_endpoint(clients, name, args):
+    rng = random.Random(args.seed)
+    for _ in range(args.warmup):
+        _send(clients, name, rng)
+    results, wall_s = _drive(clients, [name], args.requests, args.concurrency, args.seed)
+    summary = _summarize([r[1] for r in results], [r[2] for r in results], [r[3] for r in results], wall_s)
+    if args.memory_requests:
+        summary.update(_memory_pass(clients, name, args.memory_requests, args.seed))
+    return summary
+
+
+def benchmark_mixed(clients, names, args):
+    weighted = [n for n in names if n in MIX for _ in range(MIX[n])]
+    if not weighted:
+        return None
+    random.Random(args.seed).shuffle(weighted)
+    results, wall_s = _drive(clients, weighted, args.requests * len(set(weighted)), args.concurrency, args.seed)
+    per_endpoint = {}
+    for name in sorted(set(weighted)):
+        rows = [r for r in results if r[0] == name]
+        per_endpoint[name] = _summarize([r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows], wall_s)
+    overall = _summarize([r[1] for r in results], [r[2] for r in results], [r[3] for r in results], wall_s)
+    return {"overall": overall, "endpoints": per_endpoint}
+
+
+# --------------------------------------------------------------------
+# 🧾 Reports
+# --------------------------------------------------------------------
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def write_report(report: dict) -> Path:
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    path = REPORT_DIR / f"api_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return path
+
+
+def compare(previous: dict, current: dict):
+    """Print p50 / p99 / rps changes per endpoint against an earlier report."""
+    print(f"\n🔁 Compared with {previous.get('started_at')} (commit {previous.get('commit')}, rows {previous['config'].get('rows')})")
+    for name, now in current["endpoints"].items():
+        before = previous.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        parts = []
+        for key in ("p50_ms", "p99_ms", "rps"):
+            if before.get(key) and now.get(key) is not None:
+                parts.append(f"{key} {before[key]} → {now[key]} ({(now[key] - before[key]) / before[key] * 100:+.1f}%)")
+        print(f"  {name:<22} " + ", ".join(parts))
+
+
+def _print_table(report: dict):
+    print(f"\n📊 {report['config']['rows']:,} rows, {report['config']['concurrency']} threads, "
+          f"{report['config']['requests']} requests/endpoint, cache {'off' if report['config']['no_cache'] else 'on'}")
+    print(f"  {'endpoint':<22}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'peak KB':>10}{'bytes':>11}")
+    rows = list(report["endpoints"].items())
+    if report.get("mixed"):
+        rows += [(f"mixed:{n}", s) for n, s in report["mixed"]["endpoints"].items()]
+    for name, s in rows:
+        print(f"  {name:<22}{s['rps'] or 0:>9}{s['p50_ms'] or 0:>10}{s['p99_ms'] or 0:>10}{s['errors']:>8}"
+              f"{s.get('peak_alloc_kb', ''):>10}{s['avg_response_bytes']:>11}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = [n.strip() for n in args.endpoints.split(",") if n.strip()]
+    unknown = [n for n in names if n not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)} (choose from {', '.join(ENDPOINTS)})")
+    _configure_environment(args)
+    for name in ("httpx", "httpx2"):   # one INFO line per TestClient request
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    from benchmarks.memory_store import MemoryStore, seed
+    store = MemoryStore()
+    started = time.perf_counter()
+    counts = seed(store, args.rows, args.clients, args.seed)
+    print(f"🌱 Seeded {counts} in {time.perf_counter() - started:.1f}s")
+    clients = _Clients(_load_app(store))
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"rows": args.rows, "seeded": counts, "requests": args.requests, "concurrency": args.concurrency,
+                   "warmup": args.warmup, "no_cache": args.no_cache, "seed": args.seed},
+        "endpoints": {},
+    }
+    for name in names:
+        print(f"🚦 {name} ...")
+        report["endpoints"][name] = benchmark_endpoint(clients, name, args)
+    if not args.no_mixed:
+        print("🚦 mixed ...")
+        report["mixed"] = benchmark_mixed(clients, names, args)
+    report["max_rss_mb"] = _max_rss_mb()
+
+    _print_table(report)
+    path = write_report(report)
+    print(f"\n🧾 Report saved to {path.relative_to(ROOT_DIR)}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
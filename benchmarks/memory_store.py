@@ -0,0 +1,176 @@
+"""
+memory_store.py
+In-memory stand-in for the Supabase client, for benchmarks.
+
+Implements the slice of the supabase-py / PostgREST query builder that
+db_utils uses (select / insert / upsert / update, eq / in_ / gte / lt /
+order / range / limit, execute) over plain lists of dicts, and exposes
+.request like the real builder so the spend guard and cassettes see the
+same table / method. Reads return copies of the rows, as a real client
+returns freshly parsed JSON.
+"""
+
+import random
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+class MemoryQuery:
+    def __init__(self, store: "MemoryStore", table: str):
+        self.store = store
+        self.table = table
+        self.method = "GET"
+        self.payload = None
+        self.columns = None
+        self.filters = []
+        self.sort = None
+        self.window = None
+        self.max_rows = None
+
+    # --- query builder ---
+    def select(self, columns: str = "*", **kwargs):
+        cols = [c.strip() for c in columns.split(",") if c.strip()]
+        self.columns = None if "*" in cols else cols
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.method, self.payload = "POST", payload
+        return self
+
+    def upsert(self, payload, **kwargs):
+        self.method, self.payload = "POST", payload
+        return self
+
+    def update(self, payload):
+        self.method, self.payload = "PATCH", payload
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value, lambda v, x=value: v == x))
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(("in", column, sorted(map(str, values)), lambda v: v in values))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(("gte", column, value, lambda v: v is not None and str(v) >= str(value)))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(("lt", column, value, lambda v: v is not None and str(v) < str(value)))
+        return self
+
+    def order(self, column, desc: bool = False, **kwargs):
+        self.sort = (column, desc)
+        return self
+
+    def range(self, start: int, end: int):
+        self.window = (start, end)
+        return self
+
+    def limit(self, count: int):
+        self.max_rows = count
+        return self
+
+    @property
+    def request(self):
+        params = [(op, col, str(val)) for op, col, val, _ in self.filters]
+        return SimpleNamespace(http_method=self.method, path=f"/rest/v1/{self.table}",
+                               params=f"{params}{self.sort}{self.window}{self.max_rows}")
+
+    # --- execution ---
+    def _alias(self, row: dict) -> dict:
+        if self.columns is None:
+            return dict(row)
+        out = {}
+        for column in self.columns:
+            alias, _, source = column.partition(":")
+            out[alias] = row.get(source or alias)
+        return out
+
+    def execute(self):
+        if self.method == "POST":
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            return SimpleNamespace(data=self.store.insert(self.table, rows), count=None)
+
+        rows = self.store.tables.setdefault(self.table, [])
+        matched = [r for r in rows if all(test(r.get(col)) for _, col, _, test in self.filters)]
+        if self.method == "PATCH":
+            with self.store.lock:
+                for row in matched:
+                    row.update(self.payload)
+            return SimpleNamespace(data=[dict(r) for r in matched], count=None)
+
+        if self.sort:
+            column, desc = self.sort
+            matched.sort(key=lambda r: (r.get(column) is None, str(r.get(column))), reverse=desc)
+        if self.window:
+            matched = matched[self.window[0]:self.window[1] + 1]
+        if self.max_rows is not None:
+            matched = matched[:self.max_rows]
+        return SimpleNamespace(data=[self._alias(r) for r in matched], count=None)
+
+
+class MemoryStore:
+    """Drop-in for db_utils.supabase: MemoryStore().table(name) returns a query builder."""
+
+    def __init__(self):
+        self.tables = {}
+        self.next_id = {}
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self, name)
+
+    def insert(self, table: str, rows, returning: bool = True) -> list:
+        with self.lock:
+            target = self.tables.setdefault(table, [])
+            stored = []
+            for row in rows:
+                self.next_id[table] = self.next_id.get(table, 0) + 1
+                stored.append(dict(row, id=self.next_id[table]))
+            target.extend(stored)
+        return [dict(r) for r in stored] if returning else []
+
+    def counts(self) -> dict:
+        return {name: len(rows) for name, rows in self.tables.items()}
+
+
+INDUSTRIES = ["Dental", "Plumbing", "Wellness", "Legal", "Roofing", "Accounting", "Fitness", "Veterinary"]
+METRIC_TYPES = ["traffic_share", "domain_authority", "backlinks", "llm_mentions", "visibility_score"]
+EVENT_TYPES = ["orchestration_run", "weekly_digest", "research_generated", "error", "dependency_unavailable"]
+
+
+def seed(store: MemoryStore, rows: int, clients: int = None, seed_value: int = 42) -> dict:
+    """
+    Fill clients, visibility_metrics and governance_events with deterministic
+    rows: `rows` metrics and rows // 2 governance events spread over the last
+    90 days, across `clients` clients (default rows // 1000, at least 10).
+    """
+    rng = random.Random(seed_value)
+    clients = clients or max(10, rows // 1000)
+    now = datetime.utcnow()
+    stamp = lambda: (now - timedelta(seconds=rng.randrange(90 * 86400))).isoformat()
+
+    store.insert("clients", [
+        {"client_id": i, "client_name": f"Client {i}", "domain": f"client{i}.example",
+         "industry": INDUSTRIES[i % len(INDUSTRIES)]}
+        for i in range(1, clients + 1)
+    ], returning=False)
+    store.insert("visibility_metrics", [
+        {"timestamp": stamp(), "agent_id": "A4", "client_id": (i % clients) + 1,
+         "domain": f"client{(i % clients) + 1}.example", "metric_type": METRIC_TYPES[i % len(METRIC_TYPES)],
+         "metric_value": round(rng.uniform(0, 100), 2), "source": "Similarweb", "notes": ""}
+        for i in range(rows)
+    ], returning=False)
+    store.insert("governance_events", [
+        {"timestamp": stamp(), "agent_id": "A8", "client_id": (i % clients) + 1,
+         "event_type": EVENT_TYPES[i % len(EVENT_TYPES)], "description": f"Seeded event {i}",
+         "category": "System", "action_required": i % 7 == 0, "approval_status": "Approved",
+         "reviewer": "System", "notes": ""}
+        for i in range(rows // 2)
+    ], returning=False)
+    return store.counts()
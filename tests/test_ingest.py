@@ -0,0 +1,32 @@
+"""
+test_ingest.py
+Bulk ingestion parsing and validation (apps.common.ingest).
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from apps.common.ingest import VISIBILITY_SCHEMA, parse_records, validate
+
+
+def test_mixed_batch_keeps_client_ids_exact():
+    # client_id is a text column: integer ids come back as "1", never as a float "1.0"
+    body = b"\n".join([
+        b'{"client_id": 1, "domain": "a.com", "metric_type": "visibility_score", "source": "export", "metric_value": 70}',
+        b'{not json',
+        b'{"domain": "b.com", "metric_type": "visibility_score", "source": "export", "metric_value": 60}',
+        b'[1, 2]',
+        b'{"client_id": 5, "domain": "c.com", "metric_type": "visibility_score", "source": "export", "metric_value": 55.5}',
+    ])
+    records, errors = parse_records(body, "application/x-ndjson")
+    valid, invalid = validate(records, VISIBILITY_SCHEMA, errors)
+
+    assert [row["client_id"] for row in valid] == ["1", "5"]
+    assert [row["metric_value"] for row in valid] == [70, 55.5]
+    assert [(i["index"], i["errors"]) for i in invalid] == [
+        (1, ["invalid JSON"]),
+        (2, ["client_id is required"]),
+        (3, ["expected a JSON object"]),
+    ]
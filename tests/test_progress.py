@@ -0,0 +1,26 @@
+"""
+test_progress.py
+Progress event fan-out (apps.common.progress).
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from apps.common.progress import ProgressBus
+
+
+def test_client_filter_matches_int_event_ids():
+    async def collect():
+        bus = ProgressBus()
+        sub = bus.subscribe(client_id="7")   # as parsed from ?client_id=7
+        bus.publish("client_started", client_id=7)
+        bus.publish("client_started", client_id=8)
+        bus.publish("run_finished")
+        await asyncio.sleep(0)
+        return sub.drain()
+
+    events = asyncio.run(collect())
+    assert [(e["type"], e.get("client_id")) for e in events] == [("client_started", 7), ("run_finished", None)]